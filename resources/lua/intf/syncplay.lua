@@ -5,7 +5,7 @@
  Principal author: Etoh
  Other contributors: DerGenaue, jb
  Project: http://syncplay.pl/
- Version: 0.2.8
+ Version: 0.3.0
 
  Note:
  * This interface module is intended to be used in conjunction with Syncplay.
@@ -28,6 +28,13 @@ You may also need to re-copy the syncplay.lua file when you update VLC.
  === Commands and responses ===
  = Note: ? denotes optional responses; * denotes mandatory response; uses \n terminator.
 
+ [Pushed when the file, play state, rate or expected position has changed (checked every 100ms)]
+    ? >> inputstate-change: [<input/no-input>]
+    ? >> filepath-change-notification
+
+    * >> playstate: [<playing/paused/no-input>]
+    * >> position: [<decimal seconds/no-input>]
+
  .
     ? >> inputstate-change: [<input/no-input>]
     ? >> filepath-change-notification
@@ -84,11 +91,12 @@ You may also need to re-copy the syncplay.lua file when you update VLC.
 
 --]==========================================================================]
 
-local connectorversion = "0.2.8"
+local connectorversion = "0.3.0"
 local vlcversion = vlc.misc.version()
 local durationdelay = 500000 -- Pause for get_duration command etc for increased reliability (uses microseconds)
+local seekthreshold = 0.25 -- Push the position when it is this far from where playback was expected to be (uses seconds)
 local loopsleepduration = 2500 -- Pause for every event loop (uses microseconds)
-local quitcheckfrequency = 20 -- Check whether VLC has closed every X loops
+local changecheckinterval = 100000 -- How often to look for changes to push and check whether VLC has closed (uses microseconds)
 
 local host = "localhost"
 local port
@@ -115,6 +123,11 @@ local newinputstate
 local oldtitle = 0
 local newtitle = 0
 
+local reportedplaystate
+local reportedposition
+local reportedrate
+local reportedtime
+
 local channel1
 local channel2
 local l
@@ -151,6 +164,11 @@ end
 port = radixsafe_tonumber(config["port"])
 if (port == nil or port < 1) then port = 4123 end
 
+function hasflag(flags, flag)
+    -- Lua has no bitwise operators, so test a poll flag arithmetically
+    return flags ~= nil and math.floor(flags / flag) % 2 == 1
+end
+
 function quit_vlc()
     running = false
     vlc.misc.quit()
@@ -177,9 +195,14 @@ function detectchanges()
                 vlc.misc.mwait(vlc.misc.mdate() + durationdelay) -- Don't give new title with old time
             end
             oldtitle = newtitle
-            notificationbuffer = notificationbuffer .. "playstate"..msgseperator..tostring(get_play_state())..msgterminator
-            notificationbuffer = notificationbuffer .. "position"..msgseperator..tostring(get_time())..msgterminator
+            reportedplaystate = get_play_state()
+            reportedposition = get_time()
+            reportedrate = get_var("rate", 1)
+            reportedtime = vlc.misc.mdate()
+            notificationbuffer = notificationbuffer .. "playstate"..msgseperator..tostring(reportedplaystate)..msgterminator
+            notificationbuffer = notificationbuffer .. "position"..msgseperator..tostring(reportedposition)..msgterminator
         else
+            reportedplaystate = noinput
             notificationbuffer = notificationbuffer .. "playstate"..msgseperator..noinput..msgterminator
             notificationbuffer = notificationbuffer .. "position"..msgseperator..noinput..msgterminator
             newinputstate = noinput
@@ -193,6 +216,36 @@ function detectchanges()
     return notificationbuffer
 end
 
+function changesdetected()
+    -- Checks whether playback has departed from what was last reported to Syncplay.
+    -- [Used to push changes every changecheckinterval]
+
+    if not vlc.object.input() then
+        return reportedplaystate ~= noinput
+    end
+
+    local filepath = get_filepath()
+    if filepath ~= oldfilepath and filepath ~= unknownstream then
+        return true
+    end
+
+    local playstate = get_play_state()
+    local rate = get_var("rate", 1)
+    if playstate ~= reportedplaystate or rate ~= reportedrate then
+        return true
+    end
+
+    local position = get_time()
+    if type(position) ~= "number" or type(reportedposition) ~= "number" then
+        return position ~= reportedposition
+    end
+    local expectedposition = reportedposition
+    if playstate == "playing" then
+        expectedposition = expectedposition + rate * (vlc.misc.mdate() - reportedtime) / 1000000
+    end
+    return math.abs(position - expectedposition) > seekthreshold
+end
+
 function get_args (argument, argcount)
     -- Converts comma-space-seperated values into array of a given size, with last item absorbing all remaining data if needed.
     -- [Used by the display-osd command]
@@ -538,74 +591,82 @@ else
     vlc.msg.info("Hosting Syncplay interface on port: "..port)
 end
 
-    -- main loop, which alternates between writing and reading
+    -- main loop, which handles commands and regularly pushes any changes
 
 while running == true do
     --accept new connections and select active clients
-    local quitcheckcounter = 0
-	local fd = l:accept()
-    local buffer, inputbuffer, responsebuffer = "", "", ""
+    local fd = l:accept()
+    local inputbuffer = ""
+    local nextchangecheck = vlc.misc.mdate()
     while fd >= 0 and running == true do
 
-        -- handle read mode
-
-        local str = vlc.net.recv ( fd, 1000)
-
-        local responsebuffer
-        if str == nil then str = "" end
-
-        local safestr = string.gsub(tostring(str), "\r", "")
-        if inputbuffer == nil then inputbuffer = "" end
+        -- handle read mode; vlc.net.poll has no timeout, so it also waits for the socket to be writable,
+        -- which it nearly always is, and returns at once whether or not a command has arrived
+
+        local pollfds = {}
+        pollfds[fd] = vlc.net.POLLIN + vlc.net.POLLOUT
+        vlc.net.poll(pollfds)
+
+        local responsebuffer = ""
+        if hasflag(pollfds[fd], vlc.net.POLLIN) or hasflag(pollfds[fd], vlc.net.POLLHUP) or hasflag(pollfds[fd], vlc.net.POLLERR) then
+            local str = vlc.net.recv(fd, 1000)
+            if str == nil or str == "" then
+                -- Syncplay has disconnected
+                vlc.net.close(fd)
+                fd = -1
+                break
+            end
 
-        inputbuffer = inputbuffer .. safestr
+            inputbuffer = inputbuffer .. string.gsub(tostring(str), "\r", "")
 
-        while string.find(inputbuffer, msgterminator) and running == true do
-            local index = string.find(inputbuffer, msgterminator)
-            local request = string.sub(inputbuffer, 0, index - 1)
-            local command
-            local argument
-            inputbuffer = string.sub(inputbuffer, index + string.len(msgterminator))
+            while string.find(inputbuffer, msgterminator) and running == true do
+                local index = string.find(inputbuffer, msgterminator)
+                local request = string.sub(inputbuffer, 0, index - 1)
+                local command
+                local argument
+                inputbuffer = string.sub(inputbuffer, index + string.len(msgterminator))
 
-            if (string.find(request, msgseperator)) then
-                index = string.find(request, msgseperator)
-                command = string.sub(request, 0, index - 1)
-                argument = string.sub(request, index  + string.len(msgseperator))
+                if (string.find(request, msgseperator)) then
+                    index = string.find(request, msgseperator)
+                    command = string.sub(request, 0, index - 1)
+                    argument = string.sub(request, index  + string.len(msgseperator))
 
-            else
-                command = request
-            end
+                else
+                    command = request
+                end
 
-            if (responsebuffer) then
                 responsebuffer = responsebuffer .. do_command(command,argument)
-            else
-                responsebuffer = do_command(command,argument)
-            end
 
+            end
         end
 
         if (running == false) then
-            net.close(fd)
+            vlc.net.close(fd)
         end
 
-        -- handle write mode
+        -- handle write mode; a "." reply has already reported the current state, so it is not pushed again
 
-        if (responsebuffer and running == true) then
+        local now = vlc.misc.mdate()
+        local checkchanges = running == true and now >= nextchangecheck
+        if checkchanges then
+            nextchangecheck = now + changecheckinterval
+            if changesdetected() then
+                responsebuffer = responsebuffer .. detectchanges()
+            end
+        end
+
+        if (responsebuffer ~= "" and running == true) then
             vlc.net.send( fd, responsebuffer )
-            responsebuffer = ""
         end
-        vlc.misc.mwait(vlc.misc.mdate() + loopsleepduration) -- Don't waste processor time
 
         -- check if VLC has been closed
 
-        quitcheckcounter = quitcheckcounter + 1
-
-        if quitcheckcounter > quitcheckfrequency then
-            if vlc.volume.get() == -256 then
-                running = false
-            end
-            quitcheckcounter = 0
+        if checkchanges and vlc.volume.get() == -256 then
+            running = false
         end
 
+        vlc.misc.mwait(vlc.misc.mdate() + loopsleepduration) -- Don't waste processor time
+
     end
 
-end
\ No newline at end of file
+end
@@ -0,0 +1,203 @@
+import argparse
+import os
+import random
+from twisted.internet import reactor
+from syncplay import clock, constants
+from syncplay.loadtest import getPercentile, LoadTestStats, SimulatedClient, SimulatedClientProtocol
+from syncplay.messages import getMessage
+from syncplay.server import StateTickScheduler, SyncFactory
+from syncplay.simulator import SimulatedNetwork
+
+
+def getCpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class BenchmarkWatcher(object):
+    def __init__(self, stats):
+        self._stats = stats
+
+    def getStateInterval(self):
+        return constants.SERVER_STATE_INTERVAL
+
+    def _askForStateUpdate(self):
+        self._stats.updates += 1
+
+
+class TimerBenchmarkRun(object):
+    def __init__(self, mode, connections):
+        self.mode = mode
+        self.connections = connections
+        self.updates = 0
+        self.lags = []
+        self.cpuTime = 0
+        self.wallTime = 0
+
+
+class TimerBenchmark(object):
+    MODES = ("LoopingCall", "StateTickScheduler")
+
+    def __init__(self, args):
+        self._args = args
+        self._rng = random.Random(0)
+        self._pending = [(mode, connections) for connections in args.connections for mode in self.MODES]
+        self._runs = []
+        self._timerStarts = []
+        self._timers = []
+        self._run = None
+        self._lagCheck = None
+        self._lastLagCheck = None
+        self._startedOn = None
+        self._cpuStartedOn = None
+
+    def start(self):
+        reactor.callWhenRunning(self._next)
+
+    def _next(self):
+        if not self._pending:
+            self.report()
+            reactor.stop()
+            return
+        mode, connections = self._pending.pop(0)
+        self._run = TimerBenchmarkRun(mode, connections)
+        watchers = [BenchmarkWatcher(self._run) for _ in xrange(connections)]
+        if mode == "LoopingCall":
+            startWatcher = self._startLoopingCall
+        else:
+            scheduler = StateTickScheduler(self._sendStates)
+            scheduler.start()
+            self._timers.append(scheduler)
+            startWatcher = scheduler.resetWatcher
+        # Watchers log in at different times, so their updates are spread over the interval
+        for watcher in watchers:
+            self._timerStarts.append(clock.callLater(self._rng.uniform(0, constants.SERVER_STATE_INTERVAL), startWatcher, watcher))
+        clock.callLater(constants.SERVER_STATE_INTERVAL, self._measure)
+
+    def _startLoopingCall(self, watcher):
+        timer = clock.loopingCall(watcher._askForStateUpdate)
+        timer.start(constants.SERVER_STATE_INTERVAL)
+        self._timers.append(timer)
+
+    def _sendStates(self, watchers):
+        for watcher in watchers:
+            watcher._askForStateUpdate()
+
+    def _measure(self):
+        self._run.updates = 0
+        self._lastLagCheck = None
+        self._lagCheck = clock.loopingCall(self._checkLag)
+        self._lagCheck.start(constants.LOADTEST_LAG_INTERVAL, now=False)
+        self._startedOn = clock.now()
+        self._cpuStartedOn = getCpuTime()
+        clock.callLater(self._args.duration, self._finish)
+
+    def _checkLag(self):
+        now = clock.now()
+        if self._lastLagCheck is not None:
+            self._run.lags.append(max(0, now - self._lastLagCheck - constants.LOADTEST_LAG_INTERVAL))
+        self._lastLagCheck = now
+
+    def _finish(self):
+        self._run.cpuTime = getCpuTime() - self._cpuStartedOn
+        self._run.wallTime = clock.now() - self._startedOn
+        self._lagCheck.stop()
+        for start in self._timerStarts:
+            if start.active():
+                start.cancel()
+        for timer in self._timers:
+            timer.stop()
+        self._timerStarts, self._timers = [], []
+        self._runs.append(self._run)
+        self._next()
+
+    def report(self):
+        for run in self._runs:
+            print getMessage("benchmark-report-timers").format(run.mode, run.connections, run.updates / run.wallTime,
+                                                                run.cpuTime / run.wallTime * 100,
+                                                                getPercentile(run.lags, 99) * 1000)
+
+
+class ReceiveBenchmark(object):
+    def __init__(self, args):
+        self._args = args
+        self._clock = clock.VirtualClock()
+        clock.setClock(self._clock)
+        self._factory = SyncFactory(salt="")
+        self._protocol = None
+        self._lines = []
+
+    def start(self):
+        self._connect()
+        if self._args.lines:
+            self._lines = self._args.lines
+        else:
+            self._record()
+        self.report(self._replay())
+
+    def _connect(self):
+        # The reactor never runs, so the client only answers the server and takes no actions of its own
+        client = SimulatedClient(LoadTestStats(), "benchmark", ["benchmark"], 1)
+        self._protocol = self._factory.buildProtocol(None)
+        SimulatedNetwork(random.Random(0), 0, 0, 0).connect(SimulatedClientProtocol(client), self._protocol, "127.0.0.1")
+        self._clock.advance(constants.SERVER_STATE_INTERVAL)
+
+    def _record(self):
+        lineReceived = self._protocol.lineReceived
+
+        def recordingLineReceived(line):
+            self._lines.append(line)
+            lineReceived(line)
+        self._protocol.lineReceived = recordingLineReceived
+        tick = float(constants.SERVER_STATE_INTERVAL) / constants.SERVER_STATE_SLOTS
+        while len(self._lines) < self._args.record:
+            self._clock.advance(tick)
+        self._protocol.lineReceived = lineReceived
+
+    def _replay(self):
+        lines = self._lines
+        startedOn = getCpuTime()
+        for index in xrange(self._args.messages):
+            self._protocol.lineReceived(lines[index % len(lines)])
+            if not index % len(lines):
+                # Send whatever the server queued in reply, as the reactor would
+                self._clock.advance(0)
+        self._clock.advance(0)
+        return getCpuTime() - startedOn
+
+    def report(self, cpuTime):
+        print getMessage("benchmark-report-receive").format(self._args.messages, len(self._lines), self._args.messages / max(cpuTime, 1e-6))
+
+
+class BenchmarkConfigurationGetter(object):
+    def getConfiguration(self):
+        self._prepareArgParser()
+        return self._argparser.parse_args()
+
+    def _getConnections(self, value):
+        try:
+            return [int(connections) for connections in value.split(",")]
+        except ValueError:
+            raise argparse.ArgumentTypeError(getMessage("benchmark-connections-error").format(value))
+
+    def _getLines(self, path):
+        try:
+            with open(path) as linesFile:
+                lines = [line.rstrip("\r\n") for line in linesFile if line.strip()]
+        except IOError:
+            lines = None
+        if not lines:
+            raise argparse.ArgumentTypeError(getMessage("benchmark-lines-error").format(path))
+        return lines
+
+    def _prepareArgParser(self):
+        self._argparser = argparse.ArgumentParser(description=getMessage("benchmark-argument-description"))
+        subparsers = self._argparser.add_subparsers(dest="benchmark")
+        timers = subparsers.add_parser("timers", help=getMessage("benchmark-timers-argument"))
+        timers.add_argument('--connections', metavar='counts', type=self._getConnections, default=[100, 1000, 10000],
+                            help=getMessage("benchmark-connections-argument"))
+        timers.add_argument('--duration', metavar='seconds', type=float, default=10, help=getMessage("benchmark-duration-argument"))
+        receive = subparsers.add_parser("receive", help=getMessage("benchmark-receive-argument"))
+        receive.add_argument('--messages', metavar='messages', type=int, default=200000, help=getMessage("benchmark-messages-argument"))
+        receive.add_argument('--record', metavar='lines', type=int, default=1000, help=getMessage("benchmark-record-argument"))
+        receive.add_argument('--lines', metavar='file', type=self._getLines, help=getMessage("benchmark-lines-argument"))
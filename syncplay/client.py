@@ -5,11 +5,11 @@ import re
 import sys
 import ast
 from twisted.internet.protocol import ClientFactory
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from functools import wraps
 from copy import deepcopy
 from syncplay.protocols import SyncClientProtocol
-from syncplay import utils, constants
+from syncplay import clock, utils, constants
 from syncplay.messages import getMissingStrings, getMessage
 from syncplay.constants import PRIVACY_SENDHASHED_MODE, PRIVACY_DONTSEND_MODE, \
     PRIVACY_HIDDENFILENAME
@@ -37,15 +37,15 @@ class SyncClientFactory(ClientFactory):
             self._timesTried += 1
             self._client.ui.showMessage(getMessage("reconnection-attempt-notification"))
             self.reconnecting = True
-            reactor.callLater(0.1 * (2 ** self._timesTried), connector.connect)
+            clock.callLater(0.1 * (2 ** self._timesTried), connector.connect)
         else:
             message = getMessage("disconnection-notification")
             self._client.ui.showErrorMessage(message)
 
     def clientConnectionFailed(self, connector, reason):
         if not self.reconnecting:
-            reactor.callLater(0.1, self._client.ui.showErrorMessage, getMessage("connection-failed-notification"), True)
-            reactor.callLater(0.1, self._client.stop, True)
+            clock.callLater(0.1, self._client.ui.showErrorMessage, getMessage("connection-failed-notification"), True)
+            clock.callLater(0.1, self._client.stop, True)
         else:
             self.clientConnectionLost(connector, reason)
 
@@ -100,8 +100,10 @@ class SyncplayClient(object):
         self._lastPlayerUpdate = None
         self._playerPosition = 0.0
         self._playerPaused = True
+        self._playerSpeed = 1.0
 
         self._lastGlobalUpdate = None
+        self._stateTimeout = constants.PROTOCOL_TIMEOUT
         self._globalPosition = 0.0
         self._globalPaused = 0.0
         self._userOffset = 0.0
@@ -110,7 +112,7 @@ class SyncplayClient(object):
         self.autoPlay = False
         self.autoPlayThreshold = None
 
-        self.autoplayTimer = task.LoopingCall(self.autoplayCountdown)
+        self.autoplayTimer = clock.loopingCall(self.autoplayCountdown)
         self.autoplayTimeLeft = constants.AUTOPLAY_DELAY
 
         self._warnings = self._WarningManager(self._player, self.userlist, self.ui, self)
@@ -135,10 +137,13 @@ class SyncplayClient(object):
         self._player = player
         if not self._player.secondaryOSDSupported:
             constants.OSD_WARNING_MESSAGE_DURATION = constants.NO_SECONDARY_OSD_WARNING_DURATION
-        self.scheduleAskPlayer()
+        if self._player.statusPushSupported:
+            self.scheduleAskPlayer(constants.PLAYER_STATUS_REFRESH_DELAY)
+        else:
+            self.scheduleAskPlayer()
 
     def scheduleAskPlayer(self, when=constants.PLAYER_ASK_DELAY):
-        self._askPlayerTimer = task.LoopingCall(self.askPlayer)
+        self._askPlayerTimer = clock.loopingCall(self.askPlayer)
         self._askPlayerTimer.start(when)
 
     def askPlayer(self):
@@ -149,7 +154,7 @@ class SyncplayClient(object):
         self.checkIfConnected()
 
     def checkIfConnected(self):
-        if self._lastGlobalUpdate and self._protocol and time.time() - self._lastGlobalUpdate > constants.PROTOCOL_TIMEOUT:
+        if self._lastGlobalUpdate and self._protocol and clock.now() - self._lastGlobalUpdate > self._stateTimeout:
             self._lastGlobalUpdate = None
             self.ui.showErrorMessage(getMessage("server-timeout-error"))
             self._protocol.drop()
@@ -186,13 +191,13 @@ class SyncplayClient(object):
                 pauseChange = False
                 self.ui.showMessage(getMessage("ready-to-unpause-notification"))
             else:
-                lastPausedDiff = time.time() - self.lastPausedOnLeaveTime if self.lastPausedOnLeaveTime else None
+                lastPausedDiff = clock.now() - self.lastPausedOnLeaveTime if self.lastPausedOnLeaveTime else None
                 if lastPausedDiff is not None and lastPausedDiff < constants.LAST_PAUSED_DIFF_THRESHOLD:
                     self.lastPausedOnLeaveTime = None
                 else:
                     self.changeReadyState(not self.getPlayerPaused(), manuallyInitiated=False)
         if self._lastGlobalUpdate:
-            self._lastPlayerUpdate = time.time()
+            self._lastPlayerUpdate = clock.now()
             if (pauseChange or seeked) and self._protocol:
                 if seeked:
                     self.playerPositionBeforeLastSeek = self.getGlobalPosition()
@@ -252,7 +257,7 @@ class SyncplayClient(object):
             self.setPosition(self.getGlobalPosition())
         self._player.setPaused(True)
         madeChangeOnPlayer = True
-        if (self.lastLeftTime < time.time() - constants.OSD_DURATION) or (hideFromOSD == True):
+        if (self.lastLeftTime < clock.now() - constants.OSD_DURATION) or (hideFromOSD == True):
             self.ui.showMessage(getMessage("pause-notification").format(setBy), hideFromOSD)
         else:
             self.ui.showMessage(getMessage("left-paused-notification").format(self.lastLeftUser, setBy), hideFromOSD)
@@ -277,17 +282,24 @@ class SyncplayClient(object):
             if self.getUsername() == setBy:
                 self.ui.showDebugMessage("Caught attempt to slow down due to time difference with self")
             else:
-                self._player.setSpeed(constants.SLOWDOWN_RATE)
+                self._setPlayerSpeed(constants.SLOWDOWN_RATE)
                 self._speedChanged = True
                 self.ui.showMessage(getMessage("slowdown-notification").format(setBy), hideFromOSD)
                 madeChangeOnPlayer = True
         elif self._speedChanged and diff < constants.SLOWDOWN_RESET_THRESHOLD:
-            self._player.setSpeed(1.00)
+            self._setPlayerSpeed(1.00)
             self._speedChanged = False
             self.ui.showMessage(getMessage("revert-notification"), hideFromOSD)
             madeChangeOnPlayer = True
         return madeChangeOnPlayer
 
+    def _setPlayerSpeed(self, speed):
+        if self._lastPlayerUpdate:
+            self._playerPosition = self.getPlayerPosition()
+            self._lastPlayerUpdate = clock.now()
+        self._playerSpeed = speed
+        self._player.setSpeed(speed)
+
     def _changePlayerStateAccordingToGlobalState(self, position, paused, doSeek, setBy):
         madeChangeOnPlayer = False
         pauseChanged = paused != self.getGlobalPaused() or paused != self.getPlayerPaused()
@@ -296,7 +308,7 @@ class SyncplayClient(object):
             madeChangeOnPlayer = self._initPlayerState(position, paused)
         self._globalPaused = paused
         self._globalPosition = position
-        self._lastGlobalUpdate = time.time()
+        self._lastGlobalUpdate = clock.now()
         if doSeek:
             madeChangeOnPlayer = self._serverSeeked(position, setBy)
         if diff > self._config['rewindThreshold'] and not doSeek and not self._config['rewindOnDesync'] == False:
@@ -304,12 +316,12 @@ class SyncplayClient(object):
         if self._config['fastforwardOnDesync'] and (self.userlist.currentUser.canControl() == False or self._config['dontSlowDownWithMe'] == True):
             if diff < (constants.FASTFORWARD_BEHIND_THRESHOLD * -1) and not doSeek:
                 if self.behindFirstDetected is None:
-                    self.behindFirstDetected = time.time()
+                    self.behindFirstDetected = clock.now()
                 else:
-                    durationBehind = time.time() - self.behindFirstDetected
+                    durationBehind = clock.now() - self.behindFirstDetected
                     if (durationBehind > (self._config['fastforwardThreshold']-constants.FASTFORWARD_BEHIND_THRESHOLD)) and (diff < (self._config['fastforwardThreshold'] * -1)):
                         madeChangeOnPlayer = self._fastforwardPlayerDueToTimeDifference(position, setBy)
-                        self.behindFirstDetected = time.time() + constants.FASTFORWARD_RESET_THRESHOLD
+                        self.behindFirstDetected = clock.now() + constants.FASTFORWARD_RESET_THRESHOLD
             else:
                 self.behindFirstDetected = None
         if self._player.speedSupported and not doSeek and not paused and not self._config['slowOnDesync'] == False:
@@ -349,7 +361,7 @@ class SyncplayClient(object):
     def onDisconnect(self):
         if self._config['pauseOnLeave']:
             self.setPaused(True)
-            self.lastPausedOnLeaveTime = time.time()
+            self.lastPausedOnLeaveTime = clock.now()
 
     def removeUser(self, username):
         if self.userlist.isUserInYourRoom(username):
@@ -364,8 +376,8 @@ class SyncplayClient(object):
                 return 0.0
         position = self._playerPosition
         if not self._playerPaused:
-            diff = time.time() - self._lastPlayerUpdate
-            position += diff
+            diff = clock.now() - self._lastPlayerUpdate
+            position += diff * self._playerSpeed
         return position
 
     def getPlayerPaused(self):
@@ -381,7 +393,7 @@ class SyncplayClient(object):
             return 0.0
         position = self._globalPosition
         if not self._globalPaused:
-            position += time.time() - self._lastGlobalUpdate
+            position += clock.now() - self._lastGlobalUpdate
         return position
 
     def getGlobalPaused(self):
@@ -421,6 +433,9 @@ class SyncplayClient(object):
     def setServerVersion(self, version):
         self.serverVersion = version
 
+    def setServerStateInterval(self, interval):
+        self._stateTimeout = constants.PROTOCOL_TIMEOUT + interval if interval else constants.PROTOCOL_TIMEOUT
+
     def getSanitizedCurrentUserFile(self):
         if self.userlist.currentUser.file:
             file_ = deepcopy(self.userlist.currentUser.file)
@@ -492,7 +507,7 @@ class SyncplayClient(object):
 
     def setPosition(self, position):
         if self._lastPlayerUpdate:
-            self._lastPlayerUpdate = time.time()
+            self._lastPlayerUpdate = clock.now()
         position += self.getUserOffset()
         if self._player and self.userlist.currentUser.file:
             if position < 0:
@@ -503,7 +518,7 @@ class SyncplayClient(object):
     def setPaused(self, paused):
         if self._player and self.userlist.currentUser.file:
             if self._lastPlayerUpdate and not paused:
-                self._lastPlayerUpdate = time.time()
+                self._lastPlayerUpdate = clock.now()
             self._player.setPaused(paused)
 
     def start(self, host, port):
@@ -706,22 +721,22 @@ class SyncplayClient(object):
             self._ui = ui
             self._warnings = {
                 "room-file-differences": {
-                    "timer": task.LoopingCall(self.__displayMessageOnOSD, "room-file-differences",
+                    "timer": clock.loopingCall(self.__displayMessageOnOSD, "room-file-differences",
                                               lambda: self._checkRoomForSameFiles(OSDOnly=True),),
                     "displayedFor": 0,
                 },
                 "alone-in-the-room": {
-                    "timer": task.LoopingCall(self.__displayMessageOnOSD, "alone-in-the-room",
+                    "timer": clock.loopingCall(self.__displayMessageOnOSD, "alone-in-the-room",
                                               lambda: self._checkIfYouReAloneInTheRoom(OSDOnly=True)),
                     "displayedFor": 0,
                 },
                 "not-all-ready": {
-                    "timer": task.LoopingCall(self.__displayMessageOnOSD, "not-all-ready",
+                    "timer": clock.loopingCall(self.__displayMessageOnOSD, "not-all-ready",
                                               lambda: self.checkReadyStates(),),
                     "displayedFor": 0,
                 },
             }
-            self.pausedTimer = task.LoopingCall(self.__displayPausedMessagesOnOSD)
+            self.pausedTimer = clock.loopingCall(self.__displayPausedMessagesOnOSD)
             self.pausedTimer.start(constants.WARNING_OSD_MESSAGES_LOOP_INTERVAL, True)
 
         def checkWarnings(self):
@@ -978,7 +993,7 @@ class SyncplayUserlist(object):
             self._users.pop(username)
             message = getMessage("left-notification").format(username)
             self.ui.showMessage(message, hideFromOSD)
-            self._client.lastLeftTime = time.time()
+            self._client.lastLeftTime = clock.now()
             self._client.lastLeftUser = username
         self.userListChange()
 
@@ -1139,6 +1154,19 @@ class SyncplayUserlist(object):
     def clearList(self):
         self._users = {}
 
+    def applyUserlistUpdate(self, users, snapshot=False):
+        if snapshot:
+            self.clearList()
+        for username, user in users.iteritems():
+            if user is None:
+                self._users.pop(username, None)
+            else:
+                file_ = user['file'] if user['file'] <> {} else None
+                isController = user['controller'] if 'controller' in user else False
+                isReady = user['isReady'] if 'isReady' in user else None
+                self.addUser(username, user['room'], file_, noMessage=True, isController=isController, isReady=isReady)
+        self.userListChange()
+
     def sortList(self, rooms):
         for room in rooms:
             rooms[room] = sorted(rooms[room])
@@ -1180,15 +1208,15 @@ class UiManager(object):
                 if secondaryOSD:
                     self.lastSecondaryOSDMessage = message
                     if autoplayConditionsMet:
-                        self.lastSecondaryOSDEndTime = time.time() + 1.0
+                        self.lastSecondaryOSDEndTime = clock.now() + 1.0
                     else:
-                        self.lastSecondaryOSDEndTime = time.time() + constants.NO_SECONDARY_OSD_WARNING_DURATION
-                    if self.lastPrimaryOSDEndTime and time.time() < self.lastPrimaryOSDEndTime:
+                        self.lastSecondaryOSDEndTime = clock.now() + constants.NO_SECONDARY_OSD_WARNING_DURATION
+                    if self.lastPrimaryOSDEndTime and clock.now() < self.lastPrimaryOSDEndTime:
                         message = u"{}{}{}".format(message, self._client._player.osdMessageSeparator, self.lastPrimaryOSDMessage)
                 else:
                     self.lastPrimaryOSDMessage = message
-                    self.lastPrimaryOSDEndTime = time.time() + constants.OSD_DURATION
-                    if self.lastSecondaryOSDEndTime and time.time() < self.lastSecondaryOSDEndTime:
+                    self.lastPrimaryOSDEndTime = clock.now() + constants.OSD_DURATION
+                    if self.lastSecondaryOSDEndTime and clock.now() < self.lastSecondaryOSDEndTime:
                         message = u"{}{}{}".format(self.lastSecondaryOSDMessage, self._client._player.osdMessageSeparator, message)
             self._client._player.displayMessage(message, int(duration * 1000), secondaryOSD)
 
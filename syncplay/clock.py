@@ -0,0 +1,132 @@
+import bisect
+import ctypes
+import ctypes.util
+import sys
+import time
+from twisted.internet import base, task
+
+CLOCK_MONOTONIC = 1
+
+
+def _getWindowsCounter():
+    kernel32 = ctypes.windll.kernel32
+    frequency = ctypes.c_int64()
+    if not kernel32.QueryPerformanceFrequency(ctypes.byref(frequency)):
+        raise OSError("QueryPerformanceFrequency failed")
+    frequency = float(frequency.value)
+
+    def monotonic():
+        counter = ctypes.c_int64()
+        kernel32.QueryPerformanceCounter(ctypes.byref(counter))
+        return counter.value / frequency
+    return monotonic
+
+
+def _getMachCounter():
+    class TimebaseInfo(ctypes.Structure):
+        _fields_ = [("numer", ctypes.c_uint32), ("denom", ctypes.c_uint32)]
+    libc = ctypes.CDLL(ctypes.util.find_library("c"))
+    libc.mach_absolute_time.restype = ctypes.c_uint64
+    info = TimebaseInfo()
+    libc.mach_timebase_info(ctypes.byref(info))
+    factor = float(info.numer) / info.denom / 1e9
+    return lambda: libc.mach_absolute_time() * factor
+
+
+def _getPosixMonotonic():
+    class Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+    library = ctypes.util.find_library("rt") or ctypes.util.find_library("c")
+    clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+    def monotonic():
+        timespec = Timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+            raise OSError(ctypes.get_errno(), "clock_gettime failed")
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+    monotonic()
+    return monotonic
+
+
+def _getMonotonicSource():
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    try:
+        from monotonic import monotonic
+        return monotonic
+    except (ImportError, RuntimeError):
+        pass
+    try:
+        if sys.platform.startswith("win"):
+            return _getWindowsCounter()
+        elif sys.platform == "darwin":
+            return _getMachCounter()
+        else:
+            return _getPosixMonotonic()
+    except (OSError, AttributeError, TypeError):
+        return time.time
+
+
+class MonotonicClock(object):
+    def __init__(self):
+        self.now = _getMonotonicSource()
+
+    def seconds(self):
+        return self.now()
+
+    def callLater(self, delay, f, *args, **kwargs):
+        from twisted.internet import reactor
+        return reactor.callLater(delay, f, *args, **kwargs)
+
+    def getDelayedCalls(self):
+        from twisted.internet import reactor
+        return reactor.getDelayedCalls()
+
+
+class VirtualClock(task.Clock):
+    def __init__(self, start=0.0):
+        task.Clock.__init__(self)
+        self.rightNow = start
+
+    def now(self):
+        return self.rightNow
+
+    def callLater(self, delay, f, *args, **kwargs):
+        call = base.DelayedCall(self.seconds() + delay, f, args, kwargs, self.calls.remove,
+                                lambda call: self._sortCalls(), self.seconds)
+        bisect.insort(self.calls, call)
+        return call
+
+    def advance(self, amount):
+        self.rightNow += amount
+        while self.calls and self.calls[0].getTime() <= self.rightNow:
+            call = self.calls.pop(0)
+            call.called = 1
+            call.func(*call.args, **call.kw)
+
+
+_clock = MonotonicClock()
+
+
+def now():
+    return _clock.now()
+
+
+def callLater(delay, f, *args, **kwargs):
+    return _clock.callLater(delay, f, *args, **kwargs)
+
+
+def loopingCall(f, *args, **kwargs):
+    call = task.LoopingCall(f, *args, **kwargs)
+    call.clock = _clock
+    return call
+
+
+def getClock():
+    return _clock
+
+
+def setClock(clock):
+    global _clock
+    _clock = clock
@@ -0,0 +1,80 @@
+import collections
+from syncplay import constants
+
+
+class ClockOffsetEstimator(object):
+    def __init__(self):
+        self._delays = collections.deque(maxlen=constants.CLOCK_SYNC_DELAY_WINDOW)
+        self.reset()
+
+    def reset(self):
+        self._offset = None
+        self._skew = 0.0
+        self._covariance = None
+        self._lastUpdate = None
+        self._rejected = 0
+
+    def isSynchronised(self):
+        return self._offset is not None
+
+    def getOffset(self, now=None):
+        if self._offset is None:
+            return None
+        if now is None or self._lastUpdate is None:
+            return self._offset
+        return self._offset + self._skew * (now - self._lastUpdate)
+
+    def getSkew(self):
+        return self._skew
+
+    def getOffsetError(self):
+        if self._covariance is None:
+            return None
+        return constants.CLOCK_SYNC_CONFIDENCE_SIGMAS * self._covariance[0][0] ** 0.5
+
+    def getMinimumDelay(self):
+        return min(self._delays) if self._delays else None
+
+    def _getMeasurementVariance(self, delay):
+        asymmetry = (delay - min(self._delays)) / 2
+        return constants.CLOCK_SYNC_MEASUREMENT_NOISE ** 2 + asymmetry ** 2
+
+    def addSample(self, now, delay, offset):
+        self._delays.append(delay)
+        variance = self._getMeasurementVariance(delay)
+        if self._offset is None:
+            self._offset = offset
+            self._skew = 0.0
+            self._covariance = [[variance, 0.0], [0.0, constants.CLOCK_SYNC_INITIAL_SKEW ** 2]]
+            self._lastUpdate = now
+            return True
+        self._predict(now)
+        innovation = offset - self._offset
+        innovationVariance = self._covariance[0][0] + variance
+        if innovation ** 2 > constants.CLOCK_SYNC_OUTLIER_SIGMAS ** 2 * innovationVariance:
+            self._rejected += 1
+            if self._rejected > constants.CLOCK_SYNC_MAX_OUTLIERS:
+                self.reset()
+                self._delays.clear()
+            return False
+        self._rejected = 0
+        p = self._covariance
+        offsetGain, skewGain = p[0][0] / innovationVariance, p[1][0] / innovationVariance
+        self._offset += offsetGain * innovation
+        self._skew += skewGain * innovation
+        self._covariance = [
+            [(1 - offsetGain) * p[0][0], (1 - offsetGain) * p[0][1]],
+            [p[1][0] - skewGain * p[0][0], p[1][1] - skewGain * p[0][1]]
+        ]
+        return True
+
+    def _predict(self, now):
+        elapsed = max(0.0, now - self._lastUpdate)
+        p = self._covariance
+        p00 = p[0][0] + elapsed * (p[1][0] + p[0][1]) + elapsed ** 2 * p[1][1] + constants.CLOCK_SYNC_OFFSET_NOISE * elapsed
+        p01 = p[0][1] + elapsed * p[1][1]
+        p10 = p[1][0] + elapsed * p[1][1]
+        p11 = p[1][1] + constants.CLOCK_SYNC_SKEW_NOISE * elapsed
+        self._covariance = [[p00, p01], [p10, p11]]
+        self._offset += self._skew * elapsed
+        self._lastUpdate = now
@@ -44,8 +44,38 @@ MINIMUM_SLOWDOWN_THRESHOLD = 1.3
 SLOWDOWN_RESET_THRESHOLD = 0.1
 DIFFERENT_DURATION_THRESHOLD = 2.5
 PROTOCOL_TIMEOUT = 12.5
+CLIENT_MAX_LINE_LENGTH = 1048576 # Full user lists from busy servers do not fit in the default 16 KiB
 RECONNECT_RETRIES = 10
 SERVER_STATE_INTERVAL = 1
+SERVER_STATE_SLOTS = 10 # Watchers are spread over this many ticks per state interval
+SERVER_STATE_IDLE_INTERVAL = 5 # Paused rooms and rooms with a single user
+SERVER_STATE_DRIFT_INTERVAL = 0.5
+SERVER_STATE_DRIFT_THRESHOLD = 0.5 # Seconds a playing user may be away from the room position before updates speed up
+SERVER_STATE_DRIFT_HOLD = 5
+SERVER_RECYCLED_ROOMS = 1000 # Empty rooms kept around for reuse
+SHARD_LINK_MAX_LINE_LENGTH = 1048576
+COMPACT_STATE_CAPABILITY = "compactState"
+COMPACT_STATE_TAG = "S"
+USERLIST_DELTAS_CAPABILITY = "userlistDeltas"
+MESSAGE_FRAMES_CAPABILITY = "messageFrames"
+PROTOCOL_CAPABILITIES = [COMPACT_STATE_CAPABILITY, USERLIST_DELTAS_CAPABILITY, MESSAGE_FRAMES_CAPABILITY]
+USERLIST_JOURNAL_LENGTH = 1000 # User list changes kept for delta updates before a full snapshot is sent instead
+LOADTEST_MAX_SAMPLES = 10000 # Latency samples kept per load test process
+LOADTEST_LAG_INTERVAL = 0.05
+LOADTEST_SERVER_STARTUP_DELAY = 2 # Time a sharded server started by the load test gets before clients connect
+SIMULATOR_SAMPLE_INTERVAL = 0.1
+SIMULATOR_SETTLE_TIME = 5 # Time given to simulated clients to log in before playback starts
+SIMULATOR_SYNC_THRESHOLD = 0.5 # Largest spread of player positions within a room that counts as in sync
+SIMULATOR_RETRANSMIT_DELAY = 0.2
+SIMULATOR_PAUSE_PROBABILITY = 0.5 # Chance that a simulated user action is a pause rather than a seek
+SIMULATOR_FILENAME = "simulation.mkv"
+PLAYERCHECK_BLOCKING_THRESHOLD = 0.01 # Longest time a player call may hold up the reactor
+PLAYERCHECK_LAG_THRESHOLD = 0.05 # Longest reactor lag, which also includes scheduling jitter and the player's event handling
+PLAYERCHECK_LAG_INTERVAL = 0.002
+PLAYERCHECK_STATUS_GAP_THRESHOLD = 3 # Longest silence between status reports before a player counts as stuck
+METRICS_LAG_INTERVAL = 0.1
+METRICS_TIME_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+METRICS_ROOM_SIZE_BUCKETS = [1, 2, 3, 5, 10, 20, 50, 100]
 WARNING_OSD_MESSAGES_LOOP_INTERVAL = 1
 AUTOPLAY_DELAY = 3.0
 SYNC_ON_PAUSE = True  # Client seek to global position - subtitles may disappear on some media players
@@ -69,9 +99,10 @@ COMMANDS_AUTH = ['a','auth']
 COMMANDS_TOGGLE = ['t','toggle']
 MPC_MIN_VER = "1.6.4"
 VLC_MIN_VERSION = "2.2.1"
-VLC_INTERFACE_MIN_VERSION = "0.2.8"
+VLC_INTERFACE_MIN_VERSION = "0.3.0"
 VLC_LATENCY_ERROR_THRESHOLD = 2.0
 MPV_UNRESPONSIVE_THRESHOLD = 60.0
+MPV_IPC_MIN_VERSION = "0.17.0"
 CONTROLLED_ROOMS_MIN_VERSION = "1.3.0"
 USER_READY_MIN_VERSION = "1.3.0"
 MPC_PATHS = [
@@ -109,14 +140,28 @@ MPC64_ICONPATH = "mpc-hc64.png"
 
 #Changing these is usually not something you're looking for
 PLAYER_ASK_DELAY = 0.1
+PLAYER_STATUS_TIMEOUT = 0.2 # Replies arriving later than this are stored but not reported
+PLAYER_STATUS_REFRESH_DELAY = 1.0 # How often players that push status changes are asked to confirm their position
+PLAYER_LATENCY_MOVING_AVERAGE_WEIGHT = 0.85
+PLAYER_FILE_INFO_TIMEOUT = 5.0 # Longest wait for file info after a file change before reporting what is known
+MPLAYER_SEEK_INTERVAL = 0.03 # Seeks sent closer together than this are delayed, and only the last one is kept
 PING_MOVING_AVERAGE_WEIGHT = 0.85
+CLOCK_SYNC_DELAY_WINDOW = 8 # Round trips considered when looking for the least delayed one
+CLOCK_SYNC_MEASUREMENT_NOISE = 0.002
+CLOCK_SYNC_OFFSET_NOISE = 1e-6 # Offset variance added per second
+CLOCK_SYNC_SKEW_NOISE = 1e-12 # Skew variance added per second
+CLOCK_SYNC_INITIAL_SKEW = 0.0002
+CLOCK_SYNC_OUTLIER_SIGMAS = 4
+CLOCK_SYNC_MAX_OUTLIERS = 5 # Consecutive rejected samples before assuming a clock step and starting over
+CLOCK_SYNC_CONFIDENCE_SIGMAS = 2
 MPC_OPEN_MAX_WAIT_TIME = 10
 MPC_LOCK_WAIT_TIME = 0.2
 MPC_RETRY_WAIT_TIME = 0.01
 MPC_MAX_RETRIES = 30
 MPC_PAUSE_TOGGLE_DELAY = 0.05
 MPV_NEWFILE_IGNORE_TIME = 1
-MPV_LOCK_WAIT_TIME = 0.2
+MPV_OPEN_MAX_WAIT_TIME = 10
+MPV_IPC_RETRY_DELAY = 0.1
 VLC_OPEN_MAX_WAIT_TIME = 15
 VLC_MIN_PORT = 10000
 VLC_MAX_PORT = 55000
@@ -146,6 +191,7 @@ MPV_ARGS = ['--force-window', '--idle', '--hr-seek=always', '--keep-open', '--af
 MPV_SLAVE_ARGS = ['--quiet', '--input-terminal=no', '--input-file=/dev/stdin']
 MPV_SLAVE_ARGS_NEW = ['--term-playing-msg=<SyncplayUpdateFile>\nANS_filename=${filename}\nANS_length=${=length}\nANS_path=${path}\n</SyncplayUpdateFile>', '--terminal=yes']
 MPV_NEW_VERSION = False
+MPV_IPC_ARGS = ['--quiet', '--input-terminal=no']
 VLC_SLAVE_ARGS = ['--extraintf=luaintf', '--lua-intf=syncplay', '--no-quiet', '--no-input-fast-seek',
                   '--play-and-pause', '--start-time=0']
 VLC_SLAVE_NONOSX_ARGS = ['--no-one-instance', '--no-one-instance-when-started-from-file']
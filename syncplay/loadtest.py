@@ -0,0 +1,416 @@
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+from twisted.internet import reactor
+from twisted.internet.protocol import ClientFactory, ProcessProtocol
+from syncplay import clock, constants
+from syncplay.messages import getMessage
+from syncplay.protocols import SyncClientProtocol
+from syncplay.server import SyncFactory
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def getMemoryUsage():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        if resource:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+
+def raiseDescriptorLimit():
+    if resource:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def getPercentile(samples, percentile):
+    if not samples:
+        return 0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100.0))]
+
+
+class LoadTestStats(object):
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.disconnected = 0
+        self.received = 0
+        self.sent = 0
+        self.bytesReceived = 0
+        self.bytesSent = 0
+        self.latencies = []
+        self._latencyCount = 0
+
+    def addLatency(self, latency):
+        self._latencyCount += 1
+        if len(self.latencies) < constants.LOADTEST_MAX_SAMPLES:
+            self.latencies.append(latency)
+        else:
+            index = random.randrange(self._latencyCount)
+            if index < constants.LOADTEST_MAX_SAMPLES:
+                self.latencies[index] = latency
+
+    def toDict(self):
+        return {
+            "connected": self.connected,
+            "failed": self.failed,
+            "disconnected": self.disconnected,
+            "received": self.received,
+            "sent": self.sent,
+            "bytesReceived": self.bytesReceived,
+            "bytesSent": self.bytesSent,
+            "latencies": self.latencies
+        }
+
+    def merge(self, stats):
+        self.connected += stats["connected"]
+        self.failed += stats["failed"]
+        self.disconnected += stats["disconnected"]
+        self.received += stats["received"]
+        self.sent += stats["sent"]
+        self.bytesReceived += stats["bytesReceived"]
+        self.bytesSent += stats["bytesSent"]
+        self.latencies.extend(stats["latencies"])
+
+
+class SimulatedUI(object):
+    def showMessage(self, message, noPlayer=False, noTimestamp=False):
+        pass
+
+    def showDebugMessage(self, message):
+        pass
+
+    def showErrorMessage(self, message, criticalerror=False):
+        pass
+
+
+class SimulatedUserlist(object):
+    def addUser(self, username, room, file_, noMessage=False, isController=None, isReady=None):
+        pass
+
+    def modUser(self, username, room, file_):
+        pass
+
+    def clearList(self):
+        pass
+
+    def applyUserlistUpdate(self, users, snapshot=False):
+        pass
+
+    def showUserList(self):
+        pass
+
+
+class SimulatedClientProtocol(SyncClientProtocol):
+    def _handleStatePing(self, state):
+        if "clientLatencyCalculation" in state["ping"]:
+            self._client.stats.addLatency(clock.now() - state["ping"]["clientLatencyCalculation"])
+        return SyncClientProtocol._handleStatePing(self, state)
+
+    def lineReceived(self, line):
+        self._client.stats.received += 1
+        self._client.stats.bytesReceived += len(line)
+        SyncClientProtocol.lineReceived(self, line)
+
+    def sendEncodedMessage(self, line, command=None):
+        self._client.stats.sent += 1
+        self._client.stats.bytesSent += len(line)
+        SyncClientProtocol.sendEncodedMessage(self, line, command)
+
+
+class SimulatedClient(object):
+    def __init__(self, stats, username, rooms, actionInterval):
+        self.stats = stats
+        self.ui = SimulatedUI()
+        self.userlist = SimulatedUserlist()
+        self.protocolFactory = None
+        self._protocol = None
+        self._username = username
+        self._rooms = rooms
+        self._room = random.choice(rooms)
+        self._actionInterval = actionInterval
+        self._position = 0.0
+        self._paused = True
+        self._lastUpdate = clock.now()
+        self._ready = False
+        self._file = self._pickFile()
+        self._actionCall = None
+
+    def _pickFile(self):
+        return {"name": u"episode{}.mkv".format(random.randint(1, 20)), "duration": 1440.0, "size": 367001600}
+
+    def _getPosition(self):
+        if self._paused:
+            return self._position
+        return self._position + clock.now() - self._lastUpdate
+
+    def _setLocalState(self, position, paused):
+        self._position = position
+        self._paused = paused
+        self._lastUpdate = clock.now()
+
+    def initProtocol(self, protocol):
+        self._protocol = protocol
+        self.stats.connected += 1
+
+    def destroyProtocol(self):
+        self._protocol = None
+        self.stats.disconnected += 1
+        if self._actionCall and self._actionCall.active():
+            self._actionCall.cancel()
+
+    def getUsername(self):
+        return self._username
+
+    def setUsername(self, username):
+        self._username = username
+
+    def getPassword(self):
+        return None
+
+    def getRoom(self):
+        return self._room
+
+    def setRoom(self, roomName, resetAutoplay=False):
+        self._room = roomName
+
+    def setServerVersion(self, version):
+        pass
+
+    def setServerStateInterval(self, interval):
+        pass
+
+    def connected(self):
+        self._protocol.setReady(self._ready, manuallyInitiated=False)
+        self._scheduleAction()
+
+    def sendFile(self):
+        self._protocol.sendFileSetting(self._file)
+
+    def removeUser(self, username):
+        pass
+
+    def setReady(self, username, isReady, manuallyInitiated=True):
+        pass
+
+    def controlledRoomCreated(self, roomName, controlPassword):
+        pass
+
+    def controllerIdentificationSuccess(self, username, roomname):
+        pass
+
+    def controllerIdentificationError(self, username, room):
+        pass
+
+    def updateGlobalState(self, position, paused, doSeek, setBy, messageAge):
+        if not paused:
+            position += messageAge
+        self._setLocalState(position, paused)
+
+    def getLocalState(self):
+        return self._getPosition(), self._paused, None, False
+
+    def _scheduleAction(self):
+        self._actionCall = clock.callLater(random.expovariate(1.0 / self._actionInterval), self._act)
+
+    def _act(self):
+        if not self._protocol:
+            return
+        action = random.random()
+        if action < 0.35:
+            self._setLocalState(self._getPosition(), not self._paused)
+            self._protocol.sendState(self._position, self._paused, False, None, True)
+        elif action < 0.55:
+            self._setLocalState(random.uniform(0, self._file["duration"]), self._paused)
+            self._protocol.sendState(self._position, self._paused, True, None, True)
+        elif action < 0.7:
+            self._room = random.choice(self._rooms)
+            self._protocol.sendRoomSetting(self._room)
+            self._protocol.sendList()
+        elif action < 0.85:
+            self._file = self._pickFile()
+            self._protocol.sendFileSetting(self._file)
+        else:
+            self._ready = not self._ready
+            self._protocol.setReady(self._ready)
+        self._scheduleAction()
+
+
+class SimulatedClientFactory(ClientFactory):
+    def __init__(self, client):
+        self._client = client
+        client.protocolFactory = self
+
+    def buildProtocol(self, addr):
+        return SimulatedClientProtocol(self._client)
+
+    def clientConnectionFailed(self, connector, reason):
+        self._client.stats.failed += 1
+
+    def stopRetrying(self):
+        pass
+
+
+class LoadTestWorker(object):
+    def __init__(self, args):
+        self._args = args
+        self._stats = LoadTestStats()
+
+    def start(self):
+        raiseDescriptorLimit()
+        random.seed(self._args.seed)
+        rooms = [u"room{}".format(room) for room in xrange(self._args.rooms)]
+        for index in xrange(self._args.clients):
+            client = SimulatedClient(self._stats, u"user{}_{}".format(self._args.seed, index), rooms, self._args.action_interval)
+            clock.callLater(random.uniform(0, self._args.ramp), reactor.connectTCP, self._args.host,
+                              int(self._args.port), SimulatedClientFactory(client))
+        clock.callLater(self._args.ramp + self._args.duration, self.stop)
+
+    def stop(self):
+        print json.dumps(self._stats.toDict())
+        sys.stdout.flush()
+        os._exit(0)
+
+
+class LoadTestWorkerProtocol(ProcessProtocol):
+    def __init__(self, loadTest):
+        self._loadTest = loadTest
+        self._output = ""
+
+    def outReceived(self, data):
+        self._output += data
+
+    def processEnded(self, reason):
+        self._loadTest.workerEnded(self._output)
+
+
+class LoadTest(object):
+    def __init__(self, args):
+        self._args = args
+        self._stats = LoadTestStats()
+        self._runningWorkers = 0
+        self._lags = []
+        self._lagCheck = None
+        self._lastLagCheck = None
+        self._baselineMemory = 0
+        self._connectionMemory = None
+        self._localServer = args.host is None and args.shards <= 1
+        self._shardedServer = None
+
+    def start(self):
+        raiseDescriptorLimit()
+        if self._args.host is None and self._args.shards > 1:
+            self._startShardedServer()
+            clock.callLater(constants.LOADTEST_SERVER_STARTUP_DELAY, self._spawnWorkers)
+            return
+        if self._localServer:
+            self._baselineMemory = getMemoryUsage()
+            port = reactor.listenTCP(int(self._args.port or 0), SyncFactory(isolateRooms=self._args.isolate_rooms, salt=""),
+                                     interface="127.0.0.1")
+            self._args.host = "127.0.0.1"
+            self._args.port = port.getHost().port
+            self._lagCheck = clock.loopingCall(self._checkLag)
+            self._lagCheck.start(constants.LOADTEST_LAG_INTERVAL)
+            clock.callLater(self._args.ramp + self._args.duration / 2.0, self._measureMemory)
+        elif self._args.port is None:
+            self._args.port = constants.DEFAULT_PORT
+        self._spawnWorkers()
+
+    def _startShardedServer(self):
+        if self._args.port is None:
+            probe = socket.socket()
+            probe.bind(("127.0.0.1", 0))
+            self._args.port = probe.getsockname()[1]
+            probe.close()
+        self._args.host = "127.0.0.1"
+        server = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "syncplayServer.py")
+        args = [sys.executable, server, "--port", str(self._args.port), "--shards", str(self._args.shards), "--salt", ""]
+        if self._args.isolate_rooms:
+            args.append("--isolate-rooms")
+        self._shardedServer = reactor.spawnProcess(ProcessProtocol(), sys.executable, args, env=os.environ,
+                                                   childFDs={0: "w", 1: 1, 2: 2})
+
+    def _spawnWorkers(self):
+        processes = max(1, self._args.processes)
+        for index in xrange(processes):
+            clients = self._args.clients // processes + (1 if index < self._args.clients % processes else 0)
+            self._spawnWorker(index, clients)
+
+    def _spawnWorker(self, index, clients):
+        args = [sys.executable, os.path.abspath(sys.argv[0]), "--worker",
+                "--host", self._args.host, "--port", str(self._args.port),
+                "--clients", str(clients), "--rooms", str(self._args.rooms),
+                "--duration", str(self._args.duration), "--ramp", str(self._args.ramp),
+                "--action-interval", str(self._args.action_interval), "--seed", str(index)]
+        self._runningWorkers += 1
+        reactor.spawnProcess(LoadTestWorkerProtocol(self), sys.executable, args, env=os.environ,
+                             childFDs={0: "w", 1: "r", 2: 2})
+
+    def _checkLag(self):
+        now = clock.now()
+        if self._lastLagCheck is not None:
+            self._lags.append(max(0, now - self._lastLagCheck - constants.LOADTEST_LAG_INTERVAL))
+        self._lastLagCheck = now
+
+    def _measureMemory(self):
+        self._connectionMemory = getMemoryUsage() - self._baselineMemory
+
+    def workerEnded(self, output):
+        for line in output.splitlines():
+            try:
+                self._stats.merge(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                pass
+        self._runningWorkers -= 1
+        if self._runningWorkers == 0:
+            if self._shardedServer:
+                self._shardedServer.signalProcess("TERM")
+            self.report()
+            reactor.stop()
+
+    def report(self):
+        duration = float(self._args.duration + self._args.ramp)
+        stats = self._stats
+        print getMessage("loadtest-report-clients").format(stats.connected, stats.failed, stats.disconnected)
+        print getMessage("loadtest-report-messages").format(stats.received / duration, stats.sent / duration,
+                                                             stats.bytesReceived / duration / 1024, stats.bytesSent / duration / 1024)
+        print getMessage("loadtest-report-latency").format(getPercentile(stats.latencies, 50) * 1000,
+                                                            getPercentile(stats.latencies, 99) * 1000)
+        if self._localServer:
+            if self._connectionMemory is not None and stats.connected:
+                print getMessage("loadtest-report-memory").format(self._connectionMemory / 1024.0 / stats.connected)
+            print getMessage("loadtest-report-lag").format(getPercentile(self._lags, 50) * 1000, getPercentile(self._lags, 99) * 1000,
+                                                           max(self._lags or [0]) * 1000)
+
+
+class LoadTestConfigurationGetter(object):
+    def getConfiguration(self):
+        self._prepareArgParser()
+        return self._argparser.parse_args()
+
+    def _prepareArgParser(self):
+        self._argparser = argparse.ArgumentParser(description=getMessage("loadtest-argument-description"))
+        self._argparser.add_argument('--host', metavar='host', type=str, help=getMessage("loadtest-host-argument"))
+        self._argparser.add_argument('--port', metavar='port', type=str, help=getMessage("loadtest-port-argument"))
+        self._argparser.add_argument('--clients', metavar='clients', type=int, default=1000, help=getMessage("loadtest-clients-argument"))
+        self._argparser.add_argument('--rooms', metavar='rooms', type=int, default=100, help=getMessage("loadtest-rooms-argument"))
+        self._argparser.add_argument('--processes', metavar='processes', type=int, default=2, help=getMessage("loadtest-processes-argument"))
+        self._argparser.add_argument('--duration', metavar='seconds', type=float, default=30, help=getMessage("loadtest-duration-argument"))
+        self._argparser.add_argument('--ramp', metavar='seconds', type=float, default=5, help=getMessage("loadtest-ramp-argument"))
+        self._argparser.add_argument('--action-interval', metavar='seconds', type=float, default=10, help=getMessage("loadtest-action-interval-argument"))
+        self._argparser.add_argument('--isolate-rooms', action='store_true', help=getMessage("server-isolate-room-argument"))
+        self._argparser.add_argument('--shards', metavar='shards', type=int, default=1, help=getMessage("server-shards-argument"))
+        self._argparser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+        self._argparser.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
@@ -125,6 +125,7 @@ en = {
        "not-json-error" : "Not a json encoded string\n",
        "hello-arguments-error" : "Not enough Hello arguments\n",
        "version-mismatch-error" : "Mismatch between versions of client and server\n",
+       "mpv-failed-connection": "Failed to connect to mpv. Please make sure that mpv starts correctly.",
        "vlc-failed-connection": "Failed to connect to VLC. If you have not installed syncplay.lua then please refer to http://syncplay.pl/LUA/ for instructions.",
        "vlc-failed-noscript": "VLC has reported that the syncplay.lua interface script has not been installed. Please refer to http://syncplay.pl/LUA/ for instructions.",
        "vlc-failed-versioncheck": "This version of VLC is not supported by Syncplay. Please use VLC 2.",
@@ -358,6 +359,72 @@ en = {
       "server-salt-argument" : "random string used to generate managed room passwords",
       "server-disable-ready-argument" : u"disable readiness feature",
       "server-motd-argument": "path to file from which motd will be fetched",
+      "server-shards-argument" : "number of worker processes rooms are spread across",
+      "server-metrics-port-argument" : "serve Prometheus metrics on this local port (shards use consecutive ports)",
+      "shards-unsupported-server-error" : "Running the server with more than one shard requires UNIX domain sockets with descriptor passing, which are not available on this system",
+      "shard-exited-server-notification" : "Shard {} has stopped, shutting down the server", # Shard index
+
+      "loadtest-argument-description" : "Load test for a Syncplay server using simulated clients",
+      "loadtest-host-argument" : "address of the server to test (a local server is started if omitted)",
+      "loadtest-port-argument" : "server TCP port",
+      "loadtest-clients-argument" : "number of simulated clients",
+      "loadtest-rooms-argument" : "number of rooms clients are spread across",
+      "loadtest-processes-argument" : "number of processes running the simulated clients",
+      "loadtest-duration-argument" : "how long to keep clients connected after the ramp-up, in seconds",
+      "loadtest-ramp-argument" : "time over which clients connect, in seconds",
+      "loadtest-action-interval-argument" : "average time between actions of each client, in seconds",
+      "loadtest-report-clients" : "Clients: {} connected, {} failed to connect, {} disconnected",
+      "loadtest-report-messages" : "Messages: {:.0f}/s received, {:.0f}/s sent ({:.1f} KiB/s in, {:.1f} KiB/s out)",
+      "loadtest-report-latency" : "State round trip: p50 {:.1f} ms, p99 {:.1f} ms",
+      "loadtest-report-memory" : "Server memory: {:.1f} KiB per connection",
+      "loadtest-report-lag" : "Reactor lag: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms",
+      "simulator-argument-description" : "Deterministic simulation of Syncplay clients and a server on a virtual clock",
+      "simulator-clients-argument" : "number of simulated clients",
+      "simulator-rooms-argument" : "number of rooms clients are spread across",
+      "simulator-duration-argument" : "simulated watch time, in seconds",
+      "simulator-latency-argument" : "one-way network latency, in seconds",
+      "simulator-jitter-argument" : "largest random extra delay of a message, in seconds",
+      "simulator-latency-trace-argument" : "file of recorded one-way message delays in seconds, one per line, to replay instead of --latency and --jitter",
+      "simulator-loss-argument" : "probability that a message is lost and has to be retransmitted",
+      "simulator-drift-argument" : "largest playback rate error of a simulated player, as a fraction",
+      "simulator-action-interval-argument" : "average time between user actions in each room, in seconds (0 disables actions)",
+      "simulator-threshold-argument" : "largest spread of positions in a room that counts as in sync, in seconds",
+      "simulator-seed-argument" : "seed for the random number generator",
+      "simulator-poll-argument" : "simulate players that have to be polled for their status",
+      "simulator-report-time" : "Simulated {:.0f} s in {:.1f} s ({:.0f}x real time)",
+      "simulator-report-convergence" : "Convergence after {} actions: p50 {:.2f} s, p99 {:.2f} s, max {:.2f} s, {} did not converge",
+      "simulator-report-corrections" : "Corrections: {} rewinds, {} fast-forwards, {} slowdowns",
+      "simulator-report-drift" : "Residual drift: p50 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms",
+      "simulator-report-message-age" : "Message age error: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms",
+      "simulator-report-player" : "Player status: {:.1f} queries/s and {:.2f} pushes/s per client",
+      "simulator-latency-trace-error" : "Could not read latency trace '{}'",
+      "playercheck-argument-description" : "Checks that a media player backend never blocks the Twisted reactor",
+      "playercheck-player-path-argument" : "path to the media player executable to check",
+      "playercheck-file-argument" : "file to open in the media player",
+      "playercheck-duration-argument" : "how long to drive the player, in seconds",
+      "playercheck-storm-interval-argument" : "time between bursts of seeks, pauses and speed changes, in seconds",
+      "playercheck-seeks-argument" : "number of seeks in each burst",
+      "playercheck-threshold-argument" : "longest time a player call may take, in seconds",
+      "playercheck-lag-threshold-argument" : "longest the reactor may lag behind its timers, in seconds",
+      "playercheck-drop-replies-argument" : "number of player output lines to discard, one after each burst, to check that lost replies do not stop status updates",
+      "playercheck-report-call" : "{}: {} calls, p99 {:.1f} ms, max {:.1f} ms",
+      "playercheck-report-status" : "Player status: {} updates, {} file updates, longest gap {:.2f} s",
+      "playercheck-report-passed" : "No player call blocked the reactor for more than {:.0f} ms, and it never lagged by more than {:.0f} ms",
+      "playercheck-report-failed" : "FAILED: a player call blocked the reactor for more than {:.0f} ms",
+      "playercheck-report-lagged" : "FAILED: the reactor lagged by more than {:.0f} ms",
+      "playercheck-report-stalled" : "FAILED: the player stopped reporting its status for {:.1f} s",
+      "benchmark-argument-description" : "Measures the cost of the server's hot paths",
+      "benchmark-timers-argument" : "compare one State timer per connection with the shared tick scheduler",
+      "benchmark-connections-argument" : "comma-separated connection counts to measure",
+      "benchmark-duration-argument" : "how long to measure each case, in seconds",
+      "benchmark-connections-error" : "Invalid connection counts: {}",
+      "benchmark-report-timers" : "{}: {} connections, {:.0f} State updates/s, {:.1f}% of a core, reactor lag p99 {:.1f} ms",
+      "benchmark-receive-argument" : "measure how many client lines one core can decode and handle",
+      "benchmark-messages-argument" : "number of lines to feed to the server",
+      "benchmark-record-argument" : "number of lines to record from a simulated client before replaying them",
+      "benchmark-lines-argument" : "file of client lines to replay, one per line, instead of recording them",
+      "benchmark-lines-error" : "Could not read client lines from '{}'",
+      "benchmark-report-receive" : "{} messages from {} recorded lines: {:.0f} messages/s per core",
       "server-messed-up-motd-unescaped-placeholders": "Message of the Day has unescaped placeholders. All $ signs should be doubled ($$).",
       "server-messed-up-motd-too-long": "Message of the Day is too long - maximum of {} chars, {} given.",
 
@@ -495,6 +562,7 @@ ru = {
       "not-json-error" : u"Не является закодированной json-строкой\n",
       "hello-arguments-error" : u"Не хватает аргументов Hello\n",
       "version-mismatch-error" : u"Конфликт версий между клиентом и сервером\n",
+      "mpv-failed-connection" : u"Failed to connect to mpv. Please make sure that mpv starts correctly.", # TODO: Translate into Russian
       "vlc-failed-connection" : u"Ошибка подключения к VLC. Если у Вас не установлен syncplay.lua, то обратитесь к http://syncplay.pl/LUA/ за инструкциями.",
       "vlc-failed-noscript" : u"VLC сообщает, что скрипт интерфейса syncplay.lua не установлен. Пожалуйста, обратитесь к http://syncplay.pl/LUA/ за инструкциями.",
       "vlc-failed-versioncheck" : u"Данная версия VLC не поддерживается Syncplay. Пожалуйста, используйте VLC версии 2 или выше.",
@@ -727,6 +795,72 @@ ru = {
       "server-salt-argument" : u"генерировать пароли к управляемым комнатам на основании указанной строки (соли)",
       "server-disable-ready-argument" : u"отключить статусы готов/не готов",
       "server-motd-argument" : u"путь к файлу, из которого будет извлекаться MOTD-сообщение",
+      "server-shards-argument" : "number of worker processes rooms are spread across", # TODO: Translate into Russian
+      "server-metrics-port-argument" : "serve Prometheus metrics on this local port (shards use consecutive ports)", # TODO: Translate into Russian
+      "shards-unsupported-server-error" : "Running the server with more than one shard requires UNIX domain sockets with descriptor passing, which are not available on this system", # TODO: Translate into Russian
+      "shard-exited-server-notification" : "Shard {} has stopped, shutting down the server", # Shard index # TODO: Translate into Russian
+
+      "loadtest-argument-description" : "Load test for a Syncplay server using simulated clients", # TODO: Translate into Russian
+      "loadtest-host-argument" : "address of the server to test (a local server is started if omitted)", # TODO: Translate into Russian
+      "loadtest-port-argument" : "server TCP port", # TODO: Translate into Russian
+      "loadtest-clients-argument" : "number of simulated clients", # TODO: Translate into Russian
+      "loadtest-rooms-argument" : "number of rooms clients are spread across", # TODO: Translate into Russian
+      "loadtest-processes-argument" : "number of processes running the simulated clients", # TODO: Translate into Russian
+      "loadtest-duration-argument" : "how long to keep clients connected after the ramp-up, in seconds", # TODO: Translate into Russian
+      "loadtest-ramp-argument" : "time over which clients connect, in seconds", # TODO: Translate into Russian
+      "loadtest-action-interval-argument" : "average time between actions of each client, in seconds", # TODO: Translate into Russian
+      "loadtest-report-clients" : "Clients: {} connected, {} failed to connect, {} disconnected", # TODO: Translate into Russian
+      "loadtest-report-messages" : "Messages: {:.0f}/s received, {:.0f}/s sent ({:.1f} KiB/s in, {:.1f} KiB/s out)", # TODO: Translate into Russian
+      "loadtest-report-latency" : "State round trip: p50 {:.1f} ms, p99 {:.1f} ms", # TODO: Translate into Russian
+      "loadtest-report-memory" : "Server memory: {:.1f} KiB per connection", # TODO: Translate into Russian
+      "loadtest-report-lag" : "Reactor lag: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate into Russian
+      "simulator-argument-description" : "Deterministic simulation of Syncplay clients and a server on a virtual clock", # TODO: Translate into Russian
+      "simulator-clients-argument" : "number of simulated clients", # TODO: Translate into Russian
+      "simulator-rooms-argument" : "number of rooms clients are spread across", # TODO: Translate into Russian
+      "simulator-duration-argument" : "simulated watch time, in seconds", # TODO: Translate into Russian
+      "simulator-latency-argument" : "one-way network latency, in seconds", # TODO: Translate into Russian
+      "simulator-jitter-argument" : "largest random extra delay of a message, in seconds", # TODO: Translate into Russian
+      "simulator-latency-trace-argument" : "file of recorded one-way message delays in seconds, one per line, to replay instead of --latency and --jitter", # TODO: Translate into Russian
+      "simulator-loss-argument" : "probability that a message is lost and has to be retransmitted", # TODO: Translate into Russian
+      "simulator-drift-argument" : "largest playback rate error of a simulated player, as a fraction", # TODO: Translate into Russian
+      "simulator-action-interval-argument" : "average time between user actions in each room, in seconds (0 disables actions)", # TODO: Translate into Russian
+      "simulator-threshold-argument" : "largest spread of positions in a room that counts as in sync, in seconds", # TODO: Translate into Russian
+      "simulator-seed-argument" : "seed for the random number generator", # TODO: Translate into Russian
+      "simulator-poll-argument" : "simulate players that have to be polled for their status", # TODO: Translate into Russian
+      "simulator-report-time" : "Simulated {:.0f} s in {:.1f} s ({:.0f}x real time)", # TODO: Translate into Russian
+      "simulator-report-convergence" : "Convergence after {} actions: p50 {:.2f} s, p99 {:.2f} s, max {:.2f} s, {} did not converge", # TODO: Translate into Russian
+      "simulator-report-corrections" : "Corrections: {} rewinds, {} fast-forwards, {} slowdowns", # TODO: Translate into Russian
+      "simulator-report-drift" : "Residual drift: p50 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms", # TODO: Translate into Russian
+      "simulator-report-message-age" : "Message age error: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate into Russian
+      "simulator-report-player" : "Player status: {:.1f} queries/s and {:.2f} pushes/s per client", # TODO: Translate into Russian
+      "simulator-latency-trace-error" : "Could not read latency trace '{}'", # TODO: Translate into Russian
+      "playercheck-argument-description" : "Checks that a media player backend never blocks the Twisted reactor", # TODO: Translate into Russian
+      "playercheck-player-path-argument" : "path to the media player executable to check", # TODO: Translate into Russian
+      "playercheck-file-argument" : "file to open in the media player", # TODO: Translate into Russian
+      "playercheck-duration-argument" : "how long to drive the player, in seconds", # TODO: Translate into Russian
+      "playercheck-storm-interval-argument" : "time between bursts of seeks, pauses and speed changes, in seconds", # TODO: Translate into Russian
+      "playercheck-seeks-argument" : "number of seeks in each burst", # TODO: Translate into Russian
+      "playercheck-threshold-argument" : "longest time a player call may take, in seconds", # TODO: Translate into Russian
+      "playercheck-lag-threshold-argument" : "longest the reactor may lag behind its timers, in seconds", # TODO: Translate into Russian
+      "playercheck-drop-replies-argument" : "number of player output lines to discard, one after each burst, to check that lost replies do not stop status updates", # TODO: Translate into Russian
+      "playercheck-report-call" : "{}: {} calls, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate into Russian
+      "playercheck-report-status" : "Player status: {} updates, {} file updates, longest gap {:.2f} s", # TODO: Translate into Russian
+      "playercheck-report-passed" : "No player call blocked the reactor for more than {:.0f} ms, and it never lagged by more than {:.0f} ms", # TODO: Translate into Russian
+      "playercheck-report-failed" : "FAILED: a player call blocked the reactor for more than {:.0f} ms", # TODO: Translate into Russian
+      "playercheck-report-lagged" : "FAILED: the reactor lagged by more than {:.0f} ms", # TODO: Translate into Russian
+      "playercheck-report-stalled" : "FAILED: the player stopped reporting its status for {:.1f} s", # TODO: Translate into Russian
+      "benchmark-argument-description" : "Measures the cost of the server's hot paths", # TODO: Translate into Russian
+      "benchmark-timers-argument" : "compare one State timer per connection with the shared tick scheduler", # TODO: Translate into Russian
+      "benchmark-connections-argument" : "comma-separated connection counts to measure", # TODO: Translate into Russian
+      "benchmark-duration-argument" : "how long to measure each case, in seconds", # TODO: Translate into Russian
+      "benchmark-connections-error" : "Invalid connection counts: {}", # TODO: Translate into Russian
+      "benchmark-report-timers" : "{}: {} connections, {:.0f} State updates/s, {:.1f}% of a core, reactor lag p99 {:.1f} ms", # TODO: Translate into Russian
+      "benchmark-receive-argument" : "measure how many client lines one core can decode and handle", # TODO: Translate into Russian
+      "benchmark-messages-argument" : "number of lines to feed to the server", # TODO: Translate into Russian
+      "benchmark-record-argument" : "number of lines to record from a simulated client before replaying them", # TODO: Translate into Russian
+      "benchmark-lines-argument" : "file of client lines to replay, one per line, instead of recording them", # TODO: Translate into Russian
+      "benchmark-lines-error" : "Could not read client lines from '{}'", # TODO: Translate into Russian
+      "benchmark-report-receive" : "{} messages from {} recorded lines: {:.0f} messages/s per core", # TODO: Translate into Russian
       "server-messed-up-motd-unescaped-placeholders" : u"MOTD-сообщение содержит неэкранированные спец.символы. Все знаки $ должны быть продублированы ($$).",
       "server-messed-up-motd-too-long" : u"MOTD-сообщение слишком длинное: максимальная длина - {} символ(ов), текущая длина - {} символ(ов).",
 
@@ -865,6 +999,7 @@ de = {
        "not-json-error" : u"Kein JSON-String\n",
        "hello-arguments-error" : u"Zu wenige Hello-Argumente\n",
        "version-mismatch-error" : u"Verschiedene Versionen auf Client und Server\n",
+       "mpv-failed-connection": u"Failed to connect to mpv. Please make sure that mpv starts correctly.", # TODO: Translate to German
        "vlc-failed-connection": u"Kann nicht zu VLC verbinden. Wenn du syncplay.lua nicht installiert hast, findest du auf http://syncplay.pl/LUA/ [Englisch] eine Anleitung.",
        "vlc-failed-noscript": u"Laut VLC ist das syncplay.lua Interface-Skript nicht installiert. Auf http://syncplay.pl/LUA/ [Englisch] findest du eine Anleitung.",
        "vlc-failed-versioncheck": u"Diese VLC-Version wird von Syncplay nicht unterstützt. Bitte nutze VLC 2.0",
@@ -1097,6 +1232,72 @@ de = {
       "server-salt-argument" : u"zufällige Zeichenkette, die zur Erstellung von Passwörtern verwendet wird",
       "server-disable-ready-argument" : u"Bereitschaftsfeature deaktivieren",
       "server-motd-argument": u"Pfad zur Datei, von der die Nachricht des Tages geladen wird",
+      "server-shards-argument" : "number of worker processes rooms are spread across", # TODO: Translate to German
+      "server-metrics-port-argument" : "serve Prometheus metrics on this local port (shards use consecutive ports)", # TODO: Translate to German
+      "shards-unsupported-server-error" : "Running the server with more than one shard requires UNIX domain sockets with descriptor passing, which are not available on this system", # TODO: Translate to German
+      "shard-exited-server-notification" : "Shard {} has stopped, shutting down the server", # Shard index # TODO: Translate to German
+
+      "loadtest-argument-description" : "Load test for a Syncplay server using simulated clients", # TODO: Translate to German
+      "loadtest-host-argument" : "address of the server to test (a local server is started if omitted)", # TODO: Translate to German
+      "loadtest-port-argument" : "server TCP port", # TODO: Translate to German
+      "loadtest-clients-argument" : "number of simulated clients", # TODO: Translate to German
+      "loadtest-rooms-argument" : "number of rooms clients are spread across", # TODO: Translate to German
+      "loadtest-processes-argument" : "number of processes running the simulated clients", # TODO: Translate to German
+      "loadtest-duration-argument" : "how long to keep clients connected after the ramp-up, in seconds", # TODO: Translate to German
+      "loadtest-ramp-argument" : "time over which clients connect, in seconds", # TODO: Translate to German
+      "loadtest-action-interval-argument" : "average time between actions of each client, in seconds", # TODO: Translate to German
+      "loadtest-report-clients" : "Clients: {} connected, {} failed to connect, {} disconnected", # TODO: Translate to German
+      "loadtest-report-messages" : "Messages: {:.0f}/s received, {:.0f}/s sent ({:.1f} KiB/s in, {:.1f} KiB/s out)", # TODO: Translate to German
+      "loadtest-report-latency" : "State round trip: p50 {:.1f} ms, p99 {:.1f} ms", # TODO: Translate to German
+      "loadtest-report-memory" : "Server memory: {:.1f} KiB per connection", # TODO: Translate to German
+      "loadtest-report-lag" : "Reactor lag: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate to German
+      "simulator-argument-description" : "Deterministic simulation of Syncplay clients and a server on a virtual clock", # TODO: Translate to German
+      "simulator-clients-argument" : "number of simulated clients", # TODO: Translate to German
+      "simulator-rooms-argument" : "number of rooms clients are spread across", # TODO: Translate to German
+      "simulator-duration-argument" : "simulated watch time, in seconds", # TODO: Translate to German
+      "simulator-latency-argument" : "one-way network latency, in seconds", # TODO: Translate to German
+      "simulator-jitter-argument" : "largest random extra delay of a message, in seconds", # TODO: Translate to German
+      "simulator-latency-trace-argument" : "file of recorded one-way message delays in seconds, one per line, to replay instead of --latency and --jitter", # TODO: Translate to German
+      "simulator-loss-argument" : "probability that a message is lost and has to be retransmitted", # TODO: Translate to German
+      "simulator-drift-argument" : "largest playback rate error of a simulated player, as a fraction", # TODO: Translate to German
+      "simulator-action-interval-argument" : "average time between user actions in each room, in seconds (0 disables actions)", # TODO: Translate to German
+      "simulator-threshold-argument" : "largest spread of positions in a room that counts as in sync, in seconds", # TODO: Translate to German
+      "simulator-seed-argument" : "seed for the random number generator", # TODO: Translate to German
+      "simulator-poll-argument" : "simulate players that have to be polled for their status", # TODO: Translate to German
+      "simulator-report-time" : "Simulated {:.0f} s in {:.1f} s ({:.0f}x real time)", # TODO: Translate to German
+      "simulator-report-convergence" : "Convergence after {} actions: p50 {:.2f} s, p99 {:.2f} s, max {:.2f} s, {} did not converge", # TODO: Translate to German
+      "simulator-report-corrections" : "Corrections: {} rewinds, {} fast-forwards, {} slowdowns", # TODO: Translate to German
+      "simulator-report-drift" : "Residual drift: p50 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms", # TODO: Translate to German
+      "simulator-report-message-age" : "Message age error: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate to German
+      "simulator-report-player" : "Player status: {:.1f} queries/s and {:.2f} pushes/s per client", # TODO: Translate to German
+      "simulator-latency-trace-error" : "Could not read latency trace '{}'", # TODO: Translate to German
+      "playercheck-argument-description" : "Checks that a media player backend never blocks the Twisted reactor", # TODO: Translate to German
+      "playercheck-player-path-argument" : "path to the media player executable to check", # TODO: Translate to German
+      "playercheck-file-argument" : "file to open in the media player", # TODO: Translate to German
+      "playercheck-duration-argument" : "how long to drive the player, in seconds", # TODO: Translate to German
+      "playercheck-storm-interval-argument" : "time between bursts of seeks, pauses and speed changes, in seconds", # TODO: Translate to German
+      "playercheck-seeks-argument" : "number of seeks in each burst", # TODO: Translate to German
+      "playercheck-threshold-argument" : "longest time a player call may take, in seconds", # TODO: Translate to German
+      "playercheck-lag-threshold-argument" : "longest the reactor may lag behind its timers, in seconds", # TODO: Translate to German
+      "playercheck-drop-replies-argument" : "number of player output lines to discard, one after each burst, to check that lost replies do not stop status updates", # TODO: Translate to German
+      "playercheck-report-call" : "{}: {} calls, p99 {:.1f} ms, max {:.1f} ms", # TODO: Translate to German
+      "playercheck-report-status" : "Player status: {} updates, {} file updates, longest gap {:.2f} s", # TODO: Translate to German
+      "playercheck-report-passed" : "No player call blocked the reactor for more than {:.0f} ms, and it never lagged by more than {:.0f} ms", # TODO: Translate to German
+      "playercheck-report-failed" : "FAILED: a player call blocked the reactor for more than {:.0f} ms", # TODO: Translate to German
+      "playercheck-report-lagged" : "FAILED: the reactor lagged by more than {:.0f} ms", # TODO: Translate to German
+      "playercheck-report-stalled" : "FAILED: the player stopped reporting its status for {:.1f} s", # TODO: Translate to German
+      "benchmark-argument-description" : "Measures the cost of the server's hot paths", # TODO: Translate to German
+      "benchmark-timers-argument" : "compare one State timer per connection with the shared tick scheduler", # TODO: Translate to German
+      "benchmark-connections-argument" : "comma-separated connection counts to measure", # TODO: Translate to German
+      "benchmark-duration-argument" : "how long to measure each case, in seconds", # TODO: Translate to German
+      "benchmark-connections-error" : "Invalid connection counts: {}", # TODO: Translate to German
+      "benchmark-report-timers" : "{}: {} connections, {:.0f} State updates/s, {:.1f}% of a core, reactor lag p99 {:.1f} ms", # TODO: Translate to German
+      "benchmark-receive-argument" : "measure how many client lines one core can decode and handle", # TODO: Translate to German
+      "benchmark-messages-argument" : "number of lines to feed to the server", # TODO: Translate to German
+      "benchmark-record-argument" : "number of lines to record from a simulated client before replaying them", # TODO: Translate to German
+      "benchmark-lines-argument" : "file of client lines to replay, one per line, instead of recording them", # TODO: Translate to German
+      "benchmark-lines-error" : "Could not read client lines from '{}'", # TODO: Translate to German
+      "benchmark-report-receive" : "{} messages from {} recorded lines: {:.0f} messages/s per core", # TODO: Translate to German
       "server-messed-up-motd-unescaped-placeholders": u"Die Nachricht des Tages hat unmaskierte Platzhalter. Alle $-Zeichen sollten verdoppelt werden ($$).",
       "server-messed-up-motd-too-long": u"Die Nachricht des Tages ist zu lang - Maximal {} Zeichen, aktuell {}.",
 
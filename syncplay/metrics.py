@@ -0,0 +1,115 @@
+import bisect
+from twisted.internet import reactor, task
+from twisted.web import resource, server
+from syncplay import clock, constants
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0
+        self._count = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def render(self, name, help_):
+        lines = ["# HELP {} {}".format(name, help_), "# TYPE {} histogram".format(name)]
+        cumulative = 0
+        for bucket, count in zip(self._buckets, self._counts):
+            cumulative += count
+            lines.append('{}_bucket{{le="{}"}} {}'.format(name, bucket, cumulative))
+        lines.append('{}_bucket{{le="+Inf"}} {}'.format(name, self._count))
+        lines.append("{}_sum {}".format(name, self._sum))
+        lines.append("{}_count {}".format(name, self._count))
+        return lines
+
+
+class ServerMetrics(object):
+    def __init__(self, factory):
+        self._factory = factory
+        self._connections = 0
+        self._received = {}
+        self._sent = {}
+        self._bytesReceived = 0
+        self._bytesSent = 0
+        self._decodeTime = 0
+        self._encodeTime = 0
+        self._rtt = Histogram(constants.METRICS_TIME_BUCKETS)
+        self._reactorLag = Histogram(constants.METRICS_TIME_BUCKETS)
+        self._lastLagCheck = None
+        self._lagCheck = task.LoopingCall(self._checkReactorLag)
+
+    def listen(self, port):
+        self._lagCheck.start(constants.METRICS_LAG_INTERVAL)
+        reactor.listenTCP(port, server.Site(MetricsResource(self)), interface="127.0.0.1")
+
+    def _checkReactorLag(self):
+        now = clock.now()
+        if self._lastLagCheck is not None:
+            self._reactorLag.observe(max(0, now - self._lastLagCheck - constants.METRICS_LAG_INTERVAL))
+        self._lastLagCheck = now
+
+    def connectionOpened(self):
+        self._connections += 1
+
+    def connectionClosed(self):
+        self._connections -= 1
+
+    def messageReceived(self, messages, length, decodeTime):
+        for command in messages:
+            self._received[command] = self._received.get(command, 0) + 1
+        self._bytesReceived += length
+        self._decodeTime += decodeTime
+
+    def messageSent(self, command, length):
+        self._sent[command] = self._sent.get(command, 0) + 1
+        self._bytesSent += length
+
+    def addEncodeTime(self, encodeTime):
+        self._encodeTime += encodeTime
+
+    def observeRtt(self, rtt):
+        self._rtt.observe(rtt)
+
+    def _renderValue(self, name, type_, help_, value):
+        return ["# HELP {} {}".format(name, help_), "# TYPE {} {}".format(name, type_), "{} {}".format(name, value)]
+
+    def _renderCommands(self, name, help_, counts):
+        lines = ["# HELP {} {}".format(name, help_), "# TYPE {} counter".format(name)]
+        for command, count in sorted(counts.iteritems()):
+            lines.append('{}{{command="{}"}} {}'.format(name, command, count))
+        return lines
+
+    def render(self):
+        roomSizes = Histogram(constants.METRICS_ROOM_SIZE_BUCKETS)
+        for size in self._factory.getRoomSizes():
+            roomSizes.observe(size)
+        lines = []
+        lines += self._renderValue("syncplay_connections", "gauge", "Open client connections.", self._connections)
+        lines += self._renderValue("syncplay_rooms", "gauge", "Rooms with at least one user.", roomSizes._count)
+        lines += roomSizes.render("syncplay_room_users", "Users per room.")
+        lines += self._renderCommands("syncplay_messages_received_total", "Messages received by command.", self._received)
+        lines += self._renderCommands("syncplay_messages_sent_total", "Messages sent by command.", self._sent)
+        lines += self._renderValue("syncplay_received_bytes_total", "counter", "Bytes of messages received.", self._bytesReceived)
+        lines += self._renderValue("syncplay_sent_bytes_total", "counter", "Bytes of messages sent.", self._bytesSent)
+        lines += self._renderValue("syncplay_json_decode_seconds_total", "counter", "Time spent decoding messages.", self._decodeTime)
+        lines += self._renderValue("syncplay_json_encode_seconds_total", "counter", "Time spent encoding messages.", self._encodeTime)
+        lines += self._reactorLag.render("syncplay_reactor_lag_seconds", "Delay of reactor timers past their deadline.")
+        lines += self._rtt.render("syncplay_client_rtt_seconds", "Round trip times measured with clients.")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def __init__(self, metrics):
+        resource.Resource.__init__(self)
+        self._metrics = metrics
+
+    def render_GET(self, request):
+        request.setHeader("Content-Type", "text/plain; version=0.0.4")
+        return self._metrics.render()
@@ -0,0 +1,190 @@
+import argparse
+import collections
+import random
+from twisted.internet import reactor
+from syncplay import clock, constants
+from syncplay.loadtest import getPercentile
+from syncplay.messages import getMessage
+from syncplay.players.playerFactory import PlayerFactory
+
+
+class TimedPlayer(object):
+    def __init__(self, player, callTimes):
+        self._player = player
+        self._callTimes = callTimes
+
+    def __getattr__(self, name):
+        attribute = getattr(self._player, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def timedCall(*args, **kwargs):
+            startedOn = clock.now()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self._callTimes[name].append(clock.now() - startedOn)
+        return timedCall
+
+
+class PlayerCheckUI(object):
+    def __init__(self, debug):
+        self._debug = debug
+
+    def showMessage(self, message, noTimestamp=False):
+        print message
+
+    def showDebugMessage(self, message):
+        if self._debug:
+            print message
+
+    def showErrorMessage(self, message, criticalerror=False):
+        print message
+
+
+class PlayerCheckClient(object):
+    def __init__(self, args):
+        self._args = args
+        self._rng = random.Random(0)
+        self.ui = PlayerCheckUI(args.debug)
+        self.callTimes = collections.defaultdict(list)
+        self.lags = []
+        self.statusUpdates = 0
+        self.fileUpdates = 0
+        self.droppedLines = 0
+        self.longestStatusGap = 0
+        self._player = None
+        self._running = True
+        self._globalPaused = True
+        self._globalPosition = 0.0
+        self._loops = []
+        self._lastLagCheck = None
+        self._lastStatusOn = None
+        self._linesToDrop = 0
+
+    def initPlayer(self, player):
+        self._player = TimedPlayer(player, self.callTimes)
+        if self._args.drop_replies and hasattr(player, "lineReceived"):
+            player.lineReceived = self._dropLines(player.lineReceived)
+        askDelay = constants.PLAYER_STATUS_REFRESH_DELAY if player.statusPushSupported else constants.PLAYER_ASK_DELAY
+        self._startLoop(self._player.askForStatus, askDelay)
+        self._startLoop(self._storm, self._args.storm_interval)
+        self._startLoop(self._checkLag, constants.PLAYERCHECK_LAG_INTERVAL)
+        clock.callLater(self._args.duration, self.stop)
+
+    def _startLoop(self, f, interval):
+        loop = clock.loopingCall(f)
+        loop.start(interval, now=False)
+        self._loops.append(loop)
+
+    def _dropLines(self, lineReceived):
+        def droppingLineReceived(line):
+            if self._linesToDrop:
+                self._linesToDrop -= 1
+                self.droppedLines += 1
+                return
+            lineReceived(line)
+        return droppingLineReceived
+
+    def _checkStatusGap(self, now):
+        if self._lastStatusOn is not None:
+            self.longestStatusGap = max(self.longestStatusGap, now - self._lastStatusOn)
+
+    def _checkLag(self):
+        now = clock.now()
+        if self._lastLagCheck is not None:
+            self.lags.append(max(0, now - self._lastLagCheck - constants.PLAYERCHECK_LAG_INTERVAL))
+        self._lastLagCheck = now
+
+    def _storm(self):
+        for _ in xrange(self._args.seeks):
+            self._globalPosition = self._rng.uniform(0, 60)
+            self._player.setPosition(self._globalPosition)
+        self._globalPaused = not self._globalPaused
+        self._player.setPaused(self._globalPaused)
+        self._player.setSpeed(constants.SLOWDOWN_RATE)
+        self._player.setSpeed(1.0)
+        self._player.displayMessage(getMessage("playercheck-argument-description"))
+        if self.droppedLines + self._linesToDrop < self._args.drop_replies:
+            self._linesToDrop += 1
+
+    def updatePlayerStatus(self, paused, position):
+        self.statusUpdates += 1
+        now = clock.now()
+        self._checkStatusGap(now)
+        self._lastStatusOn = now
+
+    def updateFile(self, filename, duration, path):
+        self.fileUpdates += 1
+
+    def getGlobalPaused(self):
+        return self._globalPaused
+
+    def getGlobalPosition(self):
+        return self._globalPosition
+
+    def stop(self, promptForAction=False):
+        if not self._running:
+            return
+        self._running = False
+        self._checkStatusGap(clock.now())
+        for loop in self._loops:
+            if loop.running:
+                loop.stop()
+        if self._player:
+            self._player.drop()
+        reactor.callLater(0.1, reactor.stop)
+
+
+class PlayerCheck(object):
+    def __init__(self, args):
+        self._args = args
+        self._client = PlayerCheckClient(args)
+
+    def run(self):
+        playerClass = PlayerFactory().getPlayerByPath(self._args.player_path)
+        if playerClass is None:
+            print getMessage("player-path-config-error")
+            return False
+        reactor.callWhenRunning(playerClass.run, self._client, self._args.player_path, self._args.file, [])
+        reactor.run()
+        return self.report()
+
+    def report(self):
+        threshold = self._args.threshold
+        slowest = 0
+        for name, times in sorted(self._client.callTimes.items()):
+            print getMessage("playercheck-report-call").format(name, len(times), getPercentile(times, 99) * 1000, max(times) * 1000)
+            slowest = max([slowest] + times)
+        lags = self._client.lags
+        print getMessage("loadtest-report-lag").format(getPercentile(lags, 50) * 1000, getPercentile(lags, 99) * 1000, max(lags or [0]) * 1000)
+        print getMessage("playercheck-report-status").format(self._client.statusUpdates, self._client.fileUpdates, self._client.longestStatusGap)
+        if self._client.statusUpdates == 0 or self._client.longestStatusGap > constants.PLAYERCHECK_STATUS_GAP_THRESHOLD:
+            print getMessage("playercheck-report-stalled").format(self._client.longestStatusGap)
+            return False
+        if slowest > threshold:
+            print getMessage("playercheck-report-failed").format(threshold * 1000)
+            return False
+        if max(lags or [0]) > self._args.lag_threshold:
+            print getMessage("playercheck-report-lagged").format(self._args.lag_threshold * 1000)
+            return False
+        print getMessage("playercheck-report-passed").format(threshold * 1000, self._args.lag_threshold * 1000)
+        return True
+
+
+class PlayerCheckConfigurationGetter(object):
+    def getConfiguration(self):
+        self._prepareArgParser()
+        return self._argparser.parse_args()
+
+    def _prepareArgParser(self):
+        self._argparser = argparse.ArgumentParser(description=getMessage("playercheck-argument-description"))
+        self._argparser.add_argument('player_path', metavar='player', type=str, help=getMessage("playercheck-player-path-argument"))
+        self._argparser.add_argument('file', metavar='file', type=str, help=getMessage("playercheck-file-argument"))
+        self._argparser.add_argument('--duration', metavar='seconds', type=float, default=20, help=getMessage("playercheck-duration-argument"))
+        self._argparser.add_argument('--storm-interval', metavar='seconds', type=float, default=2, help=getMessage("playercheck-storm-interval-argument"))
+        self._argparser.add_argument('--seeks', metavar='seeks', type=int, default=20, help=getMessage("playercheck-seeks-argument"))
+        self._argparser.add_argument('--threshold', metavar='seconds', type=float, default=constants.PLAYERCHECK_BLOCKING_THRESHOLD, help=getMessage("playercheck-threshold-argument"))
+        self._argparser.add_argument('--lag-threshold', metavar='seconds', type=float, default=constants.PLAYERCHECK_LAG_THRESHOLD, help=getMessage("playercheck-lag-threshold-argument"))
+        self._argparser.add_argument('--drop-replies', metavar='lines', type=int, default=0, help=getMessage("playercheck-drop-replies-argument"))
+        self._argparser.add_argument('-d', '--debug', action='store_true', help=getMessage("debug-argument"))
@@ -1,10 +1,14 @@
-from syncplay import constants
+import os
+from twisted.internet import defer
+from syncplay import clock, constants
 class BasePlayer(object):
   
     '''
     This method is supposed to 
     execute updatePlayerStatus(paused, position) on client
     Given the arguments: boolean paused and float position in seconds 
+    Players with statusPushSupported also execute it whenever the pause state or position
+    changes, and are asked only every PLAYER_STATUS_REFRESH_DELAY
     '''
     def askForStatus(self):
         raise NotImplementedError()
@@ -121,4 +125,108 @@ class DummyPlayer(BasePlayer):
 
     @staticmethod
     def getPlayerPathErrors(playerPath, filePath):
-        return None
\ No newline at end of file
+        return None
+
+
+class PlayerPositionModel(object):
+    '''
+    Extrapolates a player's position between samples from its playback rate.
+    Samples are dated half a round trip before they arrive, using the delay
+    of the request they answer or, for pushed samples, the average delay.
+    '''
+    def __init__(self):
+        self._position = 0.0
+        self._paused = True
+        self._rate = 1.0
+        self._sampledOn = None
+        self._latency = None
+
+    def getLatency(self):
+        return self._latency
+
+    def getSampleAge(self):
+        if self._sampledOn is None:
+            return None
+        return clock.now() - self._sampledOn
+
+    def getPosition(self):
+        if self._sampledOn is None or self._paused:
+            return self._position
+        return self._position + (clock.now() - self._sampledOn) * self._rate
+
+    def setRate(self, rate):
+        self._fold()
+        self._rate = rate
+
+    def setPaused(self, paused):
+        self._fold()
+        self._paused = paused
+
+    def setPosition(self, position):
+        self._position = position
+        self._sampledOn = clock.now()
+
+    def addSample(self, position, paused=None, sentOn=None):
+        now = clock.now()
+        if sentOn is not None:
+            roundTrip = max(0.0, now - sentOn)
+            if self._latency is None:
+                self._latency = roundTrip
+            else:
+                weight = constants.PLAYER_LATENCY_MOVING_AVERAGE_WEIGHT
+                self._latency = self._latency * weight + roundTrip * (1 - weight)
+        else:
+            roundTrip = self._latency or 0.0
+        if paused is not None:
+            self._paused = paused
+        self._position = position
+        self._sampledOn = now - roundTrip / 2
+
+    def _fold(self):
+        if self._sampledOn is not None:
+            self._position = self.getPosition()
+            self._sampledOn = clock.now()
+
+
+class FileInfoFetcher(object):
+    '''
+    Collects the filename, duration and path queried after a file change into
+    one call of onFileInfo(filename, duration, path). A newer file change
+    cancels the request in flight, and answers still missing after
+    PLAYER_FILE_INFO_TIMEOUT are given up on.
+    '''
+    def __init__(self, onFileInfo):
+        self._onFileInfo = onFileInfo
+        self._pending = None
+        self._timeout = None
+
+    def fetch(self, filenameQuery, durationQuery, pathQuery):
+        self.cancel()
+        queries = [filenameQuery, durationQuery, pathQuery]
+        d = defer.DeferredList(queries, consumeErrors=True)
+        self._pending = d
+        self._timeout = clock.callLater(constants.PLAYER_FILE_INFO_TIMEOUT, self._timedOut, queries)
+        d.addCallback(self._gathered, d)
+
+    def cancel(self):
+        if self._timeout is not None and self._timeout.active():
+            self._timeout.cancel()
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            pending.cancel()
+
+    def _timedOut(self, queries):
+        for query in queries:
+            if not query.called:
+                query.cancel()
+
+    def _gathered(self, results, d):
+        if d is not self._pending:
+            return
+        self._pending = None
+        if self._timeout.active():
+            self._timeout.cancel()
+        filename, duration, path = [result if success else None for success, result in results]
+        if path and not filename:
+            filename = os.path.basename(path)
+        self._onFileInfo(filename, duration or 0, path)
@@ -4,10 +4,10 @@ import threading
 import thread
 import win32con, win32api, win32gui, ctypes, ctypes.wintypes #@UnresolvedImport @UnusedImport
 from functools import wraps
-from syncplay.players.basePlayer import BasePlayer
+from syncplay.players.basePlayer import BasePlayer, PlayerPositionModel
 import re
 from syncplay.utils import retry
-from syncplay import constants  
+from syncplay import clock, constants
 from syncplay.messages import getMessage
 import os.path
 
@@ -306,6 +306,7 @@ class MpcHcApi:
 
 class MPCHCAPIPlayer(BasePlayer):
     speedSupported = False
+    statusPushSupported = False
     secondaryOSDSupported = False
     customOpenDialog = False
     osdMessageSeparator = "; "
@@ -314,16 +315,18 @@ class MPCHCAPIPlayer(BasePlayer):
         from twisted.internet import reactor
         self.reactor = reactor
         self.__client = client
+        self._positionModel = PlayerPositionModel()
         self._mpcApi = MpcHcApi()
         self._mpcApi.callbacks.onUpdateFilename = lambda _: self.__makePing()
         self._mpcApi.callbacks.onMpcClosed = lambda _: self.reactor.callFromThread(self.__client.stop, False,)
         self._mpcApi.callbacks.onFileStateChange = lambda _: self.__lockAsking()
-        self._mpcApi.callbacks.onUpdatePlaystate = lambda _: self.__unlockAsking()
+        self._mpcApi.callbacks.onUpdatePlaystate = lambda _: self.__onUpdatePlaystate()
         self._mpcApi.callbacks.onGetCurrentPosition = lambda _: self.__onGetPosition()
         self._mpcApi.callbacks.onVersion = lambda _: self.__versionUpdate.set()
         self.__switchPauseCalls = False
         self.__preventAsking = threading.Event()
         self.__positionUpdate = threading.Event()
+        self.__playstateUpdate = threading.Event()
         self.__versionUpdate = threading.Event()
         self.__fileUpdate = threading.RLock()
         self.__versionUpdate.clear()
@@ -331,6 +334,7 @@ class MPCHCAPIPlayer(BasePlayer):
     def drop(self):
         self.__preventAsking.set()
         self.__positionUpdate.set()
+        self.__playstateUpdate.set()
         self.__versionUpdate.set()
         self._mpcApi.sendRawCommand(MpcHcApi.CMD_CLOSEAPP, "")
 
@@ -352,11 +356,16 @@ class MPCHCAPIPlayer(BasePlayer):
         
     def __unlockAsking(self):
         self.__preventAsking.set()
+
+    def __onUpdatePlaystate(self):
+        self.__unlockAsking()
+        self.__playstateUpdate.set()
     
     def __onGetPosition(self):
         self.__positionUpdate.set()
     
     def setSpeed(self, value):
+        self._positionModel.setRate(value)
         try:
             self._mpcApi.setSpeed(value)
         except MpcHcApi.PlayerNotReadyException:
@@ -401,6 +410,7 @@ class MPCHCAPIPlayer(BasePlayer):
     @retry(MpcHcApi.PlayerNotReadyException, constants.MPC_MAX_RETRIES, constants.MPC_RETRY_WAIT_TIME, 1)
     def setPaused(self, value):
         if self._mpcApi.filePlaying:
+            self._positionModel.setPaused(value)
             if self.__switchPauseCalls:
                 value = not value
             if value:
@@ -411,6 +421,7 @@ class MPCHCAPIPlayer(BasePlayer):
     @retry(MpcHcApi.PlayerNotReadyException, constants.MPC_MAX_RETRIES, constants.MPC_RETRY_WAIT_TIME, 1)
     def setPosition(self, value):
         if self._mpcApi.filePlaying:
+            self._positionModel.setPosition(value)
             self._mpcApi.seek(value)
         
     def __getPosition(self):
@@ -423,11 +434,12 @@ class MPCHCAPIPlayer(BasePlayer):
     def askForStatus(self):
         if self._mpcApi.filePlaying and self.__preventAsking.wait(0) and self.__fileUpdate.acquire(0):
             self.__fileUpdate.release()
+            askedOn = clock.now()
             position = self.__getPosition()
             paused = self._mpcApi.isPaused()
-            position = float(position)
+            self._positionModel.addSample(float(position), paused, askedOn)
             if self.__preventAsking.wait(0) and self.__fileUpdate.acquire(0):
-                self.__client.updatePlayerStatus(paused, position)
+                self.__client.updatePlayerStatus(paused, self._positionModel.getPosition())
                 self.__fileUpdate.release()
             return
         self.__echoGlobalStatus()
@@ -437,13 +449,16 @@ class MPCHCAPIPlayer(BasePlayer):
 
     def __forcePause(self):
         for _ in xrange(constants.MPC_MAX_RETRIES):
+            self.__playstateUpdate.clear()
             self.setPaused(True)
-            time.sleep(constants.MPC_RETRY_WAIT_TIME)
-        
+            if self.__playstateUpdate.wait(constants.MPC_RETRY_WAIT_TIME) and self._mpcApi.isPaused():
+                break
+
     def __refreshMpcPlayState(self):
-        for _ in xrange(2): 
+        for _ in xrange(2):
+            self.__playstateUpdate.clear()
             self._mpcApi.playPause()
-            time.sleep(constants.MPC_PAUSE_TOGGLE_DELAY)
+            self.__playstateUpdate.wait(constants.MPC_PAUSE_TOGGLE_DELAY)
 
     def _setPausedAccordinglyToServer(self):
         self.__forcePause()
@@ -1,14 +1,15 @@
-import subprocess
+import collections
 import re
-import threading
-import time
-from syncplay.players.basePlayer import BasePlayer
-from syncplay import constants, utils
+from twisted.internet import defer
+from twisted.internet.protocol import ProcessProtocol
+from syncplay.players.basePlayer import BasePlayer, FileInfoFetcher, PlayerPositionModel
+from syncplay import clock, constants, utils
 from syncplay.messages import getMessage
 import os, sys
 
 class MplayerPlayer(BasePlayer):
     speedSupported = True
+    statusPushSupported = False
     customOpenDialog = False
     secondaryOSDSupported = False
     osdMessageSeparator = "; "
@@ -23,6 +24,10 @@ class MplayerPlayer(BasePlayer):
         self._client = client
         self._paused = None
         self._position = 0.0
+        self._positionModel = PlayerPositionModel()
+        self._positionAskedOn = None
+        self._lastSeekOn = None
+        self._delayedSeek = None
         self._duration = None
         self._filename = None
         self._filepath = None
@@ -30,42 +35,25 @@ class MplayerPlayer(BasePlayer):
         self.lastLoadedTime = None
         self.fileLoaded = False
         self.delayedFilePath = None
+        self._propertyRequests = collections.defaultdict(collections.deque)
+        self._queriesSent = 0
+        self._fileInfoFetcher = FileInfoFetcher(self._fileInfoReceived)
         try:
             self._listener = self.__Listener(self, playerPath, filePath, args)
         except ValueError:
             self._client.ui.showMessage(getMessage("mplayer-file-required-notification"))
             self._client.ui.showMessage(getMessage("mplayer-file-required-notification/example"))
-            self.drop()
+            self._client.stop(True)
             return
-        self._listener.setDaemon(True)
-        self._listener.start()
-
-        self._durationAsk = threading.Event()
-        self._filenameAsk = threading.Event()
-        self._pathAsk = threading.Event()
-
-        self._positionAsk = threading.Event()
-        self._pausedAsk = threading.Event()
 
         self._preparePlayer()
 
-    def _fileUpdateClearEvents(self):
-        self._durationAsk.clear()
-        self._filenameAsk.clear()
-        self._pathAsk.clear()
-
-    def _fileUpdateWaitEvents(self):
-        self._durationAsk.wait()
-        self._filenameAsk.wait()
-        self._pathAsk.wait()
-
     def _onFileUpdate(self):
-        self._fileUpdateClearEvents()
-        self._getFilename()
-        self._getLength()
-        self._getFilepath()
-        self._fileUpdateWaitEvents()
-        self._client.updateFile(self._filename, self._duration, self._filepath)
+        self._fileInfoFetcher.fetch(self._queryProperty('filename', None), self._queryProperty('length', None),
+                                    self._queryProperty('path', None))
+
+    def _fileInfoReceived(self, filename, duration, path):
+        self._client.updateFile(filename, duration, path)
 
     def _preparePlayer(self):
         self.setPaused(True)
@@ -73,13 +61,87 @@ class MplayerPlayer(BasePlayer):
         self._onFileUpdate()
 
     def askForStatus(self):
-        self._positionAsk.clear()
-        self._pausedAsk.clear()
-        self._getPaused()
-        self._getPosition()
-        self._positionAsk.wait()
-        self._pausedAsk.wait()
-        self._client.updatePlayerStatus(self._paused, self._position)
+        # The position is not worth asking for while a seek is still waiting to be sent
+        seekDelayed = self._delayedSeek is not None and self._delayedSeek.active()
+        if seekDelayed or self._isWaitingFor('pause') or self._isWaitingFor(self.POSITION_QUERY):
+            self._statusUnavailable()
+            return
+        self._positionAskedOn = clock.now()
+        d = defer.gatherResults([self._queryProperty('pause'), self._queryProperty(self.POSITION_QUERY)], consumeErrors=True)
+        d.addCallbacks(self._statusReceived, self._statusFailed)
+
+    def _statusReceived(self, result):
+        self._reportStatus()
+
+    def _statusFailed(self, failure):
+        self._client.ui.showDebugMessage("player did not report its status in time")
+        self._statusUnavailable()
+
+    def _statusUnavailable(self):
+        pass
+
+    def _reportStatus(self):
+        self._client.updatePlayerStatus(self._paused, self._positionModel.getPosition())
+
+    def _isWaitingFor(self, name):
+        # Requests that gave up stay queued only to swallow their late answer, so they do not hold back new queries
+        return any(not d.called for _, d in self._propertyRequests[name])
+
+    def _queryProperty(self, property_, timeout=constants.PLAYER_STATUS_TIMEOUT):
+        d = defer.Deferred()
+        if timeout is not None:
+            d.addBoth(self._stopTimeout, clock.callLater(timeout, d.cancel))
+        self._propertyRequests[property_.lower()].append((self._sendQuery(property_), d))
+        return d
+
+    def _sendQuery(self, property_):
+        self._queriesSent += 1
+        self._getProperty(property_)
+        return self._queriesSent
+
+    def _stopTimeout(self, result, timeout):
+        if timeout.active():
+            timeout.cancel()
+        return result
+
+    def _propertyAnswered(self, name, value):
+        if name == self.POSITION_QUERY:
+            self._storePosition(value)
+        elif name == "pause":
+            self._storePauseState(value)
+        elif name == "length":
+            self._duration = value
+        elif name == "path":
+            self._filepath = value
+        elif name == "filename":
+            self._filename = value
+        d = self._takeRequest(name)
+        if d is not None and not d.called:
+            d.callback(value)
+
+    def _takeRequest(self, name):
+        requests = self._propertyRequests[name]
+        if not requests:
+            return None
+        query, d = requests.popleft()
+        # The player answers queries in order, so any sent before this one that are still queued lost their answer
+        for otherRequests in self._propertyRequests.itervalues():
+            while otherRequests and otherRequests[0][0] < query:
+                lost = otherRequests.popleft()[1]
+                if not lost.called:
+                    lost.cancel()
+        return d
+
+    def _retryProperty(self, name):
+        # Only ask again while someone still waits for the answer
+        d = self._takeRequest(name)
+        if d is not None and not d.called:
+            self._propertyRequests[name].append((self._sendQuery(name), d))
+
+    def _propertyUnavailable(self, name):
+        d = self._takeRequest(name)
+        if d is not None and not d.called:
+            d.errback(ValueError(name))
 
     def _setProperty(self, property_, value):
         self._listener.sendLine("set_property {} {}".format(property_, value))
@@ -91,6 +153,7 @@ class MplayerPlayer(BasePlayer):
         self._listener.sendLine(u'{} "{!s}" {} {}'.format(self.OSD_QUERY, message, duration, constants.MPLAYER_OSD_LEVEL).encode('utf-8'))
 
     def setSpeed(self, value):
+        self._positionModel.setRate(value)
         self._setProperty('speed', "{:.2f}".format(value))
 
     def _loadFile(self, filePath):
@@ -106,23 +169,27 @@ class MplayerPlayer(BasePlayer):
 
     def setPosition(self, value):
         self._position = value
+        self._positionModel.setPosition(value)
+        if self._delayedSeek is not None and self._delayedSeek.active():
+            self._delayedSeek.cancel()
+        wait = 0
+        if self._lastSeekOn is not None:
+            wait = self._lastSeekOn + constants.MPLAYER_SEEK_INTERVAL - clock.now()
+        if wait > 0:
+            self._delayedSeek = clock.callLater(wait, self._seek, value)
+        else:
+            self._seek(value)
+
+    def _seek(self, value):
+        self._lastSeekOn = clock.now()
         self._setProperty(self.POSITION_QUERY, "{}".format(value))
-        time.sleep(0.03)
 
     def setPaused(self, value):
         if self._paused <> value:
             self._paused = not self._paused
+            self._positionModel.setPaused(self._paused)
             self._listener.sendLine('pause')
 
-    def _getFilename(self):
-        self._getProperty('filename')
-
-    def _getLength(self):
-        self._getProperty('length')
-
-    def _getFilepath(self):
-        self._getProperty('path')
-
     def _getPaused(self):
         self._getProperty('pause')
 
@@ -143,6 +210,11 @@ class MplayerPlayer(BasePlayer):
 
     def _storePosition(self, value):
         self._position = value
+        self._addPositionSample()
+
+    def _addPositionSample(self):
+        sentOn, self._positionAskedOn = self._positionAskedOn, None
+        self._positionModel.addSample(self._position, self._paused, sentOn)
 
     def _storePauseState(self, value):
         self._paused = value
@@ -152,11 +224,15 @@ class MplayerPlayer(BasePlayer):
             self._client.ui.showDebugMessage("player << {}".format(line))
         if "Failed to get value of property" in line or "=(unavailable)" in line or line == "ANS_filename=" or line == "ANS_length=" or line == "ANS_path=":
             if "filename" in line:
-                self._getFilename()
+                self._retryProperty('filename')
             elif "length" in line:
-                self._getLength()
+                self._retryProperty('length')
             elif "path" in line:
-                self._getFilepath()
+                self._retryProperty('path')
+            elif self.POSITION_QUERY in line:
+                self._propertyUnavailable(self.POSITION_QUERY)
+            elif "pause" in line:
+                self._propertyUnavailable("pause")
             return
         match = self.RE_ANSWER.match(line)
         if not match:
@@ -167,25 +243,20 @@ class MplayerPlayer(BasePlayer):
         name = name.lower()
 
         if name == self.POSITION_QUERY:
-            self._storePosition(float(value))
-            self._positionAsk.set()
+            self._propertyAnswered(name, float(value))
         elif name == "pause":
-            self._storePauseState(bool(value == 'yes'))
-            self._pausedAsk.set()
+            self._propertyAnswered(name, bool(value == 'yes'))
         elif name == "length":
-            self._duration = float(value)
-            self._durationAsk.set()
+            self._propertyAnswered(name, float(value))
         elif name == "path":
-            self._filepath = value
-            self._pathAsk.set()
+            self._propertyAnswered(name, value)
         elif name == "filename":
-            self._filename = value.decode('utf-8')
-            self._filenameAsk.set()
+            self._propertyAnswered(name, value.decode('utf-8'))
         elif name == "exiting":
             if value != 'Quit':
                 if self.quitReason is None:
                     self.quitReason = getMessage("media-player-error").format(value)
-                self.reactor.callFromThread(self._client.ui.showErrorMessage, self.quitReason, True)
+                self._client.ui.showErrorMessage(self.quitReason, True)
             self.drop()
 
     @staticmethod
@@ -242,22 +313,15 @@ class MplayerPlayer(BasePlayer):
                 return path
 
     def notMplayer2(self):
-        self.reactor.callFromThread(self._client.ui.showErrorMessage, getMessage("mplayer2-required"), True)
+        self._client.ui.showErrorMessage(getMessage("mplayer2-required"), True)
         self.drop()
 
-    def _takeLocksDown(self):
-        self._durationAsk.set()
-        self._filenameAsk.set()
-        self._pathAsk.set()
-        self._positionAsk.set()
-        self._pausedAsk.set()
-
     def drop(self):
+        self._fileInfoFetcher.cancel()
         self._listener.sendLine('quit')
-        self._takeLocksDown()
-        self.reactor.callFromThread(self._client.stop, True)
+        self._client.stop(True)
 
-    class __Listener(threading.Thread):
+    class __Listener(ProcessProtocol):
         def __init__(self, playerController, playerPath, filePath, args):
             self.__playerController = playerController
             if self.__playerController.getPlayerPathErrors(playerPath,filePath):
@@ -282,12 +346,13 @@ class MplayerPlayer(BasePlayer):
             env = os.environ.copy()
             if 'TERM' in env:
                 del env['TERM']
-            if filePath:
-                self.__process = subprocess.Popen(call, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=self.__getCwd(filePath, env), env=env)
-            else:
-                self.__process = subprocess.Popen(call, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
-            threading.Thread.__init__(self, name="MPlayer Listener")
-
+            self._buffers = {1: "", 2: ""}
+            self._firstLine = True
+            self._writePaused = False
+            self._pendingLines = []
+            encoding = sys.getfilesystemencoding() or 'utf8'
+            call = [arg.encode(encoding) if isinstance(arg, unicode) else arg for arg in call]
+            playerController.reactor.spawnProcess(self, utils.findExecutable(call[0]), call, env=env, path=self.__getCwd(filePath, env))
 
         def __getCwd(self, filePath, env):
             if not filePath:
@@ -302,25 +367,57 @@ class MplayerPlayer(BasePlayer):
                 cwd = None
             return cwd
 
-        def run(self):
-            line = self.__process.stdout.readline()
-            if "MPlayer 1" in line:
-                self.__playerController.notMplayer2()
-            else:
-                line = line.rstrip("\r\n")
-                self.__playerController.lineReceived(line)
-            while self.__process.poll() is None:
-                line = self.__process.stdout.readline()
-                line = line.rstrip("\r\n")
-                self.__playerController.lineReceived(line)
+        def connectionMade(self):
+            self.transport.registerProducer(self, True)
+
+        def childDataReceived(self, childFD, data):
+            lines = (self._buffers.get(childFD, "") + data).split("\n")
+            self._buffers[childFD] = lines.pop()
+            for line in lines:
+                if self._firstLine:
+                    self._firstLine = False
+                    if "MPlayer 1" in line:
+                        self.__playerController.notMplayer2()
+                        continue
+                self.__playerController.lineReceived(line.rstrip("\r"))
+
+        def processEnded(self, reason):
+            self.transport = None
             self.__playerController.drop()
 
+        def pauseProducing(self):
+            self._writePaused = True
+
+        def resumeProducing(self):
+            self._writePaused = False
+            lines, self._pendingLines = self._pendingLines, []
+            for _, line in lines:
+                self.transport.write(line)
+
+        def stopProducing(self):
+            self._pendingLines = []
+
+        def _getReplacementKey(self, line):
+            # Only the latest of these commands matters once the player stops reading its input
+            words = line.split(" ", 3)
+            if words[0] == "set_property":
+                return words[:2]
+            elif words[:2] == ["no-osd", "set"]:
+                return words[:3]
+            elif words[0] == self.__playerController.OSD_QUERY:
+                return words[:1]
+
         def sendLine(self, line):
-            try:
-                if not isinstance(line, unicode):
-                    line = line.decode('utf8')
-                line = (line + u"\n").encode('utf8')
-                self.__playerController._client.ui.showDebugMessage("player >> {}".format(line))
-                self.__process.stdin.write(line)
-            except IOError:
-                pass
+            if not isinstance(line, unicode):
+                line = line.decode('utf8')
+            line = (line + u"\n").encode('utf8')
+            self.__playerController._client.ui.showDebugMessage("player >> {}".format(line))
+            if self.transport is None:
+                return
+            if not self._writePaused:
+                self.transport.write(line)
+                return
+            key = self._getReplacementKey(line)
+            if key is not None:
+                self._pendingLines = [(pendingKey, pendingLine) for pendingKey, pendingLine in self._pendingLines if pendingKey != key]
+            self._pendingLines.append((key, line))
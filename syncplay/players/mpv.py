@@ -1,12 +1,20 @@
+import collections
+import json
 import re
+import shutil
 import subprocess
+import tempfile
+from twisted.internet import defer
+from twisted.internet.protocol import ClientFactory, ProcessProtocol
+from twisted.protocols.basic import LineReceiver
+from syncplay.players.basePlayer import FileInfoFetcher, PlayerPositionModel
 from syncplay.players.mplayer import MplayerPlayer
 from syncplay.messages import getMessage
-from syncplay import constants
-import os, sys, time
+from syncplay import clock, constants, utils
+import os, sys
 
 class MpvPlayer(MplayerPlayer):
-    RE_VERSION = re.compile('.*mpv (\d)\.(\d)\.\d.*')
+    RE_VERSION = re.compile('.*mpv (\d+)\.(\d+)\.(\d+).*')
     osdMessageSeparator = "\\n"
 
     @staticmethod
@@ -16,14 +24,17 @@ class MpvPlayer(MplayerPlayer):
         except:
             ver = None
         constants.MPV_NEW_VERSION = ver is None or int(ver.group(1)) > 0 or int(ver.group(2)) >= 6
-        if constants.MPV_NEW_VERSION:
+        ipcSupported = ver is None or utils.meetsMinVersion(".".join(ver.groups()), constants.MPV_IPC_MIN_VERSION)
+        if ipcSupported and not sys.platform.startswith('win'):
+            return IpcMpvPlayer(client, MpvPlayer.getExpandedPath(playerPath), filePath, args)
+        elif constants.MPV_NEW_VERSION:
             return NewMpvPlayer(client, MpvPlayer.getExpandedPath(playerPath), filePath, args)
         else:
             return OldMpvPlayer(client, MpvPlayer.getExpandedPath(playerPath), filePath, args)
 
     @staticmethod
     def getStartupArgs(path, userArgs):
-        args = constants.MPV_ARGS
+        args = list(constants.MPV_ARGS)
         if userArgs:
             args.extend(userArgs)
         args.extend(constants.MPV_SLAVE_ARGS)
@@ -80,6 +91,7 @@ class OldMpvPlayer(MpvPlayer):
     def setPaused(self, value):
         if self._paused <> value:
             self._paused = not self._paused
+            self._positionModel.setPaused(self._paused)
             self._listener.sendLine('cycle pause')
 
     def mpvVersionErrorCheck(self, line):
@@ -87,7 +99,7 @@ class OldMpvPlayer(MpvPlayer):
             self.quitReason = getMessage("mpv-version-error")
 
         elif "Could not open pipe at '/dev/stdin'" in line:
-            self.reactor.callFromThread(self._client.ui.showErrorMessage, getMessage("mpv-version-error"), True)
+            self._client.ui.showErrorMessage(getMessage("mpv-version-error"), True)
             self.drop()
 
         elif "[ytdl_hook] Your version of youtube-dl is too old" in line:
@@ -99,21 +111,13 @@ class OldMpvPlayer(MpvPlayer):
             newpath = line[9:]
             oldpath = self._filepath
             if newpath != oldpath and oldpath is not None:
-                self.reactor.callFromThread(self._onFileUpdate)
+                self._onFileUpdate()
                 if self._paused != self._client.getGlobalPaused():
                     self.setPaused(self._client.getGlobalPaused())
                 self.setPosition(self._client.getGlobalPosition())
 
 class NewMpvPlayer(OldMpvPlayer):
     lastResetTime = None
-    lastMPVPositionUpdate = None
-
-    def setPaused(self, value):
-        if self._paused <> value:
-            self._paused = not self._paused
-            self._listener.sendLine('cycle pause')
-            if value == False:
-                self.lastMPVPositionUpdate = time.time()
 
     def _getProperty(self, property_):
         floatProperties = ['length','time-pos']
@@ -127,26 +131,25 @@ class NewMpvPlayer(OldMpvPlayer):
         if self.fileLoaded == False:
             return self._client.getGlobalPosition()
 
-        if self.lastMPVPositionUpdate is None:
+        diff = self._positionModel.getSampleAge()
+        if diff is None:
             return self._client.getGlobalPosition()
-        diff = time.time() - self.lastMPVPositionUpdate
         if diff > constants.MPV_UNRESPONSIVE_THRESHOLD:
-            self.reactor.callFromThread(self._client.ui.showErrorMessage, getMessage("mpv-unresponsive-error").format(int(diff)), True)
+            self._client.ui.showErrorMessage(getMessage("mpv-unresponsive-error").format(int(diff)), True)
             self.drop()
+        position = self._positionModel.getPosition()
         if diff > constants.PLAYER_ASK_DELAY and not self._paused:
-            self._client.ui.showDebugMessage("mpv did not response in time, so assuming position is {} ({}+{})".format(self._position + diff, self._position, diff))
-            return self._position + diff
-        else:
-            return self._position
+            self._client.ui.showDebugMessage("mpv did not response in time, so assuming position is {} ({}+{})".format(position, self._position, diff))
+        return position
 
     def _storePosition(self, value):
-        self.lastMPVPositionUpdate = time.time()
         if self._recentlyReset():
             self._position = 0
         elif self._fileIsLoaded():
             self._position = value
         else:
             self._position = self._client.getGlobalPosition()
+        self._addPositionSample()
 
     def _storePauseState(self, value):
         if self._fileIsLoaded():
@@ -154,15 +157,12 @@ class NewMpvPlayer(OldMpvPlayer):
         else:
             self._paused = self._client.getGlobalPaused()
 
-    def askForStatus(self):
-        self._positionAsk.clear()
-        self._pausedAsk.clear()
-        self._getPaused()
-        self._getPosition()
-        self._positionAsk.wait(constants.MPV_LOCK_WAIT_TIME)
-        self._pausedAsk.wait(constants.MPV_LOCK_WAIT_TIME)
+    def _reportStatus(self):
         self._client.updatePlayerStatus(self._paused if self.fileLoaded else self._client.getGlobalPaused(), self.getCalculatedPosition())
 
+    def _statusUnavailable(self):
+        self._reportStatus()
+
     def _preparePlayer(self):
         if self.delayedFilePath:
             self.openFile(self.delayedFilePath)
@@ -177,13 +177,9 @@ class NewMpvPlayer(OldMpvPlayer):
         self._clearFileLoaded()
         self._listener.sendLine(u'loadfile {}'.format(self._quoteArg(filePath)))
 
-    def setPosition(self, value):
-        super(self.__class__, self).setPosition(value)
-        self.lastMPVPositionUpdate = time.time()
-
     def openFile(self, filePath, resetPosition=False):
         if resetPosition:
-            self.lastResetTime = time.time()
+            self.lastResetTime = clock.now()
         self._loadFile(filePath)
         if self._paused != self._client.getGlobalPaused():
             self.setPaused(self._client.getGlobalPaused())
@@ -201,22 +197,295 @@ class NewMpvPlayer(OldMpvPlayer):
     def _recentlyReset(self):
         if not self.lastResetTime:
             return False
-        elif time.time() < self.lastResetTime + constants.MPV_NEWFILE_IGNORE_TIME:
+        elif clock.now() < self.lastResetTime + constants.MPV_NEWFILE_IGNORE_TIME:
             return True
         else:
             return False
 
     def _onFileUpdate(self):
         self.fileLoaded = True
-        self.lastLoadedTime = time.time()
-        self.reactor.callFromThread(self._client.updateFile, self._filename, self._duration, self._filepath)
+        self.lastLoadedTime = clock.now()
+        self._client.updateFile(self._filename, self._duration, self._filepath)
         if not (self._recentlyReset()):
-            self.reactor.callFromThread(self.setPosition, self._client.getGlobalPosition())
+            self.setPosition(self._client.getGlobalPosition())
         if self._paused != self._client.getGlobalPaused():
-            self.reactor.callFromThread(self._client.getGlobalPaused)
+            self.setPaused(self._client.getGlobalPaused())
 
     def _fileIsLoaded(self):
-        if self.fileLoaded == True and self.lastLoadedTime != None and time.time() > (self.lastLoadedTime + constants.MPV_NEWFILE_IGNORE_TIME):
+        if self.fileLoaded == True and self.lastLoadedTime != None and clock.now() > (self.lastLoadedTime + constants.MPV_NEWFILE_IGNORE_TIME):
             return True
         else:
-            return False
\ No newline at end of file
+            return False
+
+
+class MpvIpcError(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+class MpvIpcProtocol(LineReceiver):
+    delimiter = "\n"
+    MAX_LENGTH = 1048576
+
+    def __init__(self, player):
+        self._player = player
+        self._requests = collections.OrderedDict()
+        self._lastRequestId = 0
+
+    def connectionMade(self):
+        self._player.ipcConnected(self)
+
+    def connectionLost(self, reason):
+        requests, self._requests = self._requests, collections.OrderedDict()
+        for d, _ in requests.values():
+            if not d.called:
+                d.errback(MpvIpcError(reason.getErrorMessage()))
+        self._player.ipcDisconnected()
+
+    def sendCommand(self, *command):
+        self._lastRequestId += 1
+        d = defer.Deferred()
+        self._requests[self._lastRequestId] = (d, clock.now())
+        line = json.dumps({"command": command, "request_id": self._lastRequestId})
+        self._player._client.ui.showDebugMessage("player >> {}".format(line))
+        self.sendLine(line)
+        return d
+
+    def getOldestRequestAge(self):
+        for _, sentOn in self._requests.itervalues():
+            return clock.now() - sentOn
+        return 0
+
+    def lineReceived(self, line):
+        self._player._client.ui.showDebugMessage("player << {}".format(line))
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if "event" in message:
+            self._player.eventReceived(message)
+        elif self._requests:
+            # Older mpv versions do not echo request_id, but always reply in order
+            requestId = message.get("request_id")
+            if requestId in self._requests:
+                d, _ = self._requests.pop(requestId)
+            else:
+                _, (d, _) = self._requests.popitem(last=False)
+            if d.called:
+                # The request was cancelled, but kept until now so its reply is not taken for another one
+                return
+            if message.get("error") == "success":
+                d.callback(message.get("data"))
+            else:
+                d.errback(MpvIpcError(message.get("error")))
+
+
+class MpvIpcFactory(ClientFactory):
+    def __init__(self, player):
+        self._player = player
+
+    def buildProtocol(self, addr):
+        return MpvIpcProtocol(self._player)
+
+    def clientConnectionFailed(self, connector, reason):
+        self._player.ipcConnectionFailed(connector)
+
+
+class MpvProcessProtocol(ProcessProtocol):
+    def __init__(self, player):
+        self._player = player
+        self._buffer = ""
+
+    def outReceived(self, data):
+        lines = (self._buffer + data).split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._player.outputReceived(line.rstrip("\r"))
+
+    errReceived = outReceived
+
+    def processEnded(self, reason):
+        self._player.processEnded()
+
+
+class IpcMpvPlayer(MpvPlayer):
+    statusPushSupported = True
+
+    def __init__(self, client, playerPath, filePath, args):
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self._client = client
+        self._paused = None
+        self._position = 0.0
+        self._positionModel = PlayerPositionModel()
+        self._fileLoaded = False
+        self._fileInfoFetcher = FileInfoFetcher(self._fileInfoReceived)
+        self._resetPosition = False
+        self._positionAsked = False
+        self._ipc = None
+        self._dropped = False
+        self.quitReason = None
+        self._startedOn = clock.now()
+        self._socketDir = tempfile.mkdtemp()
+        self._socketPath = os.path.join(self._socketDir, "mpv.sock")
+        call = [playerPath]
+        if filePath:
+            if '://' not in filePath:
+                if not os.path.isfile(filePath) and 'PWD' in os.environ:
+                    filePath = os.environ['PWD'] + os.path.sep + filePath
+                filePath = os.path.realpath(filePath)
+            call.append(filePath)
+        call.extend(self.getStartupArgs(playerPath, args))
+        call.append('--input-ipc-server={}'.format(self._socketPath))
+        env = os.environ.copy()
+        if 'TERM' in env:
+            del env['TERM']
+        cwd = os.path.dirname(filePath) if filePath and os.path.isfile(filePath) else None
+        call = [arg.encode('utf8') if isinstance(arg, unicode) else arg for arg in call]
+        self._process = reactor.spawnProcess(MpvProcessProtocol(self), utils.findExecutable(call[0]), call, env=env, path=cwd)
+        self._connect()
+
+    @staticmethod
+    def getStartupArgs(path, userArgs):
+        args = list(constants.MPV_ARGS)
+        if userArgs:
+            args.extend(userArgs)
+        args.extend(constants.MPV_IPC_ARGS)
+        return args
+
+    def _connect(self):
+        if not self._dropped:
+            self.reactor.connectUNIX(self._socketPath, MpvIpcFactory(self))
+
+    def ipcConnectionFailed(self, connector):
+        if self._dropped:
+            return
+        if clock.now() - self._startedOn < constants.MPV_OPEN_MAX_WAIT_TIME:
+            self.reactor.callLater(constants.MPV_IPC_RETRY_DELAY, self._connect)
+        else:
+            self._client.ui.showErrorMessage(getMessage("mpv-failed-connection"), True)
+            self.drop()
+
+    def ipcConnected(self, ipc):
+        self._ipc = ipc
+        self._command("observe_property", 1, "pause")
+        self.setPaused(True)
+        self._client.initPlayer(self)
+        # The file given on the command line may have loaded before we connected
+        self._onFileLoaded()
+
+    def ipcDisconnected(self):
+        self._ipc = None
+        self.drop()
+
+    def _command(self, *command):
+        if self._ipc is None:
+            return defer.fail(MpvIpcError("not connected"))
+        d = self._ipc.sendCommand(*command)
+        d.addErrback(self._commandFailed, command)
+        return d
+
+    def _commandFailed(self, failure, command):
+        self._client.ui.showDebugMessage("mpv could not run {}: {}".format(command, failure.getErrorMessage()))
+
+    def eventReceived(self, event):
+        name = event["event"]
+        if name == "property-change" and event.get("name") == "pause":
+            self._paused = event.get("data")
+            self._positionModel.setPaused(self._paused)
+            self.askForStatus()
+        elif name == "playback-restart":
+            self.askForStatus()
+        elif name in ("start-file", "idle"):
+            self._fileLoaded = False
+            self._fileInfoFetcher.cancel()
+        elif name == "file-loaded":
+            self._onFileLoaded()
+
+    def _onFileLoaded(self):
+        # Both connecting and the file-loaded event ask, but a file whose info arrived is not asked about again
+        if self._fileLoaded or self._ipc is None:
+            return
+        self._fileInfoFetcher.fetch(self._getPropertyValue("filename"), self._getPropertyValue("duration"),
+                                    self._getPropertyValue("path"))
+
+    def _getPropertyValue(self, property_):
+        return self._ipc.sendCommand("get_property", property_)
+
+    def _fileInfoReceived(self, filename, duration, path):
+        if not path:
+            # Nothing was loaded yet when we asked, so wait for the file-loaded event
+            return
+        self._fileLoaded = True
+        self._client.updateFile(filename, duration, path)
+        if self._resetPosition:
+            self._resetPosition = False
+        else:
+            self.setPosition(self._client.getGlobalPosition())
+        self.setPaused(self._client.getGlobalPaused())
+
+    def askForStatus(self):
+        if self._ipc is None or not self._fileLoaded:
+            self._client.updatePlayerStatus(self._client.getGlobalPaused(), self._client.getGlobalPosition())
+            return
+        unresponsiveFor = self._ipc.getOldestRequestAge()
+        if unresponsiveFor > constants.MPV_UNRESPONSIVE_THRESHOLD:
+            self._client.ui.showErrorMessage(getMessage("mpv-unresponsive-error").format(int(unresponsiveFor)), True)
+            self.drop()
+            return
+        if not self._positionAsked:
+            self._positionAsked = True
+            self._command("get_property", "time-pos").addBoth(self._positionReceived, clock.now())
+
+    def _positionReceived(self, position, sentOn):
+        self._positionAsked = False
+        if self._fileLoaded and position is not None:
+            self._position = position
+            self._positionModel.addSample(position, self._paused, sentOn)
+            self._client.updatePlayerStatus(self._paused, self._positionModel.getPosition())
+
+    def displayMessage(self, message, duration=(constants.OSD_DURATION * 1000), secondaryOSD=False):
+        self._command("show-text", message, int(duration), constants.MPLAYER_OSD_LEVEL)
+
+    def setSpeed(self, value):
+        self._positionModel.setRate(value)
+        self._command("set_property", "speed", value)
+
+    def setPosition(self, value):
+        self._position = value
+        self._positionModel.setPosition(value)
+        self._command("set_property", "time-pos", value)
+
+    def setPaused(self, value):
+        self._paused = value
+        self._positionModel.setPaused(value)
+        self._command("set_property", "pause", value)
+
+    def openFile(self, filePath, resetPosition=False):
+        self._fileLoaded = False
+        self._fileInfoFetcher.cancel()
+        self._resetPosition = resetPosition
+        self._command("loadfile", filePath)
+
+    def outputReceived(self, line):
+        self._client.ui.showDebugMessage("player << {}".format(line))
+        if "Error parsing option" in line or "Error parsing commandline option" in line:
+            self.quitReason = getMessage("mpv-version-error")
+        elif "[ytdl_hook] Your version of youtube-dl is too old" in line:
+            self._client.ui.showErrorMessage(line)
+
+    def processEnded(self):
+        shutil.rmtree(self._socketDir, True)
+        if self.quitReason and not self._dropped:
+            self._client.ui.showErrorMessage(self.quitReason, True)
+        self.drop()
+
+    def drop(self):
+        if self._dropped:
+            return
+        self._dropped = True
+        self._fileInfoFetcher.cancel()
+        if self._ipc:
+            self._command("quit")
+            self._ipc.transport.loseConnection()
+        self._client.stop(True)
@@ -2,47 +2,149 @@
 from twisted.protocols.basic import LineReceiver
 import json
 import syncplay
-from functools import wraps
-import time
+from functools import partial, wraps
+from syncplay import clock, constants
+from syncplay.clocksync import ClockOffsetEstimator
 from syncplay.messages import getMessage
-from syncplay.constants import PING_MOVING_AVERAGE_WEIGHT
+from syncplay.constants import PING_MOVING_AVERAGE_WEIGHT, COMPACT_STATE_CAPABILITY, COMPACT_STATE_TAG, \
+    USERLIST_DELTAS_CAPABILITY, MESSAGE_FRAMES_CAPABILITY, PROTOCOL_CAPABILITIES, CLIENT_MAX_LINE_LENGTH, \
+    SERVER_STATE_IDLE_INTERVAL
+try:
+    import ujson
+    # Without precise_float ujson may round the last digits of positions and timestamps
+    decodeJson = partial(ujson.loads, precise_float=True)
+except ImportError:
+    decodeJson = json.JSONDecoder().decode
+
+COMMAND_HANDLERS = {
+    "Hello": "handleHello",
+    "Set": "handleSet",
+    "List": "handleList",
+    "State": "handleState",
+    "Error": "handleError",
+}
+COMMAND_ORDER = ["Hello", "Set", "List", "State", "Error"] # Commands sharing a frame are handled in this order
+COMMAND_RANKS = dict((command, rank) for rank, command in enumerate(COMMAND_ORDER))
+_pendingFlushes = []
+
+
+def _flushPendingMessages():
+    global _pendingFlushes
+    protocols, _pendingFlushes = _pendingFlushes, []
+    for protocol in protocols:
+        protocol.flushMessages()
 
 
 class JSONCommandProtocol(LineReceiver):
+    metrics = None
+    _commandHandlers = None
+    _messageFrames = False
+    _outbound = None
+
+    def _getCommandHandlers(self):
+        if self._commandHandlers is None:
+            self._commandHandlers = dict((command, getattr(self, handler)) for command, handler in COMMAND_HANDLERS.iteritems())
+        return self._commandHandlers
+
     def handleMessages(self, messages):
-        for message in messages.iteritems():
-            command = message[0]
-            if command == "Hello":
-                self.handleHello(message[1])
-            elif command == "Set":
-                self.handleSet(message[1])
-            elif command == "List":
-                self.handleList(message[1])
-            elif command == "State":
-                self.handleState(message[1])
-            elif command == "Error":
-                self.handleError(message[1])
-            else:
-                self.dropWithError(getMessage("unknown-command-server-error").format(message[1]))  # TODO: log, not drop
+        commands = messages.keys()
+        if len(commands) > 1:
+            commands.sort(key=lambda command: COMMAND_RANKS.get(command, len(COMMAND_ORDER)))
+        for command in commands:
+            self.handleMessage(command, messages[command])
+
+    def handleMessage(self, command, values):
+        handlers = self._getCommandHandlers()
+        if command in handlers:
+            handlers[command](values)
+        else:
+            self.dropWithError(getMessage("unknown-command-server-error").format(values))  # TODO: log, not drop
 
     def lineReceived(self, line):
-        line = line.strip()
-        if not line:
+        if not line or line.isspace():
             return
+        if constants.DEBUG_MODE:
+            self.showDebugMessage("client/server << {}".format(line.strip()))
         try:
-            self.showDebugMessage("client/server << {}".format(line))
-            messages = json.loads(line)
+            if self.metrics:
+                decodeStart = clock.now()
+            messages = decodeJson(line)
         except:
             self.dropWithError(getMessage("not-json-server-error").format(line))
             return
+        if isinstance(messages, list):
+            if not messages or messages[0] != COMPACT_STATE_TAG or not self._compactState:
+                self.dropWithError(getMessage("unknown-command-server-error").format(messages))
+                return
+            try:
+                messages = {"State": self._decodeCompactState(*messages[1:])}
+            except TypeError:
+                self.dropWithError(getMessage("not-json-server-error").format(line))
+                return
+        if self.metrics:
+            self.metrics.messageReceived(messages, len(line), clock.now() - decodeStart)
         self.handleMessages(messages)
 
+    def _getCapabilities(self, hello):
+        capabilities = hello["capabilities"] if hello.has_key("capabilities") else []
+        return [capability for capability in capabilities if capability in PROTOCOL_CAPABILITIES]
+
     def sendMessage(self, dict_):
-        line = json.dumps(dict_)
-        self.sendLine(line)
-        self.showDebugMessage("client/server >> {}".format(line))
+        if self.metrics:
+            encodeStart = clock.now()
+            line = json.dumps(dict_)
+            self.metrics.addEncodeTime(clock.now() - encodeStart)
+            self.sendEncodedMessage(line, dict_.keys()[0])
+        else:
+            self.sendEncodedMessage(json.dumps(dict_), dict_.keys()[0])
+
+    def sendEncodedMessage(self, line, command=None):
+        if self._outbound is None:
+            self._outbound = []
+            if not _pendingFlushes:
+                clock.callLater(0, _flushPendingMessages)
+            _pendingFlushes.append(self)
+        self._outbound.append((line, command))
+        if self.metrics:
+            self.metrics.messageSent(command, len(line))
+        if constants.DEBUG_MODE:
+            self.showDebugMessage("client/server >> {}".format(line))
+
+    def flushMessages(self):
+        messages, self._outbound = self._outbound, None
+        if not messages:
+            return
+        if self._messageFrames:
+            lines = self._frameMessages(messages)
+        else:
+            lines = [line for line, command in messages]
+        data = []
+        for line in lines:
+            data.append(line)
+            data.append(self.delimiter)
+        self.transport.writeSequence(data)
+
+    def _frameMessages(self, messages):
+        lines = []
+        frame = []
+        frameRank = None
+        for line, command in messages:
+            rank = COMMAND_RANKS.get(command) if line.startswith("{") else None
+            if frame and (rank is None or frameRank is None or rank <= frameRank):
+                lines.append(self._joinFrame(frame))
+                frame = []
+            frame.append(line)
+            frameRank = rank
+        lines.append(self._joinFrame(frame))
+        return lines
+
+    def _joinFrame(self, frame):
+        if len(frame) == 1:
+            return frame[0]
+        return "{" + ", ".join(line[1:-1] for line in frame) + "}"
 
     def drop(self):
+        self.flushMessages()
         self.transport.loseConnection()
 
     def dropWithError(self, error):
@@ -50,11 +152,16 @@ class JSONCommandProtocol(LineReceiver):
 
 
 class SyncClientProtocol(JSONCommandProtocol):
+    MAX_LENGTH = CLIENT_MAX_LINE_LENGTH
+
     def __init__(self, client):
         self._client = client
         self.clientIgnoringOnTheFly = 0
         self.serverIgnoringOnTheFly = 0
         self.logged = False
+        self._compactState = False
+        self._userlistDeltas = False
+        self._userlistVersion = None
         self._pingService = PingService()
 
     def showDebugMessage(self, line):
@@ -87,7 +194,17 @@ class SyncClientProtocol(JSONCommandProtocol):
         else:
             self._client.setUsername(username)
             self._client.setRoom(roomName)
+        alreadyLogged = self.logged
         self.logged = True
+        capabilities = self._getCapabilities(hello)
+        self._compactState = COMPACT_STATE_CAPABILITY in capabilities
+        self._userlistDeltas = USERLIST_DELTAS_CAPABILITY in capabilities
+        self._messageFrames = MESSAGE_FRAMES_CAPABILITY in capabilities
+        self._userlistVersion = None
+        self._client.setServerStateInterval(hello["stateInterval"] if hello.has_key("stateInterval") else None)
+        if alreadyLogged:
+            # The server only renamed us, so there is nothing to greet or re-send
+            return
         if motd:
             self._client.ui.showMessage(motd, True, True)
         self._client.ui.showMessage(getMessage("connected-successful-notification"))
@@ -104,6 +221,7 @@ class SyncClientProtocol(JSONCommandProtocol):
         if room: hello["room"] = {"name" :room}
         hello["version"] = "1.2.255" # Used so newer clients work on 1.2.X server
         hello["realversion"] = syncplay.version
+        hello["capabilities"] = PROTOCOL_CAPABILITIES
         self.sendMessage({"Hello": hello})
 
     def _SetUser(self, users):
@@ -155,6 +273,11 @@ class SyncClientProtocol(JSONCommandProtocol):
         self.sendList()
 
     def handleList(self, userList):
+        if self._userlistDeltas:
+            self._userlistVersion = userList["version"]
+            self._client.userlist.applyUserlistUpdate(userList["users"], userList["snapshot"])
+            self._client.userlist.showUserList()
+            return
         self._client.userlist.clearList()
         for room in userList.iteritems():
             roomName = room[0]
@@ -167,7 +290,7 @@ class SyncClientProtocol(JSONCommandProtocol):
         self._client.userlist.showUserList()
 
     def sendList(self):
-        self.sendMessage({"List": None})
+        self.sendMessage({"List": {"version": self._userlistVersion} if self._userlistDeltas else None})
 
     def _extractStatePlaystateArguments(self, state):
         position = state["playstate"]["position"] if state["playstate"].has_key("position") else 0
@@ -177,12 +300,13 @@ class SyncClientProtocol(JSONCommandProtocol):
         return position, paused, doSeek, setBy
 
     def _handleStatePing(self, state):
-        if state["ping"].has_key("latencyCalculation"):
-            latencyCalculation = state["ping"]["latencyCalculation"]
+        latencyCalculation = state["ping"]["latencyCalculation"] if state["ping"].has_key("latencyCalculation") else None
         if "clientLatencyCalculation" in state["ping"]:
             timestamp = state["ping"]["clientLatencyCalculation"]
             senderRtt = state["ping"]["serverRtt"]
-            self._pingService.receiveMessage(timestamp, senderRtt)
+        else:
+            timestamp, senderRtt = None, 0
+        self._pingService.receiveMessage(timestamp, senderRtt, latencyCalculation)
         messageAge = self._pingService.getLastForwardDelay()
         return messageAge, latencyCalculation
 
@@ -206,6 +330,36 @@ class SyncClientProtocol(JSONCommandProtocol):
         position, paused, doSeek, stateChange = self._client.getLocalState()
         self.sendState(position, paused, doSeek, latencyCalculation, stateChange)
 
+    def _decodeCompactState(self, position, paused, doSeek, setBy, latencyCalculation, serverRtt, clientLatencyCalculation, serverIgnoring, clientIgnoring):
+        state = {"ping": {"latencyCalculation": latencyCalculation, "serverRtt": serverRtt}}
+        if paused is not None:
+            state["playstate"] = {"position": position, "paused": paused, "doSeek": doSeek, "setBy": setBy}
+        if clientLatencyCalculation is not None:
+            state["ping"]["clientLatencyCalculation"] = clientLatencyCalculation
+        if serverIgnoring or clientIgnoring:
+            state["ignoringOnTheFly"] = {}
+            if serverIgnoring:
+                state["ignoringOnTheFly"]["server"] = serverIgnoring
+            if clientIgnoring:
+                state["ignoringOnTheFly"]["client"] = clientIgnoring
+        return state
+
+    def _sendCompactState(self, state):
+        playstate = state["playstate"] if state.has_key("playstate") else {}
+        ping = state["ping"]
+        ignore = state["ignoringOnTheFly"] if state.has_key("ignoringOnTheFly") else {}
+        self.sendEncodedMessage(json.dumps([
+            COMPACT_STATE_TAG,
+            playstate["position"] if playstate else None,
+            playstate["paused"] if playstate else None,
+            playstate["doSeek"] if playstate.has_key("doSeek") else None,
+            ping["latencyCalculation"] if ping.has_key("latencyCalculation") else None,
+            ping["clientLatencyCalculation"],
+            ping["clientRtt"],
+            ignore["server"] if ignore.has_key("server") else 0,
+            ignore["client"] if ignore.has_key("client") else 0
+        ]), "State")
+
     def sendState(self, position, paused, doSeek, latencyCalculation, stateChange=False):
         state = {}
         positionAndPausedIsSet = position is not None and paused is not None
@@ -229,7 +383,10 @@ class SyncClientProtocol(JSONCommandProtocol):
                 self.serverIgnoringOnTheFly = 0
             if self.clientIgnoringOnTheFly:
                 state["ignoringOnTheFly"]["client"] = self.clientIgnoringOnTheFly
-        self.sendMessage({"State": state})
+        if self._compactState:
+            self._sendCompactState(state)
+        else:
+            self.sendMessage({"State": state})
 
     def requestControlledRoom(self, room, password):
         self.sendSet({
@@ -263,6 +420,11 @@ class SyncServerProtocol(JSONCommandProtocol):
         self._clientLatencyCalculation = 0
         self._clientLatencyCalculationArrivalTime = 0
         self._watcher = None
+        self._clientVersion = None
+        self._compactState = False
+        self._userlistDeltas = False
+        self._capabilities = []
+        self.metrics = factory.metrics
 
     def __hash__(self):
         return hash('|'.join((
@@ -286,7 +448,13 @@ class SyncServerProtocol(JSONCommandProtocol):
         self.sendError(error)
         self.drop()
 
+    def connectionMade(self):
+        if self.metrics:
+            self.metrics.connectionOpened()
+
     def connectionLost(self, reason):
+        if self.metrics:
+            self.metrics.connectionClosed()
         self._factory.removeWatcher(self._watcher)
 
     def isLogged(self):
@@ -323,10 +491,21 @@ class SyncServerProtocol(JSONCommandProtocol):
         else:
             if not self._checkPassword(serverPassword):
                 return
+            self._clientVersion = version
+            self._capabilities = self._getCapabilities(hello)
+            self._compactState = COMPACT_STATE_CAPABILITY in self._capabilities
+            self._userlistDeltas = USERLIST_DELTAS_CAPABILITY in self._capabilities
+            self._messageFrames = MESSAGE_FRAMES_CAPABILITY in self._capabilities
             self._factory.addWatcher(self, username, roomName)
             self._logged = True
             self.sendHello(version)
 
+    def getClientVersion(self):
+        return self._clientVersion
+
+    def getCapabilities(self):
+        return self._capabilities
+
     def setWatcher(self, watcher):
         self._watcher = watcher
 
@@ -340,6 +519,9 @@ class SyncServerProtocol(JSONCommandProtocol):
         hello["version"] = clientVersion # Used so 1.2.X client works on newer server
         hello["realversion"] = syncplay.version
         hello["motd"] = self._factory.getMotd(userIp, username, room, clientVersion)
+        hello["stateInterval"] = SERVER_STATE_IDLE_INTERVAL
+        if self._capabilities:
+            hello["capabilities"] = self._capabilities
         self.sendMessage({"Hello": hello})
 
     @requireLogged
@@ -399,18 +581,20 @@ class SyncServerProtocol(JSONCommandProtocol):
             user[username]["event"] = event
         self.sendSet({"user": user})
 
+    def _getUserEntry(self, watcher):
+        return {
+            "position": 0,
+            "file": watcher.getFile() if watcher.getFile() else {},
+            "controller": watcher.isController(),
+            "isReady": watcher.isReady()
+        }
+
     def _addUserOnList(self, userlist, watcher):
         room = watcher.getRoom()
         if room:
             if room.getName() not in userlist:
                 userlist[room.getName()] = {}
-            userFile = {
-                "position": 0,
-                "file": watcher.getFile() if watcher.getFile() else {},
-                "controller": watcher.isController(),
-                "isReady": watcher.isReady()
-            }
-            userlist[room.getName()][watcher.getName()] = userFile
+            userlist[room.getName()][watcher.getName()] = self._getUserEntry(watcher)
 
     def sendList(self):
         userlist = {}
@@ -419,21 +603,38 @@ class SyncServerProtocol(JSONCommandProtocol):
             self._addUserOnList(userlist, watcher)
         self.sendMessage({"List": userlist})
 
+    def sendUserlistUpdate(self, since):
+        version, usernames = self._factory.getUserlistChanges(self._watcher, since)
+        if usernames is None:
+            watchers = self._factory.getAllWatchersForUser(self._watcher)
+        else:
+            watchers = [self._factory.findWatcher(username) for username in usernames]
+        users = dict.fromkeys(usernames) if usernames else {}
+        for watcher in watchers:
+            if watcher and watcher.getRoom():
+                users[watcher.getName()] = self._getUserEntry(watcher)
+                users[watcher.getName()]["room"] = watcher.getRoom().getName()
+        self.sendMessage({"List": {"version": version, "snapshot": usernames is None, "users": users}})
+
     @requireLogged
-    def handleList(self, _):
-        self.sendList()
+    def handleList(self, request):
+        if self._userlistDeltas and request:
+            self.sendUserlistUpdate(request["version"] if request.has_key("version") else None)
+        else:
+            self.sendList()
+
+    @staticmethod
+    def encodePlaystate(position, paused, doSeek, setBy):
+        return EncodedPlaystate(position, paused, doSeek, setBy)
 
     def sendState(self, position, paused, doSeek, setBy, forced=False):
+        self.sendEncodedState(self.encodePlaystate(position, paused, doSeek, setBy), forced)
+
+    def sendEncodedState(self, playstate, forced=False):
         if self._clientLatencyCalculationArrivalTime:
-            processingTime = time.time() - self._clientLatencyCalculationArrivalTime
+            processingTime = clock.now() - self._clientLatencyCalculationArrivalTime
         else:
             processingTime = 0
-        playstate = {
-                     "position": position if position else 0,
-                     "paused": paused,
-                     "doSeek": doSeek,
-                     "setBy": setBy.getName() if setBy else None
-        }
         ping = {
                 "latencyCalculation": self._pingService.newTimestamp(),
                 "serverRtt": self._pingService.getRtt()
@@ -441,21 +642,55 @@ class SyncServerProtocol(JSONCommandProtocol):
         if self._clientLatencyCalculation:
             ping["clientLatencyCalculation"] = self._clientLatencyCalculation + processingTime
             self._clientLatencyCalculation = 0
-        state = {
-                 "ping": ping,
-                 "playstate": playstate,
-                }
+        ignoringOnTheFly = None
         if forced:
             self.serverIgnoringOnTheFly += 1
         if self.serverIgnoringOnTheFly or self.clientIgnoringOnTheFly:
-            state["ignoringOnTheFly"] = {}
+            ignoringOnTheFly = {}
             if self.serverIgnoringOnTheFly:
-                state["ignoringOnTheFly"]["server"] = self.serverIgnoringOnTheFly
+                ignoringOnTheFly["server"] = self.serverIgnoringOnTheFly
             if self.clientIgnoringOnTheFly:
-                state["ignoringOnTheFly"]["client"] = self.clientIgnoringOnTheFly
+                ignoringOnTheFly["client"] = self.clientIgnoringOnTheFly
                 self.clientIgnoringOnTheFly = 0
         if self.serverIgnoringOnTheFly == 0 or forced:
-            self.sendMessage({"State": state})
+            if self.metrics:
+                encodeStart = clock.now()
+            if self._compactState:
+                line = self._encodeCompactState(playstate, ping, ignoringOnTheFly)
+            else:
+                line = self._encodeState(playstate, ping, ignoringOnTheFly)
+            if self.metrics:
+                self.metrics.addEncodeTime(clock.now() - encodeStart)
+            self.sendEncodedMessage(line, "State")
+
+    def _encodeState(self, playstate, ping, ignoringOnTheFly):
+        state = ['"ping": ', json.dumps(ping), ', "playstate": ', playstate.getJson()]
+        if ignoringOnTheFly:
+            state.extend((', "ignoringOnTheFly": ', json.dumps(ignoringOnTheFly)))
+        return '{{"State": {{{}}}}}'.format("".join(state))
+
+    def _encodeCompactState(self, playstate, ping, ignoringOnTheFly):
+        ignoringOnTheFly = ignoringOnTheFly if ignoringOnTheFly else {}
+        fields = json.dumps([
+            ping["latencyCalculation"],
+            ping["serverRtt"],
+            ping["clientLatencyCalculation"] if ping.has_key("clientLatencyCalculation") else None,
+            ignoringOnTheFly["server"] if ignoringOnTheFly.has_key("server") else 0,
+            ignoringOnTheFly["client"] if ignoringOnTheFly.has_key("client") else 0
+        ])
+        return '["{}", {}, {}'.format(COMPACT_STATE_TAG, playstate.getCompact(), fields[1:])
+
+    def _decodeCompactState(self, position, paused, doSeek, latencyCalculation, clientLatencyCalculation, clientRtt, serverIgnoring, clientIgnoring):
+        state = {"ping": {"latencyCalculation": latencyCalculation, "clientLatencyCalculation": clientLatencyCalculation, "clientRtt": clientRtt}}
+        if paused is not None:
+            state["playstate"] = {"position": position, "paused": paused, "doSeek": doSeek}
+        if serverIgnoring or clientIgnoring:
+            state["ignoringOnTheFly"] = {}
+            if serverIgnoring:
+                state["ignoringOnTheFly"]["server"] = serverIgnoring
+            if clientIgnoring:
+                state["ignoringOnTheFly"]["client"] = clientIgnoring
+        return state
 
 
     def _extractStatePlaystateArguments(self, state):
@@ -480,8 +715,10 @@ class SyncServerProtocol(JSONCommandProtocol):
             latencyCalculation = state["ping"]["latencyCalculation"] if state["ping"].has_key("latencyCalculation") else 0
             clientRtt = state["ping"]["clientRtt"] if state["ping"].has_key("clientRtt") else 0
             self._clientLatencyCalculation = state["ping"]["clientLatencyCalculation"] if state["ping"].has_key("clientLatencyCalculation") else 0
-            self._clientLatencyCalculationArrivalTime = time.time()
-            self._pingService.receiveMessage(latencyCalculation, clientRtt)
+            self._clientLatencyCalculationArrivalTime = clock.now()
+            self._pingService.receiveMessage(latencyCalculation, clientRtt, self._clientLatencyCalculation)
+            if self.metrics:
+                self.metrics.observeRtt(self._pingService.getRtt())
         if self.serverIgnoringOnTheFly == 0:
             self._watcher.updateState(position, paused, doSeek, self._pingService.getLastForwardDelay())
 
@@ -491,32 +728,68 @@ class SyncServerProtocol(JSONCommandProtocol):
     def sendError(self, message):
         self.sendMessage({"Error": {"message": message}})
 
+class EncodedPlaystate(object):
+    def __init__(self, position, paused, doSeek, setBy):
+        self._playstate = (position if position else 0, paused, doSeek, setBy.getName() if setBy else None)
+        self._json = None
+        self._compact = None
+
+    def getJson(self):
+        if self._json is None:
+            position, paused, doSeek, setBy = self._playstate
+            self._json = json.dumps({
+                         "position": position,
+                         "paused": paused,
+                         "doSeek": doSeek,
+                         "setBy": setBy
+            })
+        return self._json
+
+    def getCompact(self):
+        if self._compact is None:
+            self._compact = json.dumps(self._playstate)[1:-1]
+        return self._compact
+
 class PingService(object):
 
     def __init__(self):
         self._rtt = 0
         self._fd = 0
         self._avrRtt = 0
+        self._clock = ClockOffsetEstimator()
 
     def newTimestamp(self):
-        return time.time()
+        return clock.now()
 
-    def receiveMessage(self, timestamp, senderRtt):
-        if not timestamp:
-            return
-        self._rtt = time.time() - timestamp
-        if self._rtt < 0 or senderRtt < 0:
-            return
-        if not self._avrRtt:
-            self._avrRtt = self._rtt
-        self._avrRtt = self._avrRtt * PING_MOVING_AVERAGE_WEIGHT + self._rtt * (1 - PING_MOVING_AVERAGE_WEIGHT)
-        if senderRtt < self._rtt:
-            self._fd = self._avrRtt / 2 + (self._rtt - senderRtt)
-        else:
-            self._fd = self._avrRtt / 2
+    def receiveMessage(self, timestamp, senderRtt, senderTimestamp=None):
+        now = clock.now()
+        if timestamp:
+            rtt = now - timestamp
+            if rtt < 0 or senderRtt < 0:
+                return
+            self._rtt = rtt
+            if not self._avrRtt:
+                self._avrRtt = self._rtt
+            self._avrRtt = self._avrRtt * PING_MOVING_AVERAGE_WEIGHT + self._rtt * (1 - PING_MOVING_AVERAGE_WEIGHT)
+            if senderTimestamp:
+                self._clock.addSample(now, self._rtt, senderTimestamp + self._rtt / 2 - now)
+        if senderTimestamp and self._clock.isSynchronised():
+            forwardDelay = now - senderTimestamp + self._clock.getOffset(now)
+            self._fd = min(max(0.0, forwardDelay), max(self._rtt, self._avrRtt))
+        elif timestamp:
+            if senderRtt < self._rtt:
+                self._fd = self._avrRtt / 2 + (self._rtt - senderRtt)
+            else:
+                self._fd = self._avrRtt / 2
 
     def getLastForwardDelay(self):
         return self._fd
 
     def getRtt(self):
         return self._rtt
+
+    def getClockOffset(self):
+        return self._clock.getOffset(clock.now())
+
+    def getClockOffsetError(self):
+        return self._clock.getOffsetError()
@@ -1,11 +1,10 @@
+import collections
 import hashlib
 import random
-from twisted.internet import task, reactor
 from twisted.internet.protocol import Factory
 import syncplay
 from syncplay.protocols import SyncServerProtocol
-import time
-from syncplay import constants
+from syncplay import clock, constants
 from syncplay.messages import getMessage
 import codecs
 import os
@@ -25,10 +24,19 @@ class SyncFactory(Factory):
         self._salt = salt
         self._motdFilePath = motdFilePath
         self.disableReady = disableReady
+        self._isolateRooms = isolateRooms
         if not isolateRooms:
             self._roomManager = RoomManager()
         else:
             self._roomManager = PublicRoomManager()
+        self._stateScheduler = StateTickScheduler(self.sendStates)
+        self._stateScheduler.start()
+        self.metrics = None
+
+    def enableMetrics(self, port):
+        from syncplay.metrics import ServerMetrics
+        self.metrics = ServerMetrics(self)
+        self.metrics.listen(port)
 
     def buildProtocol(self, addr):
         return SyncServerProtocol(self)
@@ -40,6 +48,17 @@ class SyncFactory(Factory):
             setBy = room.getSetBy()
             watcher.sendState(position, paused, doSeek, setBy, forcedUpdate)
 
+    def sendStates(self, watchers):
+        playstates = {}
+        for watcher in watchers:
+            room = watcher.getRoom()
+            if room:
+                if room not in playstates:
+                    paused, position = room.isPaused(), room.getPosition()
+                    setBy = room.getSetBy()
+                    playstates[room] = SyncServerProtocol.encodePlaystate(position, paused, False, setBy)
+                watcher.sendEncodedState(playstates[room], False)
+
     def getMotd(self, userIp, username, room, clientVersion):
         oldClient = False
         if constants.WARN_OLD_CLIENTS:
@@ -62,12 +81,14 @@ class SyncFactory(Factory):
             return ""
 
     def addWatcher(self, watcherProtocol, username, roomName):
-        username = self._roomManager.findFreeUsername(username)
+        username = self._roomManager.findFreeUsername(username, roomName)
         watcher = Watcher(self, watcherProtocol, username)
         self.setWatcherRoom(watcher, roomName, asJoin=True)
 
     def setWatcherRoom(self, watcher, roomName, asJoin=False):
         self._roomManager.moveWatcher(watcher, roomName)
+        if watcher.getRoom() is None:
+            return
         if asJoin:
             self.sendJoinMessage(watcher)
         else:
@@ -77,9 +98,11 @@ class SyncFactory(Factory):
                 watcher.sendControlledRoomAuthStatus(True, controller, roomName)
 
     def sendRoomSwitchMessage(self, watcher):
-        l = lambda w: w.sendSetting(watcher.getName(), watcher.getRoom(), None, None)
+        file_ = watcher.getFile() if self._isolateRooms else None
+        l = lambda w: w.sendSetting(watcher.getName(), watcher.getRoom(), file_, None)
         self._roomManager.broadcast(watcher, l)
         self._roomManager.broadcastRoom(watcher, lambda w: w.sendSetReady(watcher.getName(), watcher.isReady(), False))
+        self._userlistChanged(watcher)
 
     def removeWatcher(self, watcher):
         if watcher and watcher.getRoom():
@@ -89,22 +112,29 @@ class SyncFactory(Factory):
     def sendLeftMessage(self, watcher):
         l = lambda w: w.sendSetting(watcher.getName(), watcher.getRoom(), None, {"left": True})
         self._roomManager.broadcast(watcher, l)
+        self._userlistChanged(watcher, False)
 
     def sendJoinMessage(self, watcher):
         l = lambda w: w.sendSetting(watcher.getName(), watcher.getRoom(), None, {"joined": True}) if w != watcher else None
         self._roomManager.broadcast(watcher, l)
         self._roomManager.broadcastRoom(watcher, lambda w: w.sendSetReady(watcher.getName(), watcher.isReady(), False))
+        self._userlistChanged(watcher)
 
     def sendFileUpdate(self, watcher):
         l = lambda w: w.sendSetting(watcher.getName(), watcher.getRoom(), watcher.getFile(), None)
         self._roomManager.broadcast(watcher, l)
+        self._userlistChanged(watcher)
+
+    def _userlistChanged(self, watcher, present=True):
+        self._roomManager.userlistChanged(watcher.getName())
 
     def forcePositionUpdate(self, watcher, doSeek, watcherPauseState):
         room = watcher.getRoom()
         if room.canControl(watcher):
             paused, position = room.isPaused(), watcher.getPosition()
             setBy = watcher
-            l = lambda w: w.sendState(position, paused, doSeek, setBy, True)
+            playstate = SyncServerProtocol.encodePlaystate(position, paused, doSeek, setBy)
+            l = lambda w: w.sendEncodedState(playstate, True)
             room.setPosition(watcher.getPosition(), setBy)
             self._roomManager.broadcastRoom(watcher, l)
         else:
@@ -114,6 +144,18 @@ class SyncFactory(Factory):
     def getAllWatchersForUser(self, forUser):
         return self._roomManager.getAllWatchersForUser(forUser)
 
+    def getUserlistChanges(self, forUser, since):
+        return self._roomManager.getUserlistChanges(forUser, since)
+
+    def getRoomSizes(self):
+        return self._roomManager.getRoomSizes()
+
+    def findWatcher(self, username):
+        return self._roomManager.findWatcher(username)
+
+    def getStateScheduler(self):
+        return self._stateScheduler
+
     def authRoomController(self, watcher, password, roomBaseName=None):
         room = watcher.getRoom()
         roomName = roomBaseName if roomBaseName else room.getName()
@@ -122,6 +164,8 @@ class SyncFactory(Factory):
             if success:
                 watcher.getRoom().addController(watcher)
             self._roomManager.broadcast(watcher, lambda w: w.sendControlledRoomAuthStatus(success, watcher.getName(), room._name))
+            if success:
+                self._userlistChanged(watcher)
         except NotControlledRoom:
             newName = RoomPasswordProvider.getControlledRoomName(roomName, password, self._salt)
             watcher.sendNewControlledRoom(newName, password)
@@ -131,10 +175,102 @@ class SyncFactory(Factory):
     def setReady(self, watcher, isReady, manuallyInitiated=True):
         watcher.setReady(isReady)
         self._roomManager.broadcastRoom(watcher, lambda w: w.sendSetReady(watcher.getName(), watcher.isReady(), manuallyInitiated))
+        self._userlistChanged(watcher)
+
+class StateTickScheduler(object):
+    def __init__(self, sendStates, interval=constants.SERVER_STATE_INTERVAL, slots=constants.SERVER_STATE_SLOTS,
+                 maxInterval=constants.SERVER_STATE_IDLE_INTERVAL):
+        self._sendStates = sendStates
+        self._tickInterval = float(interval) / slots
+        self._slots = [set() for _ in xrange(self._getTicks(maxInterval) + 1)]
+        self._watcherSlots = {}
+        self._currentSlot = 0
+        self._timer = clock.loopingCall(self._tick)
+
+    def start(self):
+        if not self._timer.running:
+            self._timer.start(self._tickInterval, now=False)
+
+    def stop(self):
+        if self._timer.running:
+            self._timer.stop()
+
+    def _getTicks(self, interval):
+        return max(1, int(round(interval / self._tickInterval)))
+
+    def _scheduleWatcher(self, watcher):
+        ticks = min(self._getTicks(watcher.getStateInterval()), len(self._slots) - 1)
+        slot = (self._currentSlot + ticks) % len(self._slots)
+        self._slots[slot].add(watcher)
+        self._watcherSlots[watcher] = slot
+
+    def resetWatcher(self, watcher):
+        self.removeWatcher(watcher)
+        self._scheduleWatcher(watcher)
+        watcher._askForStateUpdate()
+
+    def removeWatcher(self, watcher):
+        if watcher in self._watcherSlots:
+            self._slots[self._watcherSlots.pop(watcher)].discard(watcher)
+
+    def updateWatcher(self, watcher):
+        if watcher in self._watcherSlots:
+            due = (self._watcherSlots[watcher] - self._currentSlot) % len(self._slots)
+            if due > self._getTicks(watcher.getStateInterval()):
+                self.removeWatcher(watcher)
+                self._scheduleWatcher(watcher)
+
+    def _tick(self):
+        self._currentSlot = (self._currentSlot + 1) % len(self._slots)
+        watchers = self._slots[self._currentSlot]
+        if watchers:
+            self._slots[self._currentSlot] = set()
+            for watcher in watchers:
+                self._scheduleWatcher(watcher)
+            self._sendStates(list(watchers))
+
+class UsernameIndex(object):
+    def __init__(self):
+        self._watchers = {}
+        self._suffixes = {}
+
+    def add(self, watcher):
+        self._watchers[watcher.getName().lower()] = watcher
+
+    def remove(self, watcher):
+        name = watcher.getName().lower()
+        if self._watchers.get(name) is watcher:
+            del self._watchers[name]
+            self._suffixes.pop(name, None)
+            # The freed name may be a suffixed form of other names, whose search must start no later than it
+            base, suffix = name, 0
+            while base.endswith('_'):
+                base, suffix = base[:-1], suffix + 1
+                if self._suffixes.get(base, 1) > suffix:
+                    self._suffixes[base] = suffix
+
+    def find(self, username):
+        watcher = self._watchers.get(username.lower())
+        if watcher and watcher.getName() == username:
+            return watcher
+
+    def findFree(self, username):
+        name = username.lower()
+        if name not in self._watchers:
+            return username
+        suffix = self._suffixes.get(name, 1)
+        while name + '_' * suffix in self._watchers:
+            suffix += 1
+        self._suffixes[name] = suffix
+        return username + '_' * suffix
 
 class RoomManager(object):
     def __init__(self):
         self._rooms = {}
+        self._recycledRooms = []
+        self._usernames = UsernameIndex()
+        self._userlistVersion = 0
+        self._userlistChanges = collections.deque(maxlen=constants.USERLIST_JOURNAL_LENGTH)
 
     def broadcastRoom(self, sender, whatLambda):
         room = sender.getRoom()
@@ -154,16 +290,38 @@ class RoomManager(object):
                 watchers.append(watcher)
         return watchers
 
+    def userlistChanged(self, username):
+        self._userlistVersion += 1
+        self._userlistChanges.append((self._userlistVersion, username))
+
+    def getUserlistChanges(self, sender, since):
+        if since is None or since > self._userlistVersion or since < self._userlistVersion - len(self._userlistChanges):
+            return self._userlistVersion, None
+        usernames = set()
+        for version, username in reversed(self._userlistChanges):
+            if version <= since:
+                break
+            usernames.add(username)
+        return self._userlistVersion, usernames
+
+    def getRoomSizes(self):
+        return [len(room.getWatchers()) for room in self._rooms.itervalues()]
+
+    def findWatcher(self, username):
+        return self._usernames.find(username)
+
     def moveWatcher(self, watcher, roomName):
         self.removeWatcher(watcher)
         room = self._getRoom(roomName)
         room.addWatcher(watcher)
+        self._usernames.add(watcher)
 
     def removeWatcher(self, watcher):
         oldRoom = watcher.getRoom()
         if oldRoom:
             oldRoom.removeWatcher(watcher)
             self._deleteRoomIfEmpty(oldRoom)
+            self._usernames.remove(watcher)
 
     def _getRoom(self, roomName):
         if roomName in self._rooms:
@@ -171,6 +329,9 @@ class RoomManager(object):
         else:
             if RoomPasswordProvider.isControlledRoom(roomName):
                 room = ControlledRoom(roomName)
+            elif self._recycledRooms:
+                room = self._recycledRooms.pop()
+                room.reset(roomName)
             else:
                 room = Room(roomName)
             self._rooms[roomName] = room
@@ -179,30 +340,65 @@ class RoomManager(object):
     def _deleteRoomIfEmpty(self, room):
         if room.isEmpty() and room.getName() in self._rooms:
             del self._rooms[room.getName()]
+            if type(room) is Room and len(self._recycledRooms) < constants.SERVER_RECYCLED_ROOMS:
+                self._recycledRooms.append(room)
 
-    def findFreeUsername(self, username):
-        allnames = []
-        for room in self._rooms.itervalues():
-            for watcher in room.getWatchers():
-                allnames.append(watcher.getName().lower())
-        while username.lower() in allnames:
-            username += '_'
-        return username
+    def findFreeUsername(self, username, roomName=None):
+        return self._usernames.findFree(username)
 
 
 class PublicRoomManager(RoomManager):
+    def __init__(self):
+        RoomManager.__init__(self)
+        self._roomUsernames = {}
+
     def broadcast(self, sender, what):
         self.broadcastRoom(sender, what)
 
     def getAllWatchersForUser(self, sender):
         return sender.getRoom().getWatchers()
 
-    def moveWatcher(self, watcher, room):
+    def userlistChanged(self, username):
+        pass
+
+    def getUserlistChanges(self, sender, since):
+        return self._userlistVersion, None
+
+    def findWatcher(self, username):
+        return None
+
+    def findFreeUsername(self, username, roomName=None):
+        usernames = self._roomUsernames.get(roomName)
+        return usernames.findFree(username) if usernames else username
+
+    def moveWatcher(self, watcher, roomName):
         oldRoom = watcher.getRoom()
         l = lambda w: w.sendSetting(watcher.getName(), oldRoom, None, {"left": True})
         self.broadcast(watcher, l)
-        RoomManager.moveWatcher(self, watcher, room)
-        watcher.setFile(watcher.getFile())
+        self.removeWatcher(watcher)
+        username = self.findFreeUsername(watcher.getName(), roomName)
+        renamed = username != watcher.getName()
+        if renamed:
+            watcher.setName(username)
+        room = self._getRoom(roomName)
+        room.addWatcher(watcher)
+        if roomName not in self._roomUsernames:
+            self._roomUsernames[roomName] = UsernameIndex()
+        self._roomUsernames[roomName].add(watcher)
+        if renamed:
+            watcher.sendHello()
+
+    def removeWatcher(self, watcher):
+        oldRoom = watcher.getRoom()
+        if oldRoom:
+            self._roomUsernames[oldRoom.getName()].remove(watcher)
+            oldRoom.removeWatcher(watcher)
+            self._deleteRoomIfEmpty(oldRoom)
+
+    def _deleteRoomIfEmpty(self, room):
+        RoomManager._deleteRoomIfEmpty(self, room)
+        if room.getName() not in self._rooms:
+            self._roomUsernames.pop(room.getName(), None)
 
 
 class Room(object):
@@ -210,10 +406,15 @@ class Room(object):
     STATE_PLAYING = 1
 
     def __init__(self, name):
+        self.reset(name)
+
+    def reset(self, name):
         self._name = name
         self._watchers = {}
         self._playState = self.STATE_PAUSED
         self._setBy = None
+        self._positionLeader = None
+        self._driftDetectedOn = None
 
     def __str__(self, *args, **kwargs):
         return self.getName()
@@ -221,22 +422,64 @@ class Room(object):
     def getName(self):
         return self._name
 
+    def _getPositionCandidates(self):
+        return self._watchers
+
     def getPosition(self):
-        if self._watchers:
-            watcher = min(self._watchers.values())
+        candidates = self._getPositionCandidates()
+        if candidates:
+            if self._positionLeader is None:
+                self._positionLeader = min(candidates.itervalues())
+            watcher = self._positionLeader
             self._setBy = watcher
             return watcher.getPosition()
         else:
             return 0
 
+    def watcherPositionChanged(self, watcher):
+        leader = self._positionLeader
+        if leader is None or watcher.getName() not in self._getPositionCandidates():
+            return
+        if watcher is leader:
+            self._positionLeader = None
+        elif watcher < leader:
+            self._positionLeader = watcher
+
+    def _invalidatePositionLeader(self):
+        self._positionLeader = None
+
+    def checkDrift(self, watcher):
+        if not self.isPlaying():
+            return
+        position, roomPosition = watcher.getPosition(), self.getPosition()
+        if position is not None and roomPosition is not None and abs(position - roomPosition) > constants.SERVER_STATE_DRIFT_THRESHOLD:
+            drifting = self.getStateInterval() == constants.SERVER_STATE_DRIFT_INTERVAL
+            self._driftDetectedOn = clock.now()
+            if not drifting:
+                self._stateIntervalChanged()
+
+    def getStateInterval(self):
+        if self.isPaused() or len(self._watchers) < 2:
+            return constants.SERVER_STATE_IDLE_INTERVAL
+        if self._driftDetectedOn is not None and clock.now() - self._driftDetectedOn < constants.SERVER_STATE_DRIFT_HOLD:
+            return constants.SERVER_STATE_DRIFT_INTERVAL
+        return constants.SERVER_STATE_INTERVAL
+
+    def _stateIntervalChanged(self):
+        for watcher in self._watchers.itervalues():
+            watcher.stateIntervalChanged()
+
     def setPaused(self, paused=STATE_PAUSED, setBy=None):
         self._playState = paused
         self._setBy = setBy
+        self._invalidatePositionLeader()
+        self._stateIntervalChanged()
 
     def setPosition(self, position, setBy=None):
         for watcher in self._watchers.itervalues():
             watcher.setPosition(position)
             self._setBy = setBy
+        self._invalidatePositionLeader()
 
     def isPlaying(self):
         return self._playState == self.STATE_PLAYING
@@ -252,12 +495,17 @@ class Room(object):
             watcher.setPosition(self.getPosition())
         self._watchers[watcher.getName()] = watcher
         watcher.setRoom(self)
+        self.watcherPositionChanged(watcher)
+        if len(self._watchers) == 2:
+            self._stateIntervalChanged()
 
     def removeWatcher(self, watcher):
         if watcher.getName() not in self._watchers:
             return
         del self._watchers[watcher.getName()]
         watcher.setRoom(None)
+        if watcher is self._positionLeader:
+            self._invalidatePositionLeader()
 
     def isEmpty(self):
         return not bool(self._watchers)
@@ -273,16 +521,12 @@ class ControlledRoom(Room):
         Room.__init__(self, name)
         self._controllers = {}
 
-    def getPosition(self):
-        if self._controllers:
-            watcher = min(self._controllers.values())
-            self._setBy = watcher
-            return watcher.getPosition()
-        else:
-            return 0
+    def _getPositionCandidates(self):
+        return self._controllers
 
     def addController(self, watcher):
         self._controllers[watcher.getName()] = watcher
+        self.watcherPositionChanged(watcher)
 
     def removeWatcher(self, watcher):
         Room.removeWatcher(self, watcher)
@@ -312,13 +556,15 @@ class Watcher(object):
         self._room = None
         self._file = None
         self._position = None
-        self._lastUpdatedOn = time.time()
-        self._sendStateTimer = None
+        self._lastUpdatedOn = clock.now()
+        self._stateTimerEnabled = False
         self._connector.setWatcher(self)
-        reactor.callLater(0.1, self._scheduleSendState)
+        clock.callLater(0.1, self._scheduleSendState)
 
     def setFile(self, file_):
         self._file = file_
+        if self._room:
+            self._room.watcherPositionChanged(self)
         self._server.sendFileUpdate(self)
 
     def setRoom(self, room):
@@ -343,21 +589,38 @@ class Watcher(object):
     def getName(self):
         return self._name
 
+    def setName(self, name):
+        self._name = name
+
     def getFile(self):
         return self._file
 
+    def getConnector(self):
+        return self._connector
+
+    def getStateInterval(self):
+        if self._room:
+            return self._room.getStateInterval()
+        return constants.SERVER_STATE_INTERVAL
+
     def setPosition(self, position):
         self._position = position
+        if self._room:
+            self._room.watcherPositionChanged(self)
 
     def getPosition(self):
         if self._position is None:
             return None
         if self._room.isPlaying():
-            timePassedSinceSet = time.time() - self._lastUpdatedOn
+            timePassedSinceSet = clock.now() - self._lastUpdatedOn
         else:
             timePassedSinceSet = 0
         return self._position + timePassedSinceSet
 
+    def sendHello(self):
+        if self._connector.isLogged():
+            self._connector.sendHello(self._connector.getClientVersion())
+
     def sendSetting(self, user, room, file_, event):
         self._connector.sendUserSetting(user, room, file_, event)
 
@@ -370,6 +633,10 @@ class Watcher(object):
     def sendSetReady(self, username, isReady, manuallyInitiated=True):
         self._connector.sendSetReady(username, isReady, manuallyInitiated)
 
+    def sendEncodedMessage(self, line, command=None):
+        if self._connector.isLogged():
+            self._connector.sendEncodedMessage(line, command)
+
     def __lt__(self, b):
         if self.getPosition() is None or self._file is None:
             return False
@@ -378,26 +645,31 @@ class Watcher(object):
         return self.getPosition() < b.getPosition()
 
     def _scheduleSendState(self):
-        self._sendStateTimer = task.LoopingCall(self._askForStateUpdate)
-        self._sendStateTimer.start(constants.SERVER_STATE_INTERVAL)
+        self._stateTimerEnabled = True
+        if self._room is not None:
+            self._server.getStateScheduler().resetWatcher(self)
 
     def _askForStateUpdate(self, doSeek=False, forcedUpdate=False):
         self._server.sendState(self, doSeek, forcedUpdate)
 
     def _resetStateTimer(self):
-        if self._sendStateTimer:
-            if self._sendStateTimer.running:
-                self._sendStateTimer.stop()
-            self._sendStateTimer.start(constants.SERVER_STATE_INTERVAL)
+        if self._stateTimerEnabled:
+            self._server.getStateScheduler().resetWatcher(self)
 
     def _deactivateStateTimer(self):
-        if self._sendStateTimer and self._sendStateTimer.running:
-            self._sendStateTimer.stop()
+        self._server.getStateScheduler().removeWatcher(self)
+
+    def stateIntervalChanged(self):
+        if self._stateTimerEnabled:
+            self._server.getStateScheduler().updateWatcher(self)
 
     def sendState(self, position, paused, doSeek, setBy, forcedUpdate):
+        self.sendEncodedState(SyncServerProtocol.encodePlaystate(position, paused, doSeek, setBy), forcedUpdate)
+
+    def sendEncodedState(self, playstate, forcedUpdate):
         if self._connector.isLogged():
-            self._connector.sendState(position, paused, doSeek, setBy, forcedUpdate)
-        if time.time() - self._lastUpdatedOn > constants.PROTOCOL_TIMEOUT:
+            self._connector.sendEncodedState(playstate, forcedUpdate)
+        if clock.now() - self._lastUpdatedOn > constants.PROTOCOL_TIMEOUT + self.getStateInterval():
             self._server.removeWatcher(self)
             self._connector.drop()
 
@@ -413,12 +685,15 @@ class Watcher(object):
 
     def updateState(self, position, paused, doSeek, messageAge):
         pauseChanged = self.__hasPauseChanged(paused)
-        self._lastUpdatedOn = time.time()
+        self._lastUpdatedOn = clock.now()
         if pauseChanged:
             self.getRoom().setPaused(Room.STATE_PAUSED if paused else Room.STATE_PLAYING, self)
         if position is not None:
             position = self._updatePositionByAge(messageAge, paused, position)
             self.setPosition(position)
+            self._room.checkDrift(self)
+        else:
+            self.getRoom().watcherPositionChanged(self)
         if doSeek or pauseChanged:
             self._server.forcePositionUpdate(self, doSeek, paused)
 
@@ -442,4 +717,8 @@ class ConfigurationGetter(object):
         self._argparser.add_argument('--isolate-rooms', action='store_true', help=getMessage("server-isolate-room-argument"))
         self._argparser.add_argument('--disable-ready', action='store_true', help=getMessage("server-disable-ready-argument"))
         self._argparser.add_argument('--salt', metavar='salt', type=str, nargs='?', help=getMessage("server-salt-argument"))
-        self._argparser.add_argument('--motd-file', metavar='file', type=str, nargs='?', help=getMessage("server-motd-argument"))
\ No newline at end of file
+        self._argparser.add_argument('--motd-file', metavar='file', type=str, nargs='?', help=getMessage("server-motd-argument"))
+        self._argparser.add_argument('--metrics-port', metavar='port', type=int, help=getMessage("server-metrics-port-argument"))
+        self._argparser.add_argument('--shards', metavar='shards', type=int, default=1, help=getMessage("server-shards-argument"))
+        self._argparser.add_argument('--shard-link', type=str, help=argparse.SUPPRESS)
+        self._argparser.add_argument('--shard-index', type=int, default=0, help=argparse.SUPPRESS)
\ No newline at end of file
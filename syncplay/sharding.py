@@ -0,0 +1,559 @@
+import base64
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import zlib
+from zope.interface import implementer
+from twisted.internet import reactor
+from twisted.internet.address import IPv6Address
+from twisted.internet.error import ReactorNotRunning
+from twisted.internet.interfaces import IFileDescriptorReceiver, IPullProducer
+from twisted.internet.protocol import Factory, ClientFactory, Protocol, ProcessProtocol
+from twisted.protocols.basic import LineReceiver
+from syncplay import constants
+from syncplay.messages import getMessage
+from syncplay.protocols import SyncServerProtocol
+from syncplay.server import SyncFactory, RoomManager, Watcher
+from syncplay.utils import RandomStringGenerator
+
+
+def isShardingSupported():
+    try:
+        from twisted.python import sendmsg
+    except ImportError:
+        return False
+    return hasattr(socket, "AF_UNIX")
+
+def stopReactor():
+    try:
+        reactor.stop()
+    except ReactorNotRunning:
+        pass
+
+def getShardForRoom(roomName, shards):
+    if not roomName:
+        return 0
+    if isinstance(roomName, unicode):
+        roomName = roomName.encode('utf8')
+    return (zlib.crc32(roomName) & 0xffffffff) % shards
+
+def getAddressFamily(transport):
+    return "ipv6" if isinstance(transport.getHost(), IPv6Address) else "ipv4"
+
+def detachConnection(transport):
+    descriptor = os.dup(transport.fileno())
+    transport.stopReading()
+    transport.stopWriting()
+    # The connection lives on in another process, so the transport is left to shut down a stand-in socket
+    standIn = socket.socket()
+    os.dup2(standIn.fileno(), transport.fileno())
+    standIn.close()
+    transport.abortConnection()
+    return descriptor
+
+
+@implementer(IPullProducer)
+class DrainWaiter(object):
+    def __init__(self, transport, onDrained):
+        self._transport = transport
+        self._onDrained = onDrained
+        self._waiting = False
+        transport.registerProducer(self, False)
+
+    def resumeProducing(self):
+        if not self._waiting:
+            # An empty line is ignored by the other side, but makes the transport report once it has been sent
+            self._waiting = True
+            self._transport.write(LineReceiver.delimiter)
+        else:
+            self._transport.unregisterProducer()
+            self._onDrained()
+
+    def stopProducing(self):
+        pass
+
+
+@implementer(IFileDescriptorReceiver)
+class ShardLinkProtocol(LineReceiver):
+    MAX_LENGTH = constants.SHARD_LINK_MAX_LINE_LENGTH
+
+    def __init__(self):
+        self._descriptors = []
+
+    def fileDescriptorReceived(self, descriptor):
+        self._descriptors.append(descriptor)
+
+    def popDescriptor(self):
+        return self._descriptors.pop(0)
+
+    def sendMessage(self, dict_):
+        self.sendLine(json.dumps(dict_))
+
+    def sendDescriptor(self, descriptor, dict_):
+        self.transport.sendFileDescriptor(descriptor)
+        self.sendMessage(dict_)
+
+    def lineReceived(self, line):
+        for command, values in json.loads(line).iteritems():
+            self.handleMessage(command, values)
+
+    def connectionLost(self, reason):
+        for descriptor in self._descriptors:
+            os.close(descriptor)
+        self._descriptors = []
+
+
+class ShardRouter(object):
+    def __init__(self, args):
+        self._args = args
+        self._shards = args.shards
+        self._links = {}
+        self._waiting = {}
+        self._adoptions = {}
+        self._nextAdoptionId = 0
+        self._socketDir = tempfile.mkdtemp(prefix="syncplay-")
+        self._socketPath = os.path.join(self._socketDir, "shards.sock")
+        self._processes = {}
+        if args.salt is None:
+            args.salt = RandomStringGenerator.generate_server_salt()
+            print getMessage("no-salt-notification").format(args.salt)
+
+    def listen(self, port):
+        reactor.listenUNIX(self._socketPath, ShardRouterLinkFactory(self))
+        for shard in xrange(self._shards):
+            self._spawnShard(shard)
+        reactor.listenTCP(port, ShardRouterFactory(self))
+        reactor.addSystemEventTrigger("before", "shutdown", self.stop)
+        reactor.addSystemEventTrigger("after", "shutdown", shutil.rmtree, self._socketDir, True)
+
+    def _spawnShard(self, shard):
+        args = [sys.executable, os.path.abspath(sys.argv[0]),
+                "--shards", str(self._shards), "--shard-index", str(shard), "--shard-link", self._socketPath,
+                "--salt", self._args.salt]
+        if self._args.password:
+            args += ["--password", self._args.password]
+        if self._args.motd_file:
+            args += ["--motd-file", self._args.motd_file]
+        if self._args.isolate_rooms:
+            args.append("--isolate-rooms")
+        if self._args.disable_ready:
+            args.append("--disable-ready")
+        if self._args.metrics_port:
+            args += ["--metrics-port", str(self._args.metrics_port + shard)]
+        self._processes[shard] = reactor.spawnProcess(ShardProcessProtocol(self, shard), sys.executable, args,
+                                                      env=os.environ, childFDs={0: "w", 1: 1, 2: 2})
+
+    def stop(self):
+        self._processes = {} # Shards shut down on their own once their link to the router is closed
+
+    def shardEnded(self, shard):
+        if shard in self._processes:
+            del self._processes[shard]
+            print getMessage("shard-exited-server-notification").format(shard)
+            stopReactor()
+
+    def registerShard(self, shard, link):
+        self._links[shard] = link
+        for descriptor, adopt in self._waiting.pop(shard, []):
+            link.sendDescriptor(descriptor, adopt)
+
+    def unregisterShard(self, link):
+        for shard, shardLink in self._links.items():
+            if shardLink is link:
+                del self._links[shard]
+
+    def routeConnection(self, roomName, descriptor, family, data, onAdopted=None):
+        shard = getShardForRoom(roomName, self._shards)
+        adoptionId = self._nextAdoptionId
+        self._nextAdoptionId += 1
+        self._adoptions[adoptionId] = (descriptor, onAdopted)
+        adopt = {"Adopt": {"id": adoptionId, "family": family, "data": base64.b64encode(data)}}
+        if shard in self._links:
+            self._links[shard].sendDescriptor(descriptor, adopt)
+        else:
+            self._waiting.setdefault(shard, []).append((descriptor, adopt))
+
+    def connectionAdopted(self, adoptionId):
+        if adoptionId in self._adoptions:
+            descriptor, onAdopted = self._adoptions.pop(adoptionId)
+            os.close(descriptor)
+            if onAdopted:
+                onAdopted()
+
+    def relay(self, origin, message):
+        for link in self._links.itervalues():
+            if link is not origin:
+                link.sendMessage(message)
+
+
+class ShardProcessProtocol(ProcessProtocol):
+    def __init__(self, router, shard):
+        self._router = router
+        self._shard = shard
+
+    def processEnded(self, reason):
+        self._router.shardEnded(self._shard)
+
+
+class ShardRouterLinkProtocol(ShardLinkProtocol):
+    def __init__(self, router):
+        ShardLinkProtocol.__init__(self)
+        self._router = router
+
+    def handleMessage(self, command, values):
+        if command == "Register":
+            self._router.registerShard(values["shard"], self)
+        elif command == "Adopted":
+            self._router.connectionAdopted(values["id"])
+        elif command == "Handover":
+            reply = {"HandedOver": {"id": values["id"]}}
+            self._router.routeConnection(values["room"], self.popDescriptor(), values["family"],
+                                         base64.b64decode(values["data"]), lambda: self.sendMessage(reply))
+        elif command in ("Relay", "Directory"):
+            self._router.relay(self, {command: values})
+
+    def connectionLost(self, reason):
+        ShardLinkProtocol.connectionLost(self, reason)
+        self._router.unregisterShard(self)
+
+
+class ShardRouterLinkFactory(Factory):
+    def __init__(self, router):
+        self._router = router
+
+    def buildProtocol(self, addr):
+        return ShardRouterLinkProtocol(self._router)
+
+
+class ShardRouterProtocol(Protocol):
+    def __init__(self, router):
+        self._router = router
+        self._buffer = ""
+
+    def dataReceived(self, data):
+        if self._buffer is None:
+            return
+        self._buffer += data
+        if LineReceiver.delimiter in self._buffer:
+            line = self._buffer.split(LineReceiver.delimiter, 1)[0]
+            data, self._buffer = self._buffer, None
+            self.transport.pauseProducing()
+            family = getAddressFamily(self.transport)
+            self._router.routeConnection(self._getRoomName(line), detachConnection(self.transport), family, data)
+        elif len(self._buffer) > LineReceiver.MAX_LENGTH:
+            self._buffer = None
+            self.transport.loseConnection()
+
+    def _getRoomName(self, line):
+        try:
+            return json.loads(line)["Hello"]["room"]["name"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+
+class ShardRouterFactory(Factory):
+    def __init__(self, router):
+        self._router = router
+
+    def buildProtocol(self, addr):
+        return ShardRouterProtocol(self._router)
+
+
+class ShardedSyncServerProtocol(SyncServerProtocol):
+    def __init__(self, factory):
+        SyncServerProtocol.__init__(self, factory)
+        self._handOver = None
+        self._onDetached = None
+        self._handedOver = None
+
+    def handleHello(self, hello):
+        self._handedOver = hello if hello.get("handover") else None
+        SyncServerProtocol.handleHello(self, hello)
+        self._handedOver = None
+
+    def isHandedOver(self):
+        return self._handedOver is not None
+
+    def getHandedOverState(self):
+        return self._handedOver.get("file"), self._handedOver.get("isReady")
+
+    def sendHello(self, clientVersion):
+        # The client is already logged in, so it only needs a Hello if it was renamed on the way
+        if not self._handedOver or self._watcher.getName() != self._handedOver["username"]:
+            SyncServerProtocol.sendHello(self, clientVersion)
+
+    def handleMessage(self, command, values):
+        if self._handOver is not None:
+            # Commands after the one that moved the client are left for the next shard
+            self._handOver.append(json.dumps({command: values}))
+        elif command == "Set" and len(values) > 1:
+            for setting, value in values.iteritems():
+                self.handleMessage(command, {setting: value})
+        else:
+            SyncServerProtocol.handleMessage(self, command, values)
+
+    def handOver(self, hello, onDetached):
+        self.flushMessages()
+        self.pauseProducing()
+        self._handOver = [hello]
+        self.setWatcher(None)
+        self._logged = False
+        DrainWaiter(self.transport, lambda: self._detach(onDetached))
+
+    def _detach(self, onDetached):
+        data = self.delimiter.join(self._handOver + [self.clearLineBuffer()])
+        family = getAddressFamily(self.transport)
+        descriptor = detachConnection(self.transport)
+        self._onDetached = lambda: onDetached(descriptor, family, data)
+
+    def connectionLost(self, reason):
+        if self._handOver is not None:
+            if self.metrics:
+                self.metrics.connectionClosed()
+            if self._onDetached:
+                self._onDetached()
+        else:
+            SyncServerProtocol.connectionLost(self, reason)
+
+
+class ShardedSyncFactory(SyncFactory):
+    def __init__(self, shard, shards, password='', motdFilePath=None, isolateRooms=False, salt=None, disableReady=False):
+        SyncFactory.__init__(self, password, motdFilePath, isolateRooms, salt, disableReady)
+        self._shard = shard
+        self._shards = shards
+        self._link = None
+        if not isolateRooms:
+            self._roomManager = ShardedRoomManager(self)
+
+    def buildProtocol(self, addr):
+        return ShardedSyncServerProtocol(self)
+
+    def connectToRouter(self, path):
+        reactor.connectUNIX(path, ShardWorkerLinkFactory(self, self._shard))
+
+    def setLink(self, link):
+        self._link = link
+
+    def relay(self, message):
+        if self._link:
+            self._link.sendMessage({"Relay": message})
+
+    def deliverRelay(self, message):
+        line = json.dumps(message)
+        for watcher in self._roomManager.getLocalWatchers():
+            watcher.sendEncodedMessage(line, "Set")
+
+    def updateDirectory(self, users):
+        self._roomManager.updateRemoteUsers(users)
+
+    def _publishUser(self, watcher, present=True):
+        if self._isolateRooms or not self._link:
+            return
+        entry = None
+        if present and watcher.getRoom():
+            entry = {
+                "room": watcher.getRoom().getName(),
+                "file": watcher.getFile() if watcher.getFile() else {},
+                "controller": watcher.isController(),
+                "isReady": watcher.isReady()
+            }
+        self._link.sendMessage({"Directory": {watcher.getName(): entry}})
+
+    def addWatcher(self, watcherProtocol, username, roomName):
+        if watcherProtocol.isHandedOver():
+            file_, isReady = watcherProtocol.getHandedOverState()
+            username = self._roomManager.findFreeUsername(username, roomName)
+            watcher = Watcher(self, watcherProtocol, username)
+            watcher.setReady(isReady)
+            SyncFactory.setWatcherRoom(self, watcher, roomName)
+            if file_:
+                watcher.setFile(file_)
+        else:
+            SyncFactory.addWatcher(self, watcherProtocol, username, roomName)
+
+    def setWatcherRoom(self, watcher, roomName, asJoin=False):
+        if asJoin or not self._link or getShardForRoom(roomName, self._shards) == self._shard:
+            SyncFactory.setWatcherRoom(self, watcher, roomName, asJoin)
+        else:
+            self._handOverWatcher(watcher, roomName)
+
+    def _handOverWatcher(self, watcher, roomName):
+        protocol = watcher.getConnector()
+        hello = {"username": watcher.getName(), "room": {"name": roomName}, "version": protocol.getClientVersion(),
+                 "handover": True, "file": watcher.getFile(), "isReady": watcher.isReady()}
+        if protocol.getCapabilities():
+            hello["capabilities"] = protocol.getCapabilities()
+        if self.password:
+            hello["password"] = self.password
+        if self._isolateRooms:
+            self.sendLeftMessage(watcher)
+        else:
+            self._userlistChanged(watcher, False)
+        self._roomManager.removeWatcher(watcher)
+        protocol.handOver(json.dumps({"Hello": hello}),
+                          lambda descriptor, family, data: self._link.handOver(roomName, descriptor, family, data))
+
+    def _userlistChanged(self, watcher, present=True):
+        SyncFactory._userlistChanged(self, watcher, present)
+        self._publishUser(watcher, present)
+
+
+class ShardWorkerLinkProtocol(ShardLinkProtocol):
+    def __init__(self, factory, shard):
+        ShardLinkProtocol.__init__(self)
+        self._factory = factory
+        self._shard = shard
+        self._handOvers = {}
+        self._nextHandOverId = 0
+
+    def connectionMade(self):
+        self.sendMessage({"Register": {"shard": self._shard}})
+        self._factory.setLink(self)
+
+    def handleMessage(self, command, values):
+        if command == "Adopt":
+            self._adopt(self.popDescriptor(), values)
+        elif command == "HandedOver":
+            os.close(self._handOvers.pop(values["id"]))
+        elif command == "Relay":
+            self._factory.deliverRelay(values)
+        elif command == "Directory":
+            self._factory.updateDirectory(values)
+
+    def _adopt(self, descriptor, values):
+        family = socket.AF_INET6 if values["family"] == "ipv6" else socket.AF_INET
+        adoptingFactory = AdoptedConnectionFactory(self._factory)
+        try:
+            reactor.adoptStreamConnection(descriptor, family, adoptingFactory)
+        except (socket.error, IOError, OSError):
+            adoptingFactory.protocol = None
+        finally:
+            os.close(descriptor)
+        self.sendMessage({"Adopted": {"id": values["id"]}})
+        data = base64.b64decode(values["data"])
+        if data and adoptingFactory.protocol:
+            adoptingFactory.protocol.dataReceived(data)
+
+    def handOver(self, roomName, descriptor, family, data):
+        handOverId = self._nextHandOverId
+        self._nextHandOverId += 1
+        self._handOvers[handOverId] = descriptor
+        self.sendDescriptor(descriptor, {"Handover": {"id": handOverId, "room": roomName, "family": family,
+                                                      "data": base64.b64encode(data)}})
+
+    def connectionLost(self, reason):
+        ShardLinkProtocol.connectionLost(self, reason)
+        self._factory.setLink(None)
+        stopReactor()
+
+
+class ShardWorkerLinkFactory(ClientFactory):
+    def __init__(self, factory, shard):
+        self._factory = factory
+        self._shard = shard
+
+    def buildProtocol(self, addr):
+        return ShardWorkerLinkProtocol(self._factory, self._shard)
+
+    def clientConnectionFailed(self, connector, reason):
+        stopReactor()
+
+
+class AdoptedConnectionFactory(Factory):
+    def __init__(self, factory):
+        self._factory = factory
+        self.protocol = None
+
+    def buildProtocol(self, addr):
+        self.protocol = self._factory.buildProtocol(addr)
+        return self.protocol
+
+
+class ShardRelay(object):
+    def __init__(self, factory):
+        self._factory = factory
+
+    def sendSetting(self, user, room, file_, event):
+        setting = {user: {"room": {"name": room.getName()}}}
+        if file_:
+            setting[user]["file"] = file_
+        if event:
+            setting[user]["event"] = event
+        self._factory.relay({"Set": {"user": setting}})
+
+    def sendControlledRoomAuthStatus(self, success, username, room):
+        self._factory.relay({"Set": {"controllerAuth": {"user": username, "room": room, "success": success}}})
+
+
+class RemoteRoom(object):
+    def __init__(self, name):
+        self._name = name
+
+    def getName(self):
+        return self._name
+
+
+class RemoteWatcher(object):
+    def __init__(self, name, entry):
+        self._name = name
+        self._room = RemoteRoom(entry["room"])
+        self._file = entry["file"]
+        self._controller = entry["controller"]
+        self._ready = entry["isReady"]
+
+    def getName(self):
+        return self._name
+
+    def getRoom(self):
+        return self._room
+
+    def getFile(self):
+        return self._file
+
+    def isController(self):
+        return self._controller
+
+    def isReady(self):
+        return self._ready
+
+
+class ShardedRoomManager(RoomManager):
+    def __init__(self, factory):
+        RoomManager.__init__(self)
+        self._relay = ShardRelay(factory)
+        self._remoteUsers = {}
+
+    def broadcast(self, sender, whatLambda):
+        RoomManager.broadcast(self, sender, whatLambda)
+        whatLambda(self._relay)
+
+    def getLocalWatchers(self):
+        return RoomManager.getAllWatchersForUser(self, None)
+
+    def getAllWatchersForUser(self, sender):
+        return self.getLocalWatchers() + self._remoteUsers.values()
+
+    def updateRemoteUsers(self, users):
+        for name, entry in users.iteritems():
+            if entry is None:
+                self._remoteUsers.pop(name.lower(), None)
+            else:
+                self._remoteUsers[name.lower()] = RemoteWatcher(name, entry)
+            self.userlistChanged(name)
+
+    def findWatcher(self, username):
+        watcher = RoomManager.findWatcher(self, username)
+        if watcher is None:
+            watcher = self._remoteUsers.get(username.lower())
+            if watcher and watcher.getName() != username:
+                watcher = None
+        return watcher
+
+    def findFreeUsername(self, username, roomName=None):
+        username = RoomManager.findFreeUsername(self, username, roomName)
+        while username.lower() in self._remoteUsers:
+            username = RoomManager.findFreeUsername(self, username + '_', roomName)
+        return username
@@ -0,0 +1,396 @@
+import argparse
+import random
+import time
+from twisted.internet import address, error
+from twisted.python import failure
+from syncplay import clock, constants
+from syncplay.client import SyncplayClient
+from syncplay.loadtest import getPercentile
+from syncplay.messages import getMessage
+from syncplay.server import SyncFactory
+
+
+def loadLatencyTrace(path):
+    trace = []
+    with open(path) as traceFile:
+        for line in traceFile:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                trace.append(max(0.0, float(line)))
+    if not trace:
+        raise ValueError(path)
+    return trace
+
+
+class SimulatedNetwork(object):
+    def __init__(self, rng, latency, jitter, loss, trace=None):
+        self._rng = rng
+        self._latency = latency
+        self._jitter = jitter
+        self._loss = loss
+        self._trace = trace
+        self.deliveryDelay = 0
+
+    def connect(self, clientProtocol, serverProtocol, host):
+        clientTransport = SimulatedTransport(self, self._rng.random(), host, constants.DEFAULT_PORT)
+        serverTransport = SimulatedTransport(self, self._rng.random(), "127.0.0.1", constants.DEFAULT_PORT)
+        if self._trace:
+            # Each direction replays the trace from its own starting point
+            clientTransport.traceIndex = self._rng.randrange(len(self._trace))
+            serverTransport.traceIndex = self._rng.randrange(len(self._trace))
+        clientTransport.setPeer(serverTransport, serverProtocol)
+        serverTransport.setPeer(clientTransport, clientProtocol)
+        serverProtocol.makeConnection(serverTransport)
+        clientProtocol.makeConnection(clientTransport)
+
+    def send(self, transport, callback, *args):
+        now = clock.now()
+        if self._trace:
+            delay = self._trace[transport.traceIndex]
+            transport.traceIndex = (transport.traceIndex + 1) % len(self._trace)
+        else:
+            delay = self._latency + transport.rng.uniform(0, self._jitter)
+        while transport.rng.random() < self._loss:
+            delay += constants.SIMULATOR_RETRANSMIT_DELAY
+        transport.lastDelivery = max(now + delay, transport.lastDelivery)
+        clock.callLater(transport.lastDelivery - now, callback, *args)
+
+
+class SimulatedTransport(object):
+    def __init__(self, network, seed, host, port):
+        self._network = network
+        self.rng = random.Random(seed)
+        self._address = address.IPv4Address("TCP", host, port)
+        self._peer = None
+        self._peerProtocol = None
+        self.connected = True
+        self.disconnecting = False
+        self.lastDelivery = 0
+        self.traceIndex = 0
+
+    def setPeer(self, peer, peerProtocol):
+        self._peer = peer
+        self._peerProtocol = peerProtocol
+
+    def write(self, data):
+        if self.connected:
+            self._network.send(self, self._deliver, data, clock.now())
+
+    def writeSequence(self, data):
+        self.write("".join(data))
+
+    def _deliver(self, data, sentOn):
+        if self._peer.connected:
+            self._network.deliveryDelay = clock.now() - sentOn
+            self._peerProtocol.dataReceived(data)
+
+    def loseConnection(self):
+        if self.connected:
+            self.connected = False
+            self.disconnecting = True
+            self._network.send(self, self._closed)
+
+    def _closed(self):
+        self._peer.connected = False
+        reason = failure.Failure(error.ConnectionDone())
+        self._peerProtocol.connectionLost(reason)
+        self._peer._peerProtocol.connectionLost(reason)
+
+    def getPeer(self):
+        return self._peer._address
+
+    def getHost(self):
+        return self._address
+
+
+class SimulatedPlayer(object):
+    speedSupported = True
+    secondaryOSDSupported = True
+    osdMessageSeparator = "; "
+
+    def __init__(self, client, drift, statusPushSupported):
+        self._client = client
+        self._drift = drift
+        self._position = 0.0
+        self._paused = True
+        self._speed = 1.0
+        self._lastUpdate = clock.now()
+        self._pushPending = False
+        self.statusPushSupported = statusPushSupported
+        self.slowdowns = 0
+        self.queries = 0
+        self.pushes = 0
+
+    def getPosition(self):
+        if self._paused:
+            return self._position
+        return self._position + (clock.now() - self._lastUpdate) * self._speed * (1 + self._drift)
+
+    def isPaused(self):
+        return self._paused
+
+    def _update(self):
+        self._position = self.getPosition()
+        self._lastUpdate = clock.now()
+
+    def askForStatus(self):
+        self.queries += 1
+        self._client.updatePlayerStatus(self._paused, self.getPosition())
+
+    def _statusChanged(self):
+        if self.statusPushSupported and not self._pushPending:
+            self._pushPending = True
+            clock.callLater(0, self._pushStatus)
+
+    def _pushStatus(self):
+        self._pushPending = False
+        self.pushes += 1
+        self._client.updatePlayerStatus(self._paused, self.getPosition())
+
+    def displayMessage(self, message, duration=constants.OSD_DURATION * 1000, secondaryOSD=False):
+        pass
+
+    def setSpeed(self, value):
+        self._update()
+        if value != 1.0 and self._speed == 1.0:
+            self.slowdowns += 1
+        self._speed = value
+
+    def setPosition(self, value):
+        self._update()
+        self._position = max(0.0, value)
+        self._statusChanged()
+
+    def setPaused(self, value):
+        self._update()
+        if self._paused != value:
+            self._paused = value
+            self._statusChanged()
+
+    def drop(self):
+        pass
+
+
+class SimulatedUI(object):
+    def showMessage(self, message, noTimestamp=False):
+        pass
+
+    def showErrorMessage(self, message, criticalerror=False):
+        pass
+
+    def updateAutoPlayState(self, newState):
+        pass
+
+    def showUserList(self, currentUser, rooms):
+        pass
+
+    def setControllerStatus(self, username, isController):
+        pass
+
+    def promptFor(self, prompt):
+        return ""
+
+    def userListChange(self):
+        pass
+
+    def markEndOfUserlist(self):
+        pass
+
+    def updateRoomName(self, room=""):
+        pass
+
+    def drop(self):
+        pass
+
+
+class SimulatedSyncplayClient(SyncplayClient):
+    def __init__(self, config, network):
+        SyncplayClient.__init__(self, None, SimulatedUI(), config)
+        self._running = True
+        self._network = network
+        self.rewinds = 0
+        self.fastforwards = 0
+        self.messageAgeErrors = []
+
+    def updateGlobalState(self, position, paused, doSeek, setBy, messageAge):
+        # Every clock in the simulation is the same, so the true age of a message is how long the network held it
+        self.messageAgeErrors.append(abs(messageAge - self._network.deliveryDelay))
+        return SyncplayClient.updateGlobalState(self, position, paused, doSeek, setBy, messageAge)
+
+    def _rewindPlayerDueToTimeDifference(self, position, setBy):
+        madeChangeOnPlayer = SyncplayClient._rewindPlayerDueToTimeDifference(self, position, setBy)
+        if madeChangeOnPlayer:
+            self.rewinds += 1
+        return madeChangeOnPlayer
+
+    def _fastforwardPlayerDueToTimeDifference(self, position, setBy):
+        madeChangeOnPlayer = SyncplayClient._fastforwardPlayerDueToTimeDifference(self, position, setBy)
+        if madeChangeOnPlayer:
+            self.fastforwards += 1
+        return madeChangeOnPlayer
+
+
+class SimulatedRoom(object):
+    def __init__(self, name, threshold):
+        self.name = name
+        self.players = []
+        self._threshold = threshold
+        self._actionTime = None
+        self.convergenceTimes = []
+        self.unconverged = 0
+        self.drift = []
+
+    def actionTaken(self):
+        if self._actionTime is not None:
+            self.unconverged += 1
+        self._actionTime = clock.now()
+
+    def sample(self):
+        positions = [player.getPosition() for player in self.players]
+        paused = set(player.isPaused() for player in self.players)
+        spread = max(positions) - min(positions)
+        if self._actionTime is None:
+            if paused == set([False]):
+                self.drift.append(spread)
+        elif len(paused) == 1 and spread <= self._threshold:
+            self.convergenceTimes.append(clock.now() - self._actionTime)
+            self._actionTime = None
+
+
+class Simulation(object):
+    def __init__(self, args):
+        self._args = args
+        self._rng = random.Random(args.seed)
+        self._clock = clock.VirtualClock()
+        clock.setClock(self._clock)
+        self._network = SimulatedNetwork(self._rng, args.latency, args.jitter, args.loss, args.latency_trace)
+        self._factory = SyncFactory(salt="")
+        self._clients = []
+        self._rooms = [SimulatedRoom("room{}".format(index), args.threshold) for index in xrange(max(1, args.rooms))]
+
+    def _getConfig(self, name, room):
+        return {
+            "name": name,
+            "room": room,
+            "password": None,
+            "file": None,
+            "debug": False,
+            "slowdownThreshold": constants.DEFAULT_SLOWDOWN_KICKIN_THRESHOLD,
+            "rewindThreshold": constants.DEFAULT_REWIND_THRESHOLD,
+            "fastforwardThreshold": constants.DEFAULT_FASTFORWARD_THRESHOLD,
+            "rewindOnDesync": True,
+            "slowOnDesync": True,
+            "fastforwardOnDesync": True,
+            "dontSlowDownWithMe": False,
+            "filenamePrivacyMode": constants.PRIVACY_SENDRAW_MODE,
+            "filesizePrivacyMode": constants.PRIVACY_SENDRAW_MODE,
+            "pauseOnLeave": False,
+            "readyAtStart": True,
+            "unpauseAction": constants.UNPAUSE_ALWAYS_MODE,
+            "autoplayInitialState": None,
+            "autoplayMinUsers": -1,
+            "showOSD": True,
+            "showOSDWarnings": True,
+            "showSlowdownOSD": True,
+            "showDifferentRoomOSD": False,
+            "showSameRoomOSD": True,
+            "showNonControllerOSD": False,
+            "showDurationNotification": True
+        }
+
+    def _addClient(self, index):
+        room = self._rooms[index % len(self._rooms)]
+        client = SimulatedSyncplayClient(self._getConfig("user{}".format(index), room.name), self._network)
+        player = SimulatedPlayer(client, self._rng.uniform(-self._args.drift, self._args.drift), not self._args.poll)
+        client.initPlayer(player)
+        client.updateFile(constants.SIMULATOR_FILENAME, self._args.duration * 2, constants.SIMULATOR_FILENAME)
+        host = "10.0.{}.{}".format(index // 250, index % 250 + 1)
+        self._network.connect(client.protocolFactory.buildProtocol(None), self._factory.buildProtocol(None), host)
+        room.players.append(player)
+        self._clients.append(client)
+
+    def _scheduleAction(self, room):
+        if self._args.action_interval > 0:
+            clock.callLater(self._rng.expovariate(1.0 / self._args.action_interval), self._takeAction, room)
+
+    def _takeAction(self, room):
+        player = self._rng.choice(room.players)
+        if player.isPaused() or self._rng.random() < constants.SIMULATOR_PAUSE_PROBABILITY:
+            player.setPaused(not player.isPaused())
+        else:
+            player.setPosition(self._rng.uniform(0, self._args.duration))
+        room.actionTaken()
+        self._scheduleAction(room)
+
+    def _start(self, room):
+        room.players[0].setPaused(False)
+        room.actionTaken()
+        self._scheduleAction(room)
+
+    def _sample(self):
+        for room in self._rooms:
+            if room.players:
+                room.sample()
+
+    def run(self):
+        for index in xrange(self._args.clients):
+            self._addClient(index)
+        for room in self._rooms:
+            if room.players:
+                clock.callLater(constants.SIMULATOR_SETTLE_TIME, self._start, room)
+        sampler = clock.loopingCall(self._sample)
+        sampler.start(constants.SIMULATOR_SAMPLE_INTERVAL, now=False)
+        startedOn = time.time()
+        end = self._clock.seconds() + self._args.duration
+        calls = self._clock.getDelayedCalls()
+        while calls and calls[0].getTime() <= end:
+            self._clock.advance(calls[0].getTime() - self._clock.seconds())
+            calls = self._clock.getDelayedCalls()
+        self.report(time.time() - startedOn)
+
+    def report(self, elapsed):
+        rooms = self._rooms
+        convergenceTimes = [value for room in rooms for value in room.convergenceTimes]
+        drift = [value for room in rooms for value in room.drift]
+        print getMessage("simulator-report-time").format(self._args.duration, elapsed, self._args.duration / max(elapsed, 1e-6))
+        print getMessage("simulator-report-convergence").format(len(convergenceTimes), getPercentile(convergenceTimes, 50),
+                                                                 getPercentile(convergenceTimes, 99), max(convergenceTimes or [0]),
+                                                                 sum(room.unconverged for room in rooms))
+        print getMessage("simulator-report-corrections").format(sum(client.rewinds for client in self._clients),
+                                                                 sum(client.fastforwards for client in self._clients),
+                                                                 sum(player.slowdowns for room in rooms for player in room.players))
+        print getMessage("simulator-report-drift").format(getPercentile(drift, 50) * 1000, getPercentile(drift, 99) * 1000,
+                                                           max(drift or [0]) * 1000)
+        messageAgeErrors = [value for client in self._clients for value in client.messageAgeErrors]
+        print getMessage("simulator-report-message-age").format(getPercentile(messageAgeErrors, 50) * 1000, getPercentile(messageAgeErrors, 99) * 1000,
+                                                                 max(messageAgeErrors or [0]) * 1000)
+        clientSeconds = max(1, len(self._clients)) * self._args.duration
+        print getMessage("simulator-report-player").format(sum(player.queries for room in rooms for player in room.players) / clientSeconds,
+                                                            sum(player.pushes for room in rooms for player in room.players) / clientSeconds)
+
+
+class SimulationConfigurationGetter(object):
+    def getConfiguration(self):
+        self._prepareArgParser()
+        args = self._argparser.parse_args()
+        if args.latency_trace:
+            try:
+                args.latency_trace = loadLatencyTrace(args.latency_trace)
+            except (IOError, ValueError):
+                self._argparser.error(getMessage("simulator-latency-trace-error").format(args.latency_trace))
+        return args
+
+    def _prepareArgParser(self):
+        self._argparser = argparse.ArgumentParser(description=getMessage("simulator-argument-description"))
+        self._argparser.add_argument('--clients', metavar='clients', type=int, default=10, help=getMessage("simulator-clients-argument"))
+        self._argparser.add_argument('--rooms', metavar='rooms', type=int, default=1, help=getMessage("simulator-rooms-argument"))
+        self._argparser.add_argument('--duration', metavar='seconds', type=float, default=3600, help=getMessage("simulator-duration-argument"))
+        self._argparser.add_argument('--latency', metavar='seconds', type=float, default=0.05, help=getMessage("simulator-latency-argument"))
+        self._argparser.add_argument('--jitter', metavar='seconds', type=float, default=0.02, help=getMessage("simulator-jitter-argument"))
+        self._argparser.add_argument('--latency-trace', metavar='file', type=str, help=getMessage("simulator-latency-trace-argument"))
+        self._argparser.add_argument('--loss', metavar='probability', type=float, default=0.0, help=getMessage("simulator-loss-argument"))
+        self._argparser.add_argument('--drift', metavar='fraction', type=float, default=0.001, help=getMessage("simulator-drift-argument"))
+        self._argparser.add_argument('--action-interval', metavar='seconds', type=float, default=120, help=getMessage("simulator-action-interval-argument"))
+        self._argparser.add_argument('--threshold', metavar='seconds', type=float, default=constants.SIMULATOR_SYNC_THRESHOLD, help=getMessage("simulator-threshold-argument"))
+        self._argparser.add_argument('--poll', action='store_true', help=getMessage("simulator-poll-argument"))
+        self._argparser.add_argument('--seed', metavar='seed', type=int, default=0, help=getMessage("simulator-seed-argument"))
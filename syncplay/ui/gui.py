@@ -1,6 +1,6 @@
 from PySide import QtGui
 from PySide.QtCore import Qt, QSettings, QSize, QPoint, QUrl
-from syncplay import utils, constants, version
+from syncplay import clock, utils, constants, version
 from syncplay.messages import getMessage
 import sys
 import time
@@ -149,11 +149,11 @@ class MainWindow(QtGui.QMainWindow):
 
                     if dirsToSearch:
                         newMediaFilesCache = {}
-                        startTime = time.time()
+                        startTime = clock.now()
                         for directory in dirsToSearch:
                             for root, dirs, files in os.walk(directory):
                                 newMediaFilesCache[root] = files
-                                if time.time() - startTime > constants.FOLDER_SEARCH_TIMEOUT:
+                                if clock.now() - startTime > constants.FOLDER_SEARCH_TIMEOUT:
                                     if MainWindow.FileSwitchManager.client is not None and MainWindow.FileSwitchManager.currentWindow is not None:
                                         MainWindow.FileSwitchManager.disabledDir = directory
                                         MainWindow.FileSwitchManager.folderSearchEnabled = False
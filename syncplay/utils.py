@@ -11,6 +11,7 @@ import random
 import string
 import urllib
 import ast
+from twisted.python.procutils import which
 
 folderSearchEnabled = True
 
@@ -125,6 +126,13 @@ def findWorkingDir():
         path = ""
     return path
 
+def findExecutable(path):
+    # On Windows reactor.spawnProcess, unlike subprocess.Popen, does not search PATH for a bare program name
+    if os.path.dirname(path):
+        return path
+    found = which(path)
+    return found[0] if found else path
+
 def limitedPowerset(s, minLength):
     return itertools.chain.from_iterable(itertools.combinations(s, r) for r in xrange(len(s), minLength, -1))
 
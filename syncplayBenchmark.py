@@ -0,0 +1,27 @@
+#!/usr/bin/env python2
+#coding:utf8
+
+import site, sys
+
+# libpath
+
+try:
+    if (sys.version_info.major != 2) or (sys.version_info.minor < 7):
+        raise Exception("You must run Syncplay with Python 2.7!")
+except AttributeError:
+    import warnings
+    warnings.warn("You must run Syncplay with Python 2.7!")
+
+from twisted.internet import reactor
+
+from syncplay.benchmark import TimerBenchmark, ReceiveBenchmark, BenchmarkConfigurationGetter
+
+if __name__ == '__main__':
+    argsGetter = BenchmarkConfigurationGetter()
+    args = argsGetter.getConfiguration()
+
+    if args.benchmark == "receive":
+        ReceiveBenchmark(args).start()
+    else:
+        TimerBenchmark(args).start()
+        reactor.run()
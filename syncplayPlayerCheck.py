@@ -0,0 +1,20 @@
+#!/usr/bin/env python2
+#coding:utf8
+
+import site, sys
+
+# libpath
+
+try:
+    if (sys.version_info.major != 2) or (sys.version_info.minor < 7):
+        raise Exception("You must run Syncplay with Python 2.7!")
+except AttributeError:
+    import warnings
+    warnings.warn("You must run Syncplay with Python 2.7!")
+
+from syncplay.playercheck import PlayerCheck, PlayerCheckConfigurationGetter
+
+if __name__ == '__main__':
+    argsGetter = PlayerCheckConfigurationGetter()
+    args = argsGetter.getConfiguration()
+    sys.exit(0 if PlayerCheck(args).run() else 1)
@@ -15,10 +15,26 @@ except AttributeError:
 from twisted.internet import reactor
 
 from syncplay.server import SyncFactory, ConfigurationGetter
+from syncplay.messages import getMessage
 
 if __name__ == '__main__':
     argsGetter = ConfigurationGetter()
     args = argsGetter.getConfiguration()
 
-    reactor.listenTCP(int(args.port), SyncFactory(args.password, args.motd_file, args.isolate_rooms, args.salt, args.disable_ready))
+    if args.shard_link:
+        from syncplay.sharding import ShardedSyncFactory
+        factory = ShardedSyncFactory(args.shard_index, args.shards, args.password, args.motd_file, args.isolate_rooms, args.salt, args.disable_ready)
+        if args.metrics_port:
+            factory.enableMetrics(args.metrics_port)
+        factory.connectToRouter(args.shard_link)
+    elif args.shards > 1:
+        from syncplay.sharding import ShardRouter, isShardingSupported
+        if not isShardingSupported():
+            sys.exit(getMessage("shards-unsupported-server-error"))
+        ShardRouter(args).listen(int(args.port))
+    else:
+        factory = SyncFactory(args.password, args.motd_file, args.isolate_rooms, args.salt, args.disable_ready)
+        if args.metrics_port:
+            factory.enableMetrics(args.metrics_port)
+        reactor.listenTCP(int(args.port), factory)
     reactor.run()